@@ -0,0 +1,242 @@
+"""
+Teste local da coleta distribuída: um coordenador e vários workers no mesmo processo,
+conversando por HTTP de verdade em localhost, com scrapers falsos (sem navegador).
+Só os scrapers são trocados: leases, heartbeats, envio de resultados e reatribuição
+são os do src/distributed.py.
+
+Cenários:
+    normal    N workers dividem buscas e detalhes; cada produto descoberto é detalhado uma vez.
+    queda     um worker pega uma unidade e morre sem heartbeat; o lease vence e outro worker a conclui.
+    particao  um worker perde os heartbeats por mais tempo que o lease; a unidade é reatribuída e,
+              quando a rede volta, ele recebe lease_lost e abandona a unidade.
+
+Uso:
+    python -m benchmarks.distributed_harness                      # todos os cenários
+    python -m benchmarks.distributed_harness --workers 5 --terms 8 --scenario queda
+
+Retorna código 1 se alguma verificação falhar.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import urllib.error
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import DatabaseManager
+from src.distributed import Coordinator, CoordinatorClient, RemoteSink, Worker
+
+CENARIOS = ('normal', 'queda', 'particao')
+
+
+def item_falso(termo_idx: int, i: int, itens_por_termo: int) -> Dict[str, Any]:
+    """Card de busca determinístico. Termos vizinhos compartilham metade dos produtos (testa o dedup)."""
+    ml_id = f"MLB{7000000000 + termo_idx * (itens_por_termo // 2) + i}"
+    return {
+        "ml_id": ml_id, "title": f"Produto distribuído {ml_id}", "permalink": f"https://produto.mercadolivre.com.br/{ml_id}",
+        "search_term": f"termo-{termo_idx}", "link_term": None, "price_current": 100.0 + i, "price_original": 120.0 + i,
+        "is_ad": False, "is_full": False, "is_best_seller": False, "sales_qty_search": i,
+        "reviews_rating_average": 4.5, "is_international": False, "ranking_search": i + 1, "is_first_page": True,
+    }
+
+
+class ClienteInstavel(CoordinatorClient):
+    """Cliente que perde os heartbeats até particao_ate (thread travada, rede instável)."""
+
+    particao_ate: Optional[float] = None
+
+    def post(self, rota: str, corpo: Dict[str, Any]) -> Dict[str, Any]:
+        if rota == '/heartbeat' and self.particao_ate is not None and time.monotonic() < self.particao_ate:
+            raise urllib.error.URLError("partição simulada")
+        return super().post(rota, corpo)
+
+
+class WorkerFalso(Worker):
+    """
+    Worker com scrapers falsos: a busca gera itens_por_termo cards por termo e o detalhe
+    grava uma ficha mínima, com segundos_por_item de espera entre itens.
+    morrer: abandona a primeira unidade recebida sem heartbeat nem /complete (processo morto).
+    particao_s: perde os heartbeats da primeira unidade durante esse tempo.
+    """
+
+    def __init__(self, url: str, nome: str, itens_por_termo: int, segundos_por_item: float,
+                 morrer: bool = False, particao_s: float = 0.0, batch_size: int = 10):
+        super().__init__(url, worker_id=nome, batch_size=batch_size, idle_wait=0.2)
+        self.client = ClienteInstavel(url, nome)
+        self.itens_por_termo = itens_por_termo
+        self.segundos_por_item = segundos_por_item
+        self.morrer = morrer
+        self.particao_s = particao_s
+        self.recebidas: List[str] = []
+        self.abandonadas: List[str] = []
+
+    def _garantir_navegador(self):
+        pass
+
+    def _fechar_navegador(self):
+        pass
+
+    def _executar(self, unidade: Dict[str, Any], lease_seconds: float):
+        self.recebidas.append(unidade['id'])
+        if self.morrer:
+            print(f"[WORKER {self.worker_id}] Morrendo com {unidade['id']} em mãos.")
+            self.abandonadas.append(unidade['id'])
+            self.stop_event.set()
+            return
+        if self.particao_s and len(self.recebidas) == 1:
+            self.client.particao_ate = time.monotonic() + self.particao_s
+        super()._executar(unidade, lease_seconds)
+
+    def _rodar_unidade(self, unidade: Dict[str, Any], sink: RemoteSink, parar_unidade: threading.Event):
+        if unidade['type'] == 'search':
+            for termo in unidade['terms']:
+                termo_idx = int(termo.rsplit('-', 1)[1])
+                hits = []
+                for i in range(self.itens_por_termo):
+                    if parar_unidade.is_set():
+                        self.abandonadas.append(unidade['id'])
+                        return
+                    item = item_falso(termo_idx, i, self.itens_por_termo)
+                    sink.upsert_product_from_search(item)
+                    hits.append({'ml_id': item['ml_id'], 'term': termo, 'ranking_search': i + 1, 'is_first_page': True})
+                    time.sleep(self.segundos_por_item)
+                sink.record_search_hits(hits)
+        else:
+            for c in unidade['candidates']:
+                if parar_unidade.is_set():
+                    self.abandonadas.append(unidade['id'])
+                    return
+                time.sleep(self.segundos_por_item)
+                sink.upsert_product_details(
+                    c['ml_id'],
+                    {'marca': "Distribuída", 'categorias': {'categoria_1': "Teste"}, 'num_avaliacoes': 1},
+                    {'nome': f"LOJA {self.worker_id}", 'classificacao': "MercadoLíder", 'vendas_total': 1, 'loja_oficial': False},
+                    duration_s=self.segundos_por_item,
+                )
+
+
+class DistributedHarness:
+    """Sobe coordenador e workers para um cenário e verifica o resultado no banco."""
+
+    def __init__(self, workers: int = 3, terms: int = 4, items_per_term: int = 12, limit: int = 20,
+                 lease_seconds: float = 2.0, seconds_per_item: float = 0.02, timeout: float = 120.0):
+        if workers < 2:
+            raise ValueError("São necessários pelo menos 2 workers (um deles pode cair).")
+        self.workers = workers
+        self.terms = terms
+        self.items_per_term = items_per_term
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self.seconds_per_item = seconds_per_item
+        self.timeout = timeout
+
+    def produtos_esperados(self) -> int:
+        return len({item_falso(t, i, self.items_per_term)['ml_id'] for t in range(self.terms) for i in range(self.items_per_term)})
+
+    def rodar(self, cenario: str) -> List[str]:
+        """Executa o cenário e devolve as verificações que falharam."""
+        print(f"\n=== Cenário: {cenario} ===")
+        data_dir = tempfile.mkdtemp(prefix="ml_dist_")
+        db = DatabaseManager("dist.db", data_dir=data_dir)
+        filtros = dict(min_price=0, min_rating=0, min_sales=0, days_since_update=0, search_term=None, only_new=False)
+        coord = Coordinator(db, [f"termo-{t}" for t in range(self.terms)], 1, filtros, self.limit,
+                            lease_seconds=self.lease_seconds, detail_batch=4)
+        server = coord.start("127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        # O worker especial pega a primeira unidade antes dos demais começarem
+        especial = None
+        if cenario == 'queda':
+            especial = WorkerFalso(url, "morre", self.items_per_term, self.seconds_per_item, morrer=True)
+        elif cenario == 'particao':
+            # Lento o bastante para a unidade durar mais que a partição e o lease perdido ser notado
+            especial = WorkerFalso(url, "particao", self.items_per_term, self.lease_seconds * 4 / self.items_per_term,
+                                   particao_s=self.lease_seconds * 2, batch_size=10_000)
+        workers = [especial] if especial else []
+        threads = []
+        try:
+            if especial:
+                threads.append(self._iniciar(especial))
+                limite = time.monotonic() + 10
+                while not especial.recebidas and time.monotonic() < limite:
+                    time.sleep(0.05)
+            for n in range(self.workers - len(workers)):
+                w = WorkerFalso(url, f"w{n + 1}", self.items_per_term, self.seconds_per_item)
+                workers.append(w)
+                threads.append(self._iniciar(w))
+
+            concluiu = coord.terminado.wait(self.timeout)
+            for t in threads:
+                t.join(timeout=10)
+        finally:
+            for w in workers:
+                w.stop_event.set()
+            server.shutdown()
+            server.server_close()
+
+        status = coord.status()
+        enriquecidos = db.get_stats()['by_status'].get('ENRICHED', 0)
+        db.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+        esperado = min(self.limit, self.produtos_esperados())
+        falhas = []
+        def verificar(ok: bool, descricao: str):
+            print(f"   [{'OK' if ok else 'FALHOU'}] {descricao}")
+            if not ok:
+                falhas.append(f"{cenario}: {descricao}")
+
+        print(f"   Status: {status}")
+        verificar(concluiu, f"coordenador terminou em até {self.timeout:.0f}s")
+        verificar(status['failed'] == 0, "nenhuma unidade descartada")
+        verificar(enriquecidos == esperado, f"{enriquecidos} produtos enriquecidos (esperado {esperado})")
+        verificar(status['details'] >= esperado, "todos os detalhes enviados ao coordenador")
+        if cenario == 'normal':
+            verificar(status['expired'] == 0, "nenhum lease vencido")
+        else:
+            verificar(status['expired'] >= 1, "lease do worker especial venceu")
+            perdida = especial.abandonadas[0] if especial.abandonadas else None
+            outros = [w for w in workers if w is not especial]
+            verificar(perdida is not None and any(perdida in w.recebidas for w in outros),
+                      f"unidade {perdida} reatribuída a outro worker")
+            if cenario == 'particao':
+                verificar(bool(especial.abandonadas), "worker em partição recebeu lease_lost e abandonou a unidade")
+        return falhas
+
+    @staticmethod
+    def _iniciar(worker: WorkerFalso) -> threading.Thread:
+        t = threading.Thread(target=worker.run, name=f"worker-{worker.worker_id}", daemon=True)
+        t.start()
+        return t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste local de coordenador + workers (scrapers falsos)")
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--terms', type=int, default=4, help="Unidades de busca (um termo cada).")
+    parser.add_argument('--items-per-term', type=int, default=12)
+    parser.add_argument('--limit', type=int, default=20, help="Produtos a detalhar.")
+    parser.add_argument('--lease-seconds', type=float, default=2.0)
+    parser.add_argument('--scenario', choices=CENARIOS, help="Roda só um cenário.")
+    args = parser.parse_args()
+
+    harness = DistributedHarness(workers=args.workers, terms=args.terms, items_per_term=args.items_per_term,
+                                 limit=args.limit, lease_seconds=args.lease_seconds)
+    falhas = []
+    for cenario in ([args.scenario] if args.scenario else CENARIOS):
+        falhas += harness.rodar(cenario)
+
+    if falhas:
+        print(f"\n{len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("\nTodos os cenários passaram.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Servidor HTTP local que imita as páginas do Mercado Livre para benchmarks offline.
+
+Serve listagens de busca, páginas de produto e o iframe de reviews a partir de
+templates em benchmarks/fixtures/. Páginas reais salvas pelo navegador podem ser
+colocadas em fixtures/recorded/{search,product,reviews}/*.html: elas têm prioridade
+sobre os templates e os links para mercadolivre.com.br são reescritos para o servidor local.
+As páginas geradas trazem o mesmo conteúdo também no estado JSON embutido
+(<script id="__PRELOADED_STATE__">), como o site; embed_state=False serve só o HTML.
+
+Uso isolado:
+    python -m benchmarks.fixture_server --port 8800 --latency-ms 150 --error-rate 0.02
+"""
+import os
+import re
+import json
+import glob
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+RE_BUSCA = re.compile(r'^/(?P<slug>[^/]+?)(?:_Desde_(?P<offset>\d+))?_NoIndex_True')
+RE_PRODUTO = re.compile(r'^/(?:p/MLB(?P<catalogo>\d+)|MLB-?(?P<item>\d+))')
+RE_REVIEWS = re.compile(r'^/reviews/(?P<id>\d+)')
+RE_HOST_ML = re.compile(r'https?://(?:[a-z0-9-]+\.)*mercadolivre\.com\.br')
+
+MESES = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez']
+
+class FixtureServer:
+    """
+    Servidor de fixtures com latência configurável e injeção de erros (HTTP 503).
+    O conteúdo é determinístico por id/offset, então execuções são comparáveis entre si.
+    """
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 cards_per_page: int = 48, reviews_per_product: int = 60, seed: int = 42, embed_state: bool = True):
+        self.fixtures_dir = fixtures_dir
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.cards_per_page = cards_per_page
+        self.reviews_per_product = reviews_per_product
+        self.embed_state = embed_state
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.stats = {'requests': 0, 'errors_injected': 0, 'bytes': 0}
+
+        self.templates = {nome: self._ler(f"{nome}.html") for nome in ('search', 'card', 'product', 'reviews', 'comment')}
+        self.gravadas = {
+            tipo: sorted(glob.glob(os.path.join(fixtures_dir, "recorded", tipo, "*.html")))
+            for tipo in ('search', 'product', 'reviews')
+        }
+
+    def _ler(self, nome: str) -> str:
+        with open(os.path.join(self.fixtures_dir, nome), encoding="utf-8") as f:
+            return f.read()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> str:
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                servidor._atender(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # --- Atendimento ---
+
+    def _atender(self, handler: BaseHTTPRequestHandler):
+        with self._rng_lock:
+            self.stats['requests'] += 1
+            atraso = max(self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+            falhar = self._rng.random() < self.error_rate
+
+        if atraso:
+            time.sleep(atraso)
+
+        if falhar:
+            with self._rng_lock:
+                self.stats['errors_injected'] += 1
+            self._responder(handler, 503, "<html><body>Serviço indisponível (injetado)</body></html>")
+            return
+
+        caminho = handler.path.split('?')[0].split('#')[0]
+        corpo = self._rotear(caminho)
+        if corpo is None:
+            self._responder(handler, 404, "<html><body>Não encontrado</body></html>")
+        else:
+            self._responder(handler, 200, corpo)
+
+    def _responder(self, handler: BaseHTTPRequestHandler, status: int, corpo: str):
+        dados = corpo.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(dados)))
+        handler.end_headers()
+        handler.wfile.write(dados)
+        with self._rng_lock:
+            self.stats['bytes'] += len(dados)
+
+    def _rotear(self, caminho: str) -> Optional[str]:
+        m = RE_BUSCA.match(caminho)
+        if m:
+            return self._pagina_busca(m.group('slug'), int(m.group('offset') or 1))
+        m = RE_REVIEWS.match(caminho)
+        if m:
+            return self._pagina_reviews(int(m.group('id')))
+        m = RE_PRODUTO.match(caminho)
+        if m:
+            return self._pagina_produto(int(m.group('catalogo') or m.group('item')))
+        if caminho.startswith('/mais-vendidos'):
+            return "<html><body><h1>Mais vendidos</h1></body></html>"
+        return None
+
+    # --- Páginas ---
+
+    def _gravada(self, tipo: str, chave: int) -> Optional[str]:
+        arquivos = self.gravadas.get(tipo)
+        if not arquivos:
+            return None
+        with open(arquivos[chave % len(arquivos)], encoding="utf-8", errors="replace") as f:
+            return RE_HOST_ML.sub(self.base_url, f.read())
+
+    def _preencher(self, template: str, valores: Dict[str, object]) -> str:
+        for chave, valor in valores.items():
+            template = template.replace("{{" + chave + "}}", str(valor))
+        return template
+
+    def _estado(self, estado: Dict[str, object]) -> str:
+        if not self.embed_state:
+            return ''
+        # '</' escapado para o JSON não fechar a tag <script>
+        corpo = json.dumps(estado, ensure_ascii=False).replace('</', '<\\/')
+        return f'<script id="__PRELOADED_STATE__" type="application/json">{corpo}</script>'
+
+    def _pagina_busca(self, slug: str, offset: int) -> str:
+        gravada = self._gravada('search', offset // self.cards_per_page)
+        if gravada:
+            return gravada
+
+        cards: List[str] = []
+        resultados: List[Dict[str, object]] = []
+        for i in range(self.cards_per_page):
+            rank = offset + i
+            ml_id = 4000000000 + rank
+            r = random.Random(ml_id)
+            preco = r.randint(80, 2500)
+            nota = f"{r.uniform(3.5, 5.0):.1f}"
+            avaliacoes = r.randint(1, 900)
+            vendidos = r.choice([5, 25, 50, 100, 500, 1000])
+            anuncio = rank % 12 == 0
+            mais_vendido = rank % 5 == 1
+            # Card sem os componentes das flags (e sem is_ad): o scraper relê esse card pelo DOM
+            sem_flags = rank % 16 == 7
+            cards.append(self._preencher(self.templates['card'], {
+                'BASE': self.base_url,
+                'ID': ml_id,
+                'RANK': rank,
+                'AD': '<span class="poly-component__ads-promotions">Patrocinado</span>' if anuncio else '',
+                'HIGHLIGHT': '<span class="poly-component__highlight">MAIS VENDIDO</span>' if mais_vendido else '',
+                'RATING': nota,
+                'REVIEWS': avaliacoes,
+                'SOLD': vendidos,
+                'PRICE': f"{preco:,}".replace(',', '.'),
+                'PRICE_ORIG': f"{int(preco * 1.2):,}".replace(',', '.'),
+            }))
+            componentes = [
+                {'type': 'title', 'title': {'text': f"Lustre Pendente Cristal Modelo {ml_id}"}},
+                {'type': 'price', 'price': {'current_price': {'value': preco, 'currency': 'BRL'},
+                                            'previous_price': {'value': int(preco * 1.2)}}},
+                {'type': 'reviews', 'reviews': {'rating_average': float(nota), 'total': avaliacoes}},
+                {'type': 'review_compacted', 'review_compacted': {'values': [{'type': 'label', 'label': {'text': f"+{vendidos} vendidos"}}]}},
+            ]
+            metadata = {'id': f"MLB{ml_id}", 'url': f"{self.base_url}/MLB-{ml_id}-lustre-pendente-cristal-_JM",
+                        'url_fragments': f"#position={rank}"}
+            if not sem_flags:
+                metadata['is_ad'] = anuncio
+                componentes += [
+                    {'type': 'shipping', 'shipping': {'text': "Frete grátis"}},
+                    {'type': 'shipped_from', 'shipped_from': {'text': "Enviado pelo {icon_full}",
+                                                              'values': [{'key': 'icon_full', 'type': 'icon', 'icon': {'key': 'poly_full'}}]}},
+                    {'type': 'highlight', 'highlight': {'text': "MAIS VENDIDO" if mais_vendido else "OFERTA DO DIA"}},
+                ]
+                if anuncio:
+                    componentes.append({'type': 'ad_label', 'ad_label': {'text': "Patrocinado"}})
+            resultados.append({'id': 'POLYCARD', 'polycard': {'metadata': metadata, 'components': componentes}})
+        return self._preencher(self.templates['search'], {
+            'TERM': slug.replace('-', ' '),
+            'CARDS': "\n".join(cards),
+            'STATE': self._estado({'pageState': {'initialState': {'results': resultados}}}),
+        })
+
+    def _pagina_produto(self, ml_id: int) -> str:
+        gravada = self._gravada('product', ml_id)
+        if gravada:
+            return gravada
+
+        r = random.Random(ml_id)
+        vendas_vendedor = r.randint(1, 50)
+        descricao = "Lustre pendente em cristal com acabamento cromado. " * r.randint(5, 40)
+        avaliacoes = r.randint(10, 900)
+        # (código interno, rótulo, valor): o payload real traz o código em 'id' e o rótulo em 'name'
+        specs = [('BRAND', 'Marca', "Fixture Luz"), ('MODEL', 'Modelo', f"FX-{ml_id}"), ('MATERIAL', 'Material', "Cristal"),
+                 ('LAMP_TYPE', 'Tipo de lâmpada', "LED"), ('DIAMETER', 'Diâmetro', "45 cm")]
+        estado = {'initialState': {'id': f"MLB{ml_id}", 'components': {
+            'header': {'title': f"Lustre Pendente Cristal Modelo {ml_id}",
+                       'reviews': {'rating': 4.6, 'amount': avaliacoes},
+                       'best_seller_position': {'label': {'text': "MAIS VENDIDO"}, 'subtitle': {'text': "1º em Lustres"}}},
+            'breadcrumb': {'categories': [{'label': {'text': nome}} for nome in
+                                          ("Casa, Móveis e Decoração", "Iluminação Residencial", "Lustres")]},
+            'seller_data': {'title': {'text': f"Loja Fixture {ml_id % 17}"},
+                            'subtitles': [{'text': "Loja oficial"}],
+                            'seller_status_info': {'title': {'text': "MercadoLíder Platinum"}},
+                            'seller_info': {'sales': {'text': f"+{vendas_vendedor}mil vendas"}}},
+            'technical_specifications': {'specs': [{'attributes': [{'id': k, 'name': nome, 'text': v} for k, nome, v in specs]}]},
+            'description': {'content': descricao},
+        }}}
+        return self._preencher(self.templates['product'], {
+            'BASE': self.base_url,
+            'ID': ml_id,
+            'SELLER': ml_id % 17,
+            'SELLER_SALES': vendas_vendedor,
+            'DESCRIPTION': descricao,
+            'REVIEWS': avaliacoes,
+            'COMMENTS': self.reviews_per_product,
+            'STATE': self._estado(estado),
+        })
+
+    def _pagina_reviews(self, ml_id: int) -> str:
+        gravada = self._gravada('reviews', ml_id)
+        if gravada:
+            return gravada
+
+        r = random.Random(ml_id)
+        hoje = datetime.now()
+        comentarios = []
+        for _ in range(self.reviews_per_product):
+            d = hoje - timedelta(days=r.randint(0, 400))
+            comentarios.append(self._preencher(self.templates['comment'], {'DATE': f"{d.day:02d} {MESES[d.month - 1]}. {d.year}"}))
+        return self._preencher(self.templates['reviews'], {'COMMENTS': "\n".join(comentarios)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de fixtures do Mercado Livre")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latência adicionada a cada resposta.")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Variação aleatória (+/-) da latência.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fração de respostas 503 injetadas (0 a 1).")
+    args = parser.parse_args()
+
+    server = FixtureServer(port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    print(f"Servindo fixtures em {server.start()} (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Benchmark offline do scraper: busca, detalhe e banco de dados contra o servidor local de fixtures.
+
+Uso:
+    python -m benchmarks.run_benchmarks                       # roda e compara com a baseline 'default'
+    python -m benchmarks.run_benchmarks --save-baseline       # roda e grava a baseline
+    python -m benchmarks.run_benchmarks --latency-ms 200 --error-rate 0.05 --baseline lento
+    python -m benchmarks.run_benchmarks --only db             # só o microbenchmark do banco (sem navegador)
+    python -m benchmarks.run_benchmarks --stub-proxies --baseline proxies   # via pool de proxies locais
+    python -m benchmarks.run_benchmarks --no-state --baseline dom            # páginas sem o estado JSON (só seletores)
+
+Saída: pages/min da busca, tempo por card e por produto, operações/s do banco e pico de RSS.
+Retorna código 1 se alguma métrica piorar além da tolerância em relação à baseline.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.stub_proxy import StubProxy
+from src.database import DatabaseManager
+from src.metrics import METRICS, STAGE_SECONDS, ITEMS_TOTAL, PAGE_SOURCE_TOTAL
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Direção de cada métrica: +1 = maior é melhor, -1 = menor é melhor
+DIRECAO = {
+    'search_pages_per_min': +1,
+    'search_card_ms': -1,
+    'detail_products_per_min': +1,
+    'detail_product_s': -1,
+    'detail_extract_s': -1,
+    'db_upserts_per_s': +1,
+    'db_resweep_per_s': +1,
+    'db_resweep_writes': -1,
+    'db_details_per_s': +1,
+    'db_candidates_per_s': +1,
+    'db_export_rows_per_s': +1,
+    'peak_rss_mb': -1,
+}
+
+
+def _pico_rss_mb() -> Optional[float]:
+    """Pico de RSS do processo + filhos (navegador). ru_maxrss é KB no Linux e bytes no macOS."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    fator = 1 if sys.platform == "darwin" else 1024
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * fator
+    return round((proprio + filhos) / (1024 * 1024), 1)
+
+def _media_etapa(resumo: Dict[str, Any], stage: str) -> Optional[float]:
+    h = resumo['histograms'].get(STAGE_SECONDS, {}).get(f"stage={stage}")
+    return h['avg_s'] if h else None
+
+
+class BenchmarkRunner:
+    """Executa os cenários contra um banco temporário e consolida os resultados."""
+
+    def __init__(self, server: FixtureServer, pages: int = 3, products: int = 10, db_rows: int = 2000, proxy_pool=None):
+        self.server = server
+        self.proxy_pool = proxy_pool
+        self.pages = pages
+        self.products = products
+        self.db_rows = db_rows
+        self.data_dir = tempfile.mkdtemp(prefix="ml_bench_")
+
+    def close(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    # --- Cenários ---
+
+    def bench_search(self, db: DatabaseManager) -> Dict[str, Any]:
+        from src.search_scraper import MercadoLivreSearch
+
+        METRICS.reset()
+        bot = MercadoLivreSearch(db, headless=True)
+        bot.base_url = self.server.base_url
+        bot.delay_scale = 0
+        bot.slow_mo = 0
+        bot.proxy_pool = self.proxy_pool
+
+        inicio = time.perf_counter()
+        bot.run(["lustre pendente"], pages_per_term=self.pages)
+        duracao = time.perf_counter() - inicio
+
+        self._verificar_flags(db)
+
+        resumo = METRICS.summary()
+        etapas = resumo['histograms'].get(STAGE_SECONDS, {})
+        paginas = etapas.get("stage=search.goto", {}).get('count', 0)
+        origens = resumo['counters'].get(PAGE_SOURCE_TOTAL, {})
+        # Extração por card: leitura do estado JSON + seletores (fallback), sobre os cards gravados
+        cards = sum(resumo['counters'].get(ITEMS_TOTAL, {}).values())
+        extracao_s = sum(etapas.get(f"stage={s}", {}).get('sum_s', 0) for s in ('search.state', 'search.extract_card'))
+        card_s = extracao_s / cards if cards else None
+        return {
+            'search_pages': paginas,
+            # Páginas lidas do estado JSON, inteiras ou com alguns cards completados pelo DOM
+            'search_pages_from_state': origens.get("scraper=search,source=state", 0) + origens.get("scraper=search,source=state+dom", 0),
+            'search_seconds': round(duracao, 2),
+            'search_pages_per_min': round(paginas / duracao * 60, 1) if duracao else None,
+            'search_card_ms': round(card_s * 1000, 2) if card_s is not None else None,
+        }
+
+    def _verificar_flags(self, db: DatabaseManager):
+        """
+        Flags gravadas iguais às do fixture, tanto nos cards com os componentes no estado JSON
+        quanto nos que vêm sem eles (relidos pelo DOM). Com páginas gravadas, é pulada.
+        """
+        if self.server.gravadas['search']:
+            return
+        divergentes = []
+        for rank in range(1, self.pages * self.server.cards_per_page + 1):
+            produto = db.get_product(f"MLB{4000000000 + rank}")
+            if produto is None:
+                continue
+            esperado = {'is_ad': int(rank % 12 == 0), 'is_full': 1, 'is_best_seller': int(rank % 5 == 1), 'is_international': 0}
+            obtido = {campo: produto[campo] for campo in esperado}
+            if obtido != esperado:
+                divergentes.append(f"{produto['ml_id']}: {obtido} (esperado {esperado})")
+        if divergentes:
+            raise RuntimeError(f"Flags da busca divergentes do fixture em {len(divergentes)} cards, ex: {divergentes[0]}")
+
+    def bench_detail(self, db: DatabaseManager) -> Dict[str, Any]:
+        from src.detail_scraper import MercadoLivreDetail
+
+        candidatos = db.get_candidates_for_enrichment(limit=self.products)
+        if not candidatos:
+            return {}
+
+        METRICS.reset()
+        bot = MercadoLivreDetail(db, headless=True)
+        bot.delay_scale = 0
+        bot.proxy_pool = self.proxy_pool
+
+        inicio = time.perf_counter()
+        bot.run(candidatos)
+        duracao = time.perf_counter() - inicio
+
+        # Marca/modelo vêm da ficha técnica do estado JSON (rótulo em 'name', código em 'id')
+        if not self.server.gravadas['product']:
+            for c in candidatos:
+                produto = db.get_product(c['ml_id']) or {}
+                esperado = ("Fixture Luz", f"FX-{c['ml_id'][3:]}")
+                if produto.get('status') == 'ENRICHED' and (produto.get('brand'), produto.get('model')) != esperado:
+                    raise RuntimeError(f"{c['ml_id']}: marca/modelo {produto.get('brand')!r}/{produto.get('model')!r} (esperado {esperado})")
+
+        resumo = METRICS.summary()
+        ok = resumo['counters'].get("ml_scraper_products_total", {}).get("result=ok", 0)
+        return {
+            'detail_products': len(candidatos),
+            'detail_ok': ok,
+            'detail_seconds': round(duracao, 2),
+            'detail_products_per_min': round(len(candidatos) / duracao * 60, 1) if duracao else None,
+            'detail_product_s': round(duracao / len(candidatos), 3),
+            'detail_extract_s': _media_etapa(resumo, 'detail.extract'),
+        }
+
+    def bench_db(self) -> Dict[str, Any]:
+        """Microbenchmark do banco: upsert da busca, gravação de detalhes, seleção de candidatos e exportação."""
+        db = DatabaseManager("bench_db.db", data_dir=self.data_dir)
+        rng = random.Random(7)
+        ids = [f"MLB{5000000000 + i}" for i in range(self.db_rows)]
+
+        itens = []
+        for rank, ml_id in enumerate(ids, 1):
+            preco = rng.randint(80, 2500)
+            itens.append({
+                "ml_id": ml_id, "title": f"Produto sintético {ml_id}", "permalink": f"{self.server.base_url}/{ml_id}",
+                "search_term": "bench", "link_term": None, "price_current": preco, "price_original": preco * 1.2,
+                "is_ad": False, "is_full": rank % 3 == 0, "is_best_seller": False, "sales_qty_search": rng.randint(0, 500),
+                "reviews_rating_average": round(rng.uniform(3, 5), 1), "is_international": False,
+                "ranking_search": rank, "is_first_page": rank <= 48,
+            })
+
+        inicio = time.perf_counter()
+        self._varrer(db, itens)
+        upserts_s = time.perf_counter() - inicio
+
+        # Varredura recorrente: os mesmos cards, sem nenhuma mudança
+        inicio = time.perf_counter()
+        escritas_resweep = self._varrer(db, itens)
+        resweep_s = time.perf_counter() - inicio
+
+        amostra = ids[:max(self.db_rows // 10, 1)]
+        inicio = time.perf_counter()
+        for i, ml_id in enumerate(amostra):
+            db.upsert_product_details(ml_id, {
+                "titulo": f"Produto sintético {ml_id}", "marca": "Bench", "modelo": "X",
+                "descricao": "Descrição repetida para testar a deduplicação. " * 20,
+                "resumo_ia": "Não disponível", "categorias": {"1": "Casa", "2": "Iluminação"},
+                "num_avaliacoes": 10, "total_disponivel": 5, "total_baixado": 5, "ultimos_90d": 2,
+                "dias_desde_ultimo_review": 3, "mais_vendido": False,
+            }, {"nome": f"LOJA{i % 17}", "loja_oficial": False, "classificacao": "MercadoLíder", "vendas_total": 100},
+            duration_s=1.0)
+        detalhes_s = time.perf_counter() - inicio
+
+        consultas = 50
+        inicio = time.perf_counter()
+        for _ in range(consultas):
+            db.get_candidates_for_enrichment(min_price=100, min_rating=4, limit=50)
+        candidatos_s = time.perf_counter() - inicio
+
+        exportacao = self._exportar_parquet(db, len(ids))
+        db.close()
+
+        return {
+            **exportacao,
+            'db_upserts_per_s': round(len(ids) / upserts_s, 1),
+            'db_resweep_per_s': round(len(ids) / resweep_s, 1),
+            'db_resweep_writes': escritas_resweep,
+            'db_details_per_s': round(len(amostra) / detalhes_s, 1),
+            'db_candidates_per_s': round(consultas / candidatos_s, 1),
+        }
+
+    @staticmethod
+    def _varrer(db: DatabaseManager, itens: List[Dict[str, Any]], por_pagina: int = 48) -> int:
+        """
+        Grava os cards como a busca: upsert em products por card e os pares termo/posição
+        de cada página em product_search_terms. Retorna as linhas escritas nas duas tabelas.
+        """
+        escritas = 0
+        for i in range(0, len(itens), por_pagina):
+            pagina = itens[i:i + por_pagina]
+            for item in pagina:
+                escritas += db.upsert_product_from_search(dict(item))
+            escritas += db.record_search_hits([
+                {'ml_id': item['ml_id'], 'term': item['search_term'], 'ranking_search': item['ranking_search'],
+                 'is_first_page': item['is_first_page']} for item in pagina
+            ])
+        return escritas
+
+    def _exportar_parquet(self, db: DatabaseManager, esperado: int) -> Dict[str, Any]:
+        """
+        Exportação Parquet do banco com produtos enriquecidos (colunas DATETIME preenchidas).
+        Também é uma verificação: falha se alguma linha não for exportada. Sem pyarrow, é pulada.
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("[BENCH] pyarrow não instalado: exportação Parquet pulada.")
+            return {}
+        from src.parquet_export import ParquetExporter
+
+        inicio = time.perf_counter()
+        totais = ParquetExporter(db, output_dir=os.path.join(self.data_dir, "export")).run(['products'])
+        export_s = time.perf_counter() - inicio
+        if totais['products'] != esperado:
+            raise RuntimeError(f"Exportação Parquet gravou {totais['products']} de {esperado} produtos")
+        return {'db_export_rows_per_s': round(esperado / export_s, 1)}
+
+    def run(self, only: Optional[str] = None) -> Dict[str, Any]:
+        resultados: Dict[str, Any] = {}
+        if only in (None, 'db'):
+            print("[BENCH] Banco de dados...")
+            resultados.update(self.bench_db())
+        if only in (None, 'scraper'):
+            db = DatabaseManager("bench_scraper.db", data_dir=self.data_dir)
+            print("[BENCH] Busca...")
+            resultados.update(self.bench_search(db))
+            print("[BENCH] Detalhe...")
+            resultados.update(self.bench_detail(db))
+            db.close()
+        resultados['peak_rss_mb'] = _pico_rss_mb()
+        if self.proxy_pool:
+            resultados['proxy_uses'] = {srv: e['uses'] for srv, e in self.proxy_pool.resumo().items()}
+        return resultados
+
+
+# --- Baselines ---
+
+def salvar_baseline(nome: str, resultados: Dict[str, Any], config: Dict[str, Any]) -> str:
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    path = os.path.join(BASELINES_DIR, f"{nome}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'config': config,
+                   'results': resultados}, f, ensure_ascii=False, indent=2)
+    return path
+
+def comparar(resultados: Dict[str, Any], baseline: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Imprime a comparação e devolve as métricas que pioraram além da tolerância."""
+    regressoes = []
+    print(f"\n{'métrica':<26}{'baseline':>12}{'atual':>12}{'variação':>11}")
+    for nome, direcao in DIRECAO.items():
+        antes, agora = baseline.get(nome), resultados.get(nome)
+        if antes in (None, 0) or agora is None:
+            continue
+        variacao = (agora - antes) / antes
+        piorou = variacao * direcao < -tolerancia
+        if piorou:
+            regressoes.append(nome)
+        print(f"{nome:<26}{antes:>12}{agora:>12}{variacao:>+10.1%}{'  <-- REGRESSÃO' if piorou else ''}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do ML Scraper")
+    parser.add_argument('--pages', type=int, default=3, help="Páginas de busca.")
+    parser.add_argument('--products', type=int, default=10, help="Produtos detalhados.")
+    parser.add_argument('--db-rows', type=int, default=2000, help="Linhas do microbenchmark do banco.")
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-proxies', action='store_true',
+                        help="Passa pelo pool de proxies com três proxies locais: bom, lento e que bloqueia.")
+    parser.add_argument('--no-state', action='store_true',
+                        help="Fixtures sem o estado JSON embutido: mede o caminho só por seletores.")
+    parser.add_argument('--only', choices=['db', 'scraper'], help="Roda só uma parte do benchmark.")
+    parser.add_argument('--baseline', default='default', help="Nome da baseline (benchmarks/baselines/<nome>.json).")
+    parser.add_argument('--save-baseline', action='store_true', help="Grava os resultados como nova baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Piora tolerada antes de acusar regressão (fração).")
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in ('pages', 'products', 'db_rows', 'latency_ms', 'jitter_ms', 'error_rate', 'only', 'stub_proxies')}
+
+    proxies = []
+    pool = None
+    if args.stub_proxies:
+        from src.proxy_pool import Proxy, ProxyPool
+
+        proxies = [StubProxy(seed=1), StubProxy(latency_ms=300, seed=2), StubProxy(block_rate=0.5, seed=3)]
+        pool = ProxyPool([Proxy.from_url(p.start()) for p in proxies], quarentena_base=5.0)
+
+    with FixtureServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                       embed_state=not args.no_state) as server:
+        runner = BenchmarkRunner(server, pages=args.pages, products=args.products, db_rows=args.db_rows, proxy_pool=pool)
+        try:
+            resultados = runner.run(only=args.only)
+        finally:
+            runner.close()
+            for p in proxies:
+                p.stop()
+        resultados['server_requests'] = server.stats['requests']
+        resultados['server_errors_injected'] = server.stats['errors_injected']
+
+    print("\n=== RESULTADOS ===")
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+    path = os.path.join(BASELINES_DIR, f"{args.baseline}.json")
+    if args.save_baseline:
+        print(f"\nBaseline gravada em {salvar_baseline(args.baseline, resultados, config)}")
+        return 0
+
+    if not os.path.exists(path):
+        print(f"\nSem baseline '{args.baseline}'. Use --save-baseline para gravar.")
+        return 0
+
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f"\n[AVISO] Configuração diferente da baseline: {baseline.get('config')}")
+
+    regressoes = comparar(resultados, baseline['results'], args.tolerance)
+    if regressoes:
+        print(f"\n❌ Regressões: {', '.join(regressoes)}")
+        return 1
+    print("\n✅ Sem regressões.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Proxy HTTP local para testar o pool de proxies sem rede externa.
+
+Encaminha requisições em forma absoluta (GET http://host/...) e túneis CONNECT,
+com latência extra, falhas (conexão derrubada) e bloqueios (HTTP 429) configuráveis.
+
+Uso isolado (três proxies com perfis diferentes):
+    python -m benchmarks.stub_proxy --port 8901
+    python -m benchmarks.stub_proxy --port 8902 --latency-ms 400
+    python -m benchmarks.stub_proxy --port 8903 --block-rate 0.5
+e um arquivo de proxies com uma linha por porta (http://127.0.0.1:8901 ...).
+"""
+import time
+import random
+import select
+import socket
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+class StubProxy:
+    """Proxy de teste com perfil de qualidade configurável."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 fail_rate: float = 0.0, block_rate: float = 0.0, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.block_rate = block_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.stats = {'requests': 0, 'failed': 0, 'blocked': 0}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def _sortear(self) -> str:
+        with self._lock:
+            self.stats['requests'] += 1
+            r = self._rng.random()
+            if r < self.fail_rate:
+                self.stats['failed'] += 1
+                return 'fail'
+            if r < self.fail_rate + self.block_rate:
+                self.stats['blocked'] += 1
+                return 'block'
+        return 'ok'
+
+    def start(self) -> str:
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _antes(self) -> bool:
+                """Aplica latência e sorteia o resultado. Retorna False se a requisição já foi respondida."""
+                if proxy.latency_ms:
+                    time.sleep(proxy.latency_ms / 1000)
+                resultado = proxy._sortear()
+                if resultado == 'fail':
+                    self.close_connection = True
+                    self.connection.close()
+                    return False
+                if resultado == 'block':
+                    corpo = b"<html><body>Too many requests</body></html>"
+                    self.send_response(429)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._antes():
+                    return
+                alvo = urlsplit(self.path)
+                conn = http.client.HTTPConnection(alvo.hostname, alvo.port or 80, timeout=30)
+                caminho = alvo.path + (f"?{alvo.query}" if alvo.query else "")
+                headers = {k: v for k, v in self.headers.items() if k.lower() not in ('proxy-connection', 'connection')}
+                try:
+                    conn.request("GET", caminho or "/", headers=headers)
+                    resp = conn.getresponse()
+                    corpo = resp.read()
+                except OSError:
+                    self.send_error(502)
+                    return
+                finally:
+                    conn.close()
+                self.send_response(resp.status)
+                for k, v in resp.getheaders():
+                    if k.lower() not in ('transfer-encoding', 'connection', 'content-length'):
+                        self.send_header(k, v)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_CONNECT(self):
+                if not self._antes():
+                    return
+                host, _, porta = self.path.partition(':')
+                try:
+                    destino = socket.create_connection((host, int(porta or 443)), timeout=30)
+                except OSError:
+                    self.send_error(502)
+                    return
+                self.send_response(200, "Connection Established")
+                self.end_headers()
+                conexoes = [self.connection, destino]
+                try:
+                    while True:
+                        prontos, _, erro = select.select(conexoes, [], conexoes, 30)
+                        if erro or not prontos:
+                            break
+                        for origem in prontos:
+                            dados = origem.recv(65536)
+                            if not dados:
+                                return
+                            (destino if origem is self.connection else self.connection).sendall(dados)
+                finally:
+                    destino.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-proxy", daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy HTTP local para testes do pool de proxies")
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fração de conexões derrubadas.")
+    parser.add_argument('--block-rate', type=float, default=0.0, help="Fração de respostas 429.")
+    args = parser.parse_args()
+
+    proxy = StubProxy(port=args.port, latency_ms=args.latency_ms, fail_rate=args.fail_rate, block_rate=args.block_rate)
+    print(f"Proxy de teste em {proxy.start()} (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        proxy.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import argparse
+import json
+import sqlite3
 import sys
+import time
 from src.database import DatabaseManager
-from src.search_scraper import MercadoLivreSearch 
-from src.detail_scraper import MercadoLivreDetail
+
+# Modos só de leitura: não abrem navegador nem carregam os scrapers (inicialização rápida)
+# Os módulos dos scrapers (playwright, validators) são importados apenas nos modos que os usam.
+MODOS_CONSULTA = ['stats', 'query', 'top', 'changes']
 
 def configurar_parser():
     """Configura os argumentos aceitos pela linha de comando."""
@@ -11,9 +16,16 @@ def configurar_parser():
     # Modo de operação
     parser.add_argument(
         '--mode', 
-        choices=['search', 'detail', 'full'], 
+        choices=['search', 'detail', 'full', 'export', 'reindex', 'daemon', 'coordinator', 'worker'] + MODOS_CONSULTA, 
         default='full',
-        help="Modo de execução: 'search' (apenas busca), 'detail' (apenas detalhes) ou 'full' (ambos)."
+        help="Modo de execução: 'search' (apenas busca), 'detail' (apenas detalhes), 'full' (ambos), 'export' (Parquet incremental), 'reindex' (reconstrói o índice de texto), 'daemon' (processo contínuo com agenda), 'coordinator'/'worker' (coleta distribuída em várias máquinas) ou as consultas rápidas 'stats', 'query', 'top' e 'changes'."
+    )
+
+    parser.add_argument(
+        '--schedule', 
+        type=str, 
+        default='schedule.json', 
+        help="Modo 'daemon': arquivo JSON com a agenda de jobs (recarregado com SIGHUP ou ao ser alterado)."
     )
 
     # Argumentos para Busca
@@ -79,56 +91,372 @@ def configurar_parser():
         help="Se usado, busca APENAS itens novos que nunca foram detalhados (ignora atualizações de antigos)."
     )
 
+    parser.add_argument(
+        '--time-budget', 
+        type=float, 
+        default=None, 
+        help="Orçamento de tempo (minutos) para o enriquecimento. Se usado, o agendador escolhe os candidatos de maior valor que cabem no tempo (ignora --limit)."
+    )
+
+    parser.add_argument(
+        '--queue-size', 
+        type=int, 
+        default=20, 
+        help="Modo 'full': tamanho máximo da fila entre busca e detalhe (a busca espera quando a fila enche)."
+    )
+
+    # Proxies
+    parser.add_argument(
+        '--proxies', 
+        type=str, 
+        default=None, 
+        help="Arquivo com os proxies (uma URL por linha, ou lista JSON). Cada contexto do navegador usa um proxy escolhido pelo desempenho recente."
+    )
+
+    # Memória do navegador
+    parser.add_argument(
+        '--max-browser-rss', 
+        type=float, 
+        default=None, 
+        help="Reinicia o navegador do detalhe quando a memória (RSS, em MB) passar deste valor, retomando do item atual."
+    )
+
+    parser.add_argument(
+        '--recycle-every', 
+        type=int, 
+        default=None, 
+        help="Reinicia o navegador do detalhe a cada N produtos."
+    )
+
+    # Perfilamento
+    parser.add_argument(
+        '--profile', 
+        choices=['cprofile', 'sample'], 
+        default=None, 
+        help="Perfila a execução: 'cprofile' (perfil determinístico das etapas, .prof) ou 'sample' (amostragem das pilhas de todas as threads, formato folded para flamegraph). Saída em data/profiles/run_<timestamp>/."
+    )
+
+    parser.add_argument(
+        '--profile-sample-rate', 
+        type=float, 
+        default=50.0, 
+        help="Modo 'sample': amostras por segundo (padrão: 50). 10-20 Hz tem custo baixo o bastante para produção."
+    )
+
+    parser.add_argument(
+        '--profile-stages', 
+        type=str, 
+        default=None, 
+        help="Prefixos de etapa a perfilar, separados por vírgula (ex: 'detail.reviews,search.extract'). Padrão: todas."
+    )
+
+    parser.add_argument(
+        '--profile-trace-pages', 
+        type=int, 
+        default=0, 
+        help="Grava o trace do Playwright (screenshots + DOM) dos N primeiros contextos: um produto no detalhe, um termo na busca."
+    )
+
+    # Observabilidade
+    parser.add_argument(
+        '--metrics-port', 
+        type=int, 
+        default=None, 
+        help="Expõe métricas em http://127.0.0.1:<porta>/metrics (Prometheus) e /metrics.json durante a execução."
+    )
+
+    # Coleta distribuída
+    parser.add_argument(
+        '--coordinator', 
+        type=str, 
+        default='http://127.0.0.1:8765', 
+        help="Modo 'worker': URL do coordenador (padrão: http://127.0.0.1:8765)."
+    )
+
+    parser.add_argument(
+        '--host', 
+        type=str, 
+        default='127.0.0.1', 
+        help="Modo 'coordinator': endereço de escuta (use 0.0.0.0 para aceitar outras máquinas)."
+    )
+
+    parser.add_argument(
+        '--port', 
+        type=int, 
+        default=8765, 
+        help="Modo 'coordinator': porta de escuta (padrão: 8765)."
+    )
+
+    parser.add_argument(
+        '--lease-seconds', 
+        type=float, 
+        default=120.0, 
+        help="Modo 'coordinator': duração do lease de cada unidade; sem heartbeat nesse prazo ela é reatribuída."
+    )
+
+    parser.add_argument(
+        '--token', 
+        type=str, 
+        default=None, 
+        help="Modos 'coordinator'/'worker': segredo compartilhado enviado no cabeçalho X-Token."
+    )
+
+    # Argumentos das consultas rápidas
+    parser.add_argument(
+        '--text', 
+        type=str, 
+        default=None, 
+        help="Modo 'query': texto buscado em título, descrição e resumo IA (ex: 'cristal dourado')."
+    )
+
+    parser.add_argument(
+        '--by', 
+        choices=list(DatabaseManager.TOP_CRITERIA), 
+        default='sales', 
+        help="Modo 'top': critério do ranking (padrão: sales)."
+    )
+
+    parser.add_argument(
+        '--since', 
+        type=int, 
+        default=0, 
+        help="Modo 'changes': mostra as mudanças com seq maior que este (padrão: 0, desde o início)."
+    )
+
+    parser.add_argument(
+        '--json', 
+        action='store_true', 
+        help="Modos 'stats', 'query', 'top' e 'changes': saída em JSON (para scripts e health checks)."
+    )
+
+    # Feed de mudanças
+    parser.add_argument(
+        '--changes-dir', 
+        type=str, 
+        default=None, 
+        help="Ao fim da coleta (e após cada job do daemon), grava as mudanças novas de preço/vendas/ranking/status/vendedor em JSONL rotativo neste diretório."
+    )
+
+    # Argumentos para Exportação
+    parser.add_argument(
+        '--export-dir', 
+        type=str, 
+        default='data/export', 
+        help="Diretório de saída dos arquivos Parquet (padrão: data/export)."
+    )
+
+    parser.add_argument(
+        '--batch-size', 
+        type=int, 
+        default=5000, 
+        help="Linhas por lote na exportação Parquet (padrão: 5000)."
+    )
+
     return parser
 
-def executar_busca(db, termos, paginas):
+def executar_busca(db, termos, paginas, proxy_pool=None):
     if not termos:
         print("[ERRO] Para executar a busca, você deve fornecer termos usando --terms")
         sys.exit(1)
 
+    from src.search_scraper import MercadoLivreSearch
+
     print(f"\n[MODO BUSCA] Iniciando varredura para: {termos}")
     search_bot = MercadoLivreSearch(db)
+    search_bot.proxy_pool = proxy_pool
     search_bot.run(termos, pages_per_term=paginas)
 
-def executar_enriquecimento(db, min_price, min_rating, min_sales, days_since_update, search_term, only_new, limit):
-    
+def executar_enriquecimento(db, min_price, min_rating, min_sales, days_since_update, search_term, only_new, limit, time_budget=None, watchdog=None, proxy_pool=None):
+    from src.detail_scraper import MercadoLivreDetail
+    from src.scheduler import EnrichmentScheduler
+
     msg_termo = f", Termo='{search_term}'" if search_term else ""
     print(f"\n[MODO DETALHE] Buscando candidatos (Preço > {min_price}, Nota > {min_rating}, Vendas > {min_sales}, Dias > {days_since_update}{msg_termo})...")
     
-    candidatos = db.get_candidates_for_enrichment(
+    filtros = dict(
         min_price=min_price,
         min_rating=min_rating,
         min_sales=min_sales,
         days_since_update=days_since_update,
         search_term=search_term,
-        only_new=only_new,  
-        limit=limit
+        only_new=only_new
     )
+
+    deadline = None
+    if time_budget:
+        # Agendador por valor: ordena e corta o conjunto pelo orçamento de tempo
+        orcamento_s = time_budget * 60
+        candidatos = EnrichmentScheduler(db).selecionar(db.get_enrichment_pool(**filtros), orcamento_s)
+        deadline = time.monotonic() + orcamento_s
+    else:
+        candidatos = db.get_candidates_for_enrichment(**filtros, limit=limit)
     
     print(f"-> {len(candidatos)} produtos encontrados no banco pendentes de detalhes/atualização.")
     
     if candidatos:
-        detail_bot = MercadoLivreDetail(db)
-        detail_bot.run(candidatos)
+        detail_bot = MercadoLivreDetail(db, watchdog=watchdog)
+        detail_bot.proxy_pool = proxy_pool
+        detail_bot.run(candidatos, deadline=deadline)
     else:
         print("-> Nenhum candidato encontrado com esses filtros. Tente rodar a busca novamente ou baixar os critérios.")
         return
 
+def executar_pipeline(db, termos, paginas, min_price, min_rating, min_sales, days_since_update, search_term, only_new, limit, time_budget, queue_size, watchdog=None, proxy_pool=None):
+    if not termos:
+        print("[ERRO] Para executar a busca, você deve fornecer termos usando --terms")
+        sys.exit(1)
+
+    from src.pipeline import FullPipeline
+
+    print(f"\n[MODO FULL] Busca e detalhamento em paralelo para: {termos} (fila: {queue_size}, limite: {limit})")
+    filtros = dict(
+        min_price=min_price,
+        min_rating=min_rating,
+        min_sales=min_sales,
+        days_since_update=days_since_update,
+        search_term=search_term,
+        only_new=only_new
+    )
+    deadline = time.monotonic() + time_budget * 60 if time_budget else None
+
+    pipeline = FullPipeline(db, filtros, limit, queue_size=queue_size, deadline=deadline, watchdog=watchdog, proxy_pool=proxy_pool)
+    pipeline.run(termos, paginas)
+
+def executar_exportacao(db, export_dir, batch_size):
+    from src.parquet_export import ParquetExporter
+
+    print(f"\n[MODO EXPORTAÇÃO] Exportando alterações para Parquet em '{export_dir}'...")
+    exporter = ParquetExporter(db, output_dir=export_dir, batch_size=batch_size)
+    try:
+        totais = exporter.run()
+    except RuntimeError as e:
+        print(f"[ERRO] {e}")
+        sys.exit(1)
+    print(f"-> Linhas exportadas: {totais}")
+
+def _imprimir_tabela(linhas, colunas):
+    """Tabela simples em texto (sem dependências), com colunas largas truncadas."""
+    if not linhas:
+        print("(nenhum resultado)")
+        return
+    fmt = lambda v: ("" if v is None else str(v))[:60]
+    larguras = {c: max(len(c), *(len(fmt(l.get(c))) for l in linhas)) for c in colunas}
+    print("  ".join(c.ljust(larguras[c]) for c in colunas))
+    print("  ".join("-" * larguras[c] for c in colunas))
+    for l in linhas:
+        print("  ".join(fmt(l.get(c)).ljust(larguras[c]) for c in colunas))
+
+def executar_consulta(args):
+    """
+    Modos stats, query, top e changes: leitura apenas, sem trava, banner ou métricas.
+    Saída em texto ou JSON (--json); código de saída 1 se o banco não puder ser lido.
+    """
+    try:
+        db = DatabaseManager("ml_intelligence.db", read_only=True)
+        if args.mode == 'stats':
+            resultado = db.get_stats()
+        elif args.mode == 'query':
+            if not args.text:
+                print("[ERRO] Para executar a consulta, forneça o texto usando --text", file=sys.stderr)
+                sys.exit(1)
+            resultado = db.search_text(args.text, limit=args.limit, search_term=args.search_term)
+        elif args.mode == 'changes':
+            resultado = db.get_changes(since=args.since, limit=args.limit)
+        else:
+            resultado = db.get_top_products(args.by, limit=args.limit, search_term=args.search_term)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"[ERRO] {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    elif args.mode == 'stats':
+        for chave, valor in resultado.items():
+            if isinstance(valor, dict):
+                print(f"{chave}:")
+                for k, v in valor.items():
+                    print(f"  {k:<30} {v}")
+            else:
+                print(f"{chave:<32} {valor}")
+    elif args.mode == 'query':
+        _imprimir_tabela(resultado, ['ml_id', 'price_current', 'status', 'title', 'snippet'])
+    elif args.mode == 'changes':
+        _imprimir_tabela(resultado, ['seq', 'changed_at', 'ml_id', 'field', 'old_value', 'new_value'])
+    else:
+        _imprimir_tabela(resultado, ['ml_id', 'price_current', 'price_original', 'sales_qty_search',
+                                     'reviews_rating_average', 'comments_last_90d', 'title'])
+
 def main():
     parser = configurar_parser()
     args = parser.parse_args()
-    
+
+    if args.mode in MODOS_CONSULTA:
+        executar_consulta(args)
+        return
+
+    from src.daemon import RunLock
+    from src.metrics import iniciar_servidor, salvar_resumo
+    from src.watchdog import MemoryWatchdog
+
     print("=== INICIANDO SISTEMA DE INTELIGÊNCIA DE MERCADO ===")
+
+    # Perfilamento: os arquivos são gravados na saída do processo (inclusive em sys.exit e SIGTERM do daemon)
+    if args.profile or args.profile_trace_pages:
+        import atexit
+        from src.profiling import RunProfiler
+
+        etapas = [e.strip() for e in args.profile_stages.split(',') if e.strip()] if args.profile_stages else None
+        perfilador = RunProfiler(args.profile, sample_rate=args.profile_sample_rate,
+                                 trace_pages=args.profile_trace_pages, stages=etapas).start()
+        atexit.register(perfilador.stop)
+
+    # Memória do navegador do detalhe (sempre mede; só reinicia com os limites definidos)
+    watchdog = MemoryWatchdog(args.max_browser_rss, args.recycle_every)
+
+    proxy_pool = None
+    if args.proxies:
+        from src.proxy_pool import ProxyPool
+
+        proxy_pool = ProxyPool.from_file(args.proxies)
+        print(f"-> {len(proxy_pool.proxies)} proxies carregados de {args.proxies}")
+
+    # Worker não toca no banco: envia tudo ao coordenador
+    if args.mode == 'worker':
+        from src.distributed import Worker
+
+        if args.metrics_port:
+            iniciar_servidor(args.metrics_port)
+        print(f"\n[MODO WORKER] Coordenador: {args.coordinator}")
+        Worker(args.coordinator, token=args.token, watchdog=watchdog, proxy_pool=proxy_pool).run()
+        print(f"-> Métricas da execução salvas em {salvar_resumo()}")
+        print("\n=== PROCESSO FINALIZADO ===")
+        return
     
+    # Impede execuções sobrepostas (cron + daemon) disputando o banco
+    lock = RunLock()
+    if args.mode in ['search', 'detail', 'full', 'daemon', 'coordinator'] and not lock.acquire():
+        print(f"[ERRO] Outra execução já está em andamento (trava: {lock.path}).")
+        sys.exit(1)
+
+    if args.metrics_port:
+        iniciar_servidor(args.metrics_port)
+
     # Inicializa Banco (caminho relativo assumindo execução na raiz)
-    db = DatabaseManager("ml_intelligence.db")
+    # No daemon a conexão fica aberta durante todo o processo
+    db = DatabaseManager("ml_intelligence.db", persistent=(args.mode == 'daemon'))
+
+    change_feed = None
+    if args.changes_dir:
+        from src.change_feed import ChangeFeedWriter
+
+        change_feed = ChangeFeedWriter(db, output_dir=args.changes_dir)
     
-    # 1. Executa Busca (Se mode for 'search' ou 'full')
-    if args.mode in ['search', 'full']:
-        executar_busca(db, args.terms, args.pages)
+    # 1. Executa Busca (Se mode for 'search')
+    if args.mode == 'search':
+        executar_busca(db, args.terms, args.pages, proxy_pool)
     
-    # 2. Executa Detalhes (Se mode for 'detail' ou 'full')
-    if args.mode in ['detail', 'full']:
+    # 2. Executa Detalhes (Se mode for 'detail')
+    if args.mode == 'detail':
         executar_enriquecimento(
             db, 
             args.min_price, 
@@ -137,9 +465,80 @@ def main():
             args.days_since_update,
             args.search_term,
             args.only_new,
-            args.limit
+            args.limit,
+            args.time_budget,
+            watchdog,
+            proxy_pool
         )
 
+    # 2b. Modo full: busca e detalhes em pipeline (o detalhe começa durante a busca)
+    if args.mode == 'full':
+        executar_pipeline(
+            db,
+            args.terms,
+            args.pages,
+            args.min_price, 
+            args.min_rating,
+            args.min_sales, 
+            args.days_since_update,
+            args.search_term,
+            args.only_new,
+            args.limit,
+            args.time_budget,
+            args.queue_size,
+            watchdog,
+            proxy_pool
+        )
+
+    # 3. Exportação Parquet (apenas no modo 'export')
+    if args.mode == 'export':
+        executar_exportacao(db, args.export_dir, args.batch_size)
+
+    # 4. Reconstrução do índice de texto (apenas no modo 'reindex')
+    if args.mode == 'reindex':
+        print("\n[MODO REINDEX] Reconstruindo índice de texto (FTS5)...")
+        total = db.rebuild_fulltext_index()
+        print(f"-> {total} produtos indexados.")
+
+    # 5. Processo contínuo com agenda (apenas no modo 'daemon')
+    if args.mode == 'daemon':
+        from src.daemon import ScraperDaemon
+
+        print(f"\n[MODO DAEMON] Agenda: {args.schedule}")
+        ScraperDaemon(db, args.schedule, watchdog=watchdog, proxy_pool=proxy_pool, change_feed=change_feed).run()
+
+    # 6. Coordenador da coleta distribuída (apenas no modo 'coordinator')
+    if args.mode == 'coordinator':
+        from src.distributed import Coordinator
+
+        filtros = dict(
+            min_price=args.min_price,
+            min_rating=args.min_rating,
+            min_sales=args.min_sales,
+            days_since_update=args.days_since_update,
+            search_term=args.search_term,
+            only_new=args.only_new
+        )
+        print(f"\n[MODO COORDENADOR] Termos: {args.terms or []} | Limite de detalhes: {args.limit}")
+        coordenador = Coordinator(db, args.terms, args.pages, filtros, args.limit,
+                                  lease_seconds=args.lease_seconds, token=args.token)
+        coordenador.serve(args.host, args.port)
+
+    # Mudanças desta execução para o feed JSONL
+    if change_feed and args.mode in ['search', 'detail', 'full', 'coordinator']:
+        change_feed.run()
+
+    # Resumo das métricas da execução (etapas, erros, bytes)
+    if args.mode in ['search', 'detail', 'full']:
+        print(f"-> Métricas da execução salvas em {salvar_resumo()}")
+
+    # Desempenho dos proxies fica salvo para a próxima execução
+    if proxy_pool:
+        proxy_pool.salvar_estado()
+        proxy_pool.imprimir_resumo()
+
+    lock.release()
+
     print("\n=== PROCESSO FINALIZADO ===")
 
 if __name__ == "__main__":
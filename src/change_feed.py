@@ -0,0 +1,60 @@
+import os
+import json
+from src.database import DatabaseManager
+
+class ChangeFeedWriter:
+    """
+    Copia o feed de mudanças (product_changes) para arquivos JSONL, uma mudança por linha.
+    Incremental: a marca d'água 'cdc:jsonl' em 'export_watermarks' guarda o último seq escrito.
+    O arquivo atual é changes.jsonl; ao passar de max_bytes ele é renomeado para
+    changes-<primeiro seq>.jsonl e um novo é iniciado.
+    Entrega ao menos uma vez: se o processo cair entre a escrita e a marca d'água,
+    as linhas se repetem na próxima execução (o consumidor descarta seq já visto).
+    """
+
+    EXPORT_NAME = "cdc:jsonl"
+    ARQUIVO_ATUAL = "changes.jsonl"
+
+    def __init__(self, db: DatabaseManager, output_dir: str = os.path.join("data", "changes"),
+                 max_bytes: int = 64 * 1024 * 1024, batch_size: int = 5000):
+        self.db = db
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+
+    @property
+    def caminho_atual(self) -> str:
+        return os.path.join(self.output_dir, self.ARQUIVO_ATUAL)
+
+    def run(self) -> int:
+        """Escreve as mudanças novas e retorna quantas foram escritas."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        since = int(self.db.get_export_watermark(self.EXPORT_NAME) or 0)
+        total = 0
+
+        while True:
+            mudancas = self.db.get_changes(since=since, limit=self.batch_size)
+            if not mudancas:
+                break
+            self._rotacionar_se_cheio()
+            with open(self.caminho_atual, "a", encoding="utf-8") as f:
+                for m in mudancas:
+                    f.write(json.dumps(m, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            since = mudancas[-1]['seq']
+            self.db.set_export_watermark(self.EXPORT_NAME, str(since))
+            total += len(mudancas)
+
+        if total:
+            print(f"-> {total} mudanças gravadas em {self.caminho_atual} (seq até {since})")
+        return total
+
+    def _rotacionar_se_cheio(self):
+        caminho = self.caminho_atual
+        if not os.path.exists(caminho) or os.path.getsize(caminho) < self.max_bytes:
+            return
+        with open(caminho, encoding="utf-8") as f:
+            primeiro = json.loads(f.readline())['seq']
+        # Seq com zeros à esquerda: a ordem alfabética dos arquivos é a ordem do feed
+        os.replace(caminho, os.path.join(self.output_dir, f"changes-{primeiro:012d}.jsonl"))
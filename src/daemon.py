@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import signal
+import threading
+from typing import Dict, Any, List, Optional
+from playwright.sync_api import sync_playwright
+from src.database import DatabaseManager
+from src.search_scraper import MercadoLivreSearch
+from src.detail_scraper import MercadoLivreDetail
+from src.scheduler import EnrichmentScheduler
+from src.metrics import registrar_erro, salvar_resumo
+from src.watchdog import MemoryWatchdog
+from src.proxy_pool import ProxyPool
+from src.change_feed import ChangeFeedWriter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+class RunLock:
+    """
+    Trava exclusiva por arquivo: impede que duas execuções (cron, daemon)
+    trabalhem no mesmo banco ao mesmo tempo.
+    """
+
+    def __init__(self, path: str = os.path.join("data", "ml_scraper.lock")):
+        self.path = path
+        self._fh = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "a+")
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._fh.close()
+            self._fh = None
+            return False
+        self._fh.seek(0)
+        self._fh.truncate()
+        self._fh.write(str(os.getpid()))
+        self._fh.flush()
+        return True
+
+    def release(self):
+        if self._fh:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise RuntimeError(f"Outra execução já está em andamento (trava: {self.path}).")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def carregar_agenda(path: str) -> Dict[str, Any]:
+    """
+    Lê a agenda em JSON. Formato:
+    {
+      "headless": true,
+      "jobs": [
+        {"name": "lustres", "type": "search", "terms": ["lustre sindora"], "pages": 3, "every_minutes": 60},
+        {"name": "detalhes", "type": "detail", "every_minutes": 120, "limit": 50,
+         "time_budget": 30, "filters": {"min_price": 100, "only_new": true}}
+      ]
+    }
+    """
+    with open(path, encoding="utf-8") as f:
+        agenda = json.load(f)
+
+    jobs = agenda.get("jobs", [])
+    nomes = set()
+    for job in jobs:
+        if job.get("type") not in ("search", "detail"):
+            raise ValueError(f"Job '{job.get('name')}': type deve ser 'search' ou 'detail'.")
+        if not job.get("name") or job["name"] in nomes:
+            raise ValueError("Cada job precisa de um 'name' único.")
+        if job["type"] == "search" and not job.get("terms"):
+            raise ValueError(f"Job '{job['name']}': jobs de busca precisam de 'terms'.")
+        if float(job.get("every_minutes", 0)) <= 0:
+            raise ValueError(f"Job '{job['name']}': 'every_minutes' deve ser positivo.")
+        nomes.add(job["name"])
+    return agenda
+
+
+class ScraperDaemon:
+    """
+    Processo de longa duração: mantém um navegador e uma conexão ao banco abertos
+    e executa os jobs de busca/detalhe conforme a agenda.
+    - Jobs rodam em sequência (nunca sobrepostos) e a RunLock impede outra execução em paralelo.
+    - SIGTERM/SIGINT: termina o item atual e encerra limpo.
+    - SIGHUP ou alteração do arquivo: recarrega a agenda sem reiniciar.
+    """
+
+    def __init__(self, db: DatabaseManager, schedule_path: str, watchdog: Optional[MemoryWatchdog] = None,
+                 proxy_pool: Optional[ProxyPool] = None, change_feed: Optional[ChangeFeedWriter] = None):
+        self.db = db
+        self.schedule_path = schedule_path
+        # Memória do navegador persistente: reinicia entre jobs ou no meio do detalhe
+        self.watchdog = watchdog or MemoryWatchdog()
+        self.proxy_pool = proxy_pool
+        # Feed JSONL de mudanças (opcional): atualizado ao fim de cada job
+        self.change_feed = change_feed
+        self.stop_event = threading.Event()
+        self.jobs: List[Dict[str, Any]] = []
+        self.headless = True
+        self.proxima_execucao: Dict[str, float] = {}
+        self._agenda_mtime: Optional[float] = None
+        self._recarregar = False
+        self.playwright = None
+        self.browser = None
+
+    # --- Agenda ---
+
+    def _carregar(self):
+        try:
+            agenda = carregar_agenda(self.schedule_path)
+        except (OSError, ValueError) as e:
+            if not self.jobs:
+                raise
+            print(f"[DAEMON] Agenda inválida, mantendo a anterior: {e}")
+            return
+        finally:
+            self._agenda_mtime = os.path.getmtime(self.schedule_path) if os.path.exists(self.schedule_path) else None
+
+        self.jobs = agenda["jobs"]
+        self.headless = agenda.get("headless", True)
+        agora = time.monotonic()
+        # Jobs novos rodam já; os existentes mantêm o horário calculado
+        self.proxima_execucao = {j["name"]: self.proxima_execucao.get(j["name"], agora) for j in self.jobs}
+        print(f"[DAEMON] Agenda carregada: {[j['name'] for j in self.jobs]}")
+
+    def _agenda_alterada(self) -> bool:
+        if self._recarregar:
+            self._recarregar = False
+            return True
+        try:
+            return os.path.getmtime(self.schedule_path) != self._agenda_mtime
+        except OSError:
+            return False
+
+    # --- Sinais ---
+
+    def _instalar_sinais(self):
+        def parar(signum, frame):
+            print(f"\n[DAEMON] Sinal {signum} recebido. Encerrando após o item atual...")
+            self.stop_event.set()
+
+        def recarregar(signum, frame):
+            self._recarregar = True
+
+        signal.signal(signal.SIGTERM, parar)
+        signal.signal(signal.SIGINT, parar)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, recarregar)
+
+    # --- Navegador ---
+
+    def _garantir_navegador(self):
+        if self.browser is not None and self.browser.is_connected():
+            return
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        print("🚀 [DAEMON] Iniciando navegador persistente...")
+        if self.proxy_pool:
+            self.browser = self.playwright.chromium.launch(headless=self.headless, proxy=ProxyPool.LAUNCH_PROXY,
+                                                           args=MercadoLivreDetail.BROWSER_ARGS + self.proxy_pool.launch_args)
+        else:
+            self.browser = self.playwright.chromium.launch(headless=self.headless, args=MercadoLivreDetail.BROWSER_ARGS)
+
+    def _reiniciar_navegador(self):
+        """Fecha e relança o navegador persistente (chamado pelo watchdog)."""
+        try:
+            if self.browser: self.browser.close()
+        except Exception:
+            pass
+        self.browser = None
+        self._garantir_navegador()
+        return self.browser
+
+    def _fechar_navegador(self):
+        try:
+            if self.browser: self.browser.close()
+        except Exception:
+            pass
+        if self.playwright: self.playwright.stop()
+        self.browser = None
+        self.playwright = None
+
+    # --- Execução ---
+
+    def run(self):
+        self._carregar()
+        self._instalar_sinais()
+        try:
+            while not self.stop_event.is_set():
+                if self._agenda_alterada():
+                    self._carregar()
+
+                agora = time.monotonic()
+                vencidos = [j for j in self.jobs if self.proxima_execucao[j["name"]] <= agora]
+                if not vencidos:
+                    proxima = min(self.proxima_execucao.values(), default=agora + 60)
+                    # Acorda no máximo a cada 5s para checar sinais e a agenda
+                    self.stop_event.wait(min(max(proxima - agora, 0.1), 5))
+                    continue
+
+                job = min(vencidos, key=lambda j: self.proxima_execucao[j["name"]])
+                self.proxima_execucao[job["name"]] = agora + float(job["every_minutes"]) * 60
+                self._executar_job(job)
+        finally:
+            self._fechar_navegador()
+            self.db.close()
+            print("[DAEMON] Encerrado.")
+
+    def _executar_job(self, job: Dict[str, Any]):
+        print(f"\n[DAEMON] >>> Job '{job['name']}' ({job['type']})")
+        inicio = time.monotonic()
+        try:
+            motivo = self.watchdog.motivo_reciclagem()
+            if motivo and self.browser is not None:
+                print(f"♻️ [DAEMON] Reiniciando navegador (motivo: {motivo})...")
+                self._reiniciar_navegador()
+                self.watchdog.registrar_reinicio(motivo)
+            self._garantir_navegador()
+            if job["type"] == "search":
+                bot = MercadoLivreSearch(self.db, browser=self.browser)
+                bot.proxy_pool = self.proxy_pool
+                bot.stop_event = self.stop_event
+                bot.run(job["terms"], pages_per_term=int(job.get("pages", 3)))
+            else:
+                self._executar_detalhe(job)
+        except Exception as e:
+            registrar_erro('daemon.job', e)
+            print(f"[DAEMON] Job '{job['name']}' falhou: {e}")
+            # Navegador pode ter caído: relança na próxima execução
+            if self.browser is not None and not self.browser.is_connected():
+                self.browser = None
+        print(f"[DAEMON] <<< Job '{job['name']}' concluído em {time.monotonic() - inicio:.0f}s")
+        # Métricas acumuladas desde o início do processo
+        salvar_resumo(os.path.join("data", "metrics", "daemon_latest.json"))
+        if self.proxy_pool:
+            self.proxy_pool.salvar_estado()
+        if self.change_feed:
+            try:
+                self.change_feed.run()
+            except OSError as e:
+                registrar_erro('daemon.changes', e)
+                print(f"[DAEMON] Falha ao gravar o feed de mudanças: {e}")
+
+    def _executar_detalhe(self, job: Dict[str, Any]):
+        filtros = job.get("filters", {})
+        deadline = None
+        if job.get("time_budget"):
+            orcamento_s = float(job["time_budget"]) * 60
+            candidatos = EnrichmentScheduler(self.db).selecionar(self.db.get_enrichment_pool(**filtros), orcamento_s)
+            deadline = time.monotonic() + orcamento_s
+        else:
+            candidatos = self.db.get_candidates_for_enrichment(**filtros, limit=int(job.get("limit", 20)))
+
+        print(f"-> {len(candidatos)} candidatos para enriquecimento.")
+        if candidatos:
+            bot = MercadoLivreDetail(self.db, browser=self.browser, watchdog=self.watchdog)
+            bot.stop_event = self.stop_event
+            bot.on_browser_recycle = self._reiniciar_navegador
+            bot.proxy_pool = self.proxy_pool
+            bot.run(candidatos, deadline=deadline)
+            self.browser = bot.browser
@@ -1,21 +1,82 @@
 import sqlite3
 import json
 import os
+import re
+import zlib
+import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# --- Armazenamento deduplicado de textos ---
+
+def _comprimir_texto(texto: str) -> bytes:
+    return zlib.compress(texto.encode('utf-8'), 6)
+
+def _descomprimir_texto(blob: Optional[bytes]) -> Optional[str]:
+    if blob is None: return None
+    return zlib.decompress(blob).decode('utf-8')
+
+def _hash_texto(texto: str) -> str:
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+def conectar(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """
+    Abre a conexão registrando ml_inflate(), usada pelas views (products_expanded,
+    products_fts_source) para ler os textos comprimidos. Leituras dessas views precisam
+    passar por aqui; escritas funcionam em qualquer conexão (os triggers não usam a função).
+    read_only=True abre com mode=ro (consultas rápidas que não podem alterar o banco).
+    """
+    # timeout maior: busca e detalhe podem gravar ao mesmo tempo (modo full em pipeline)
+    if read_only:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    else:
+        conn = sqlite3.connect(db_path, timeout=30)
+    conn.create_function("ml_inflate", 1, _descomprimir_texto, deterministic=True)
+    return conn
 
 class DatabaseManager:
     """
     Gerencia a persistência de dados em SQLite.
     """
 
-    def __init__(self, db_name: str = "ml_intelligence.db"):
-        os.makedirs("data", exist_ok=True)
-        self.db_path = os.path.join("data", db_name)
+    def __init__(self, db_name: str = "ml_intelligence.db", persistent: bool = False, data_dir: str = "data",
+                 read_only: bool = False):
+        self.db_path = os.path.join(data_dir, db_name)
+        # persistent=True reaproveita uma única conexão (processos longos, ex: modo daemon).
+        # Nesse caso o DatabaseManager deve ser usado por uma única thread.
+        self.persistent = persistent
+        # read_only=True: só consultas (stats/query/top). Não cria nem migra tabelas.
+        self.read_only = read_only
+        self._conn: Optional[sqlite3.Connection] = None
+        # Cache sha1 -> id dos textos já gravados (evita consultas repetidas)
+        self._text_ids: Dict[Tuple[str, str], int] = {}
+
+        if read_only:
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(f"Banco não encontrado: {self.db_path}. Rode a busca primeiro.")
+            return
+        os.makedirs(data_dir, exist_ok=True)
         self._setup_tables()
 
     def _get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        if not self.persistent:
+            return conectar(self.db_path, self.read_only)
+        if self._conn is None:
+            self._conn = conectar(self.db_path, self.read_only)
+        return self._conn
+
+    def close(self):
+        """Fecha a conexão persistente (se houver)."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _fetch_dicts(conn: sqlite3.Connection, sql: str, params=()) -> List[Dict[str, Any]]:
+        # row_factory no cursor (e não na conexão) para não afetar uma conexão compartilhada
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return [dict(row) for row in cursor.execute(sql, params).fetchall()]
 
     def _setup_tables(self):
         """
@@ -41,25 +102,34 @@ class DatabaseManager:
             is_international INTEGER,
             ranking_search INTEGER,
             is_first_page INTEGER,
+            catalog_id TEXT,                -- produto de catálogo (/p/MLB…) compartilhado por vários anúncios
+            item_id TEXT,                   -- anúncio (MLB…) exibido no card
             
             -- Dados de Detalhe (Enriched)
             brand TEXT,
             model TEXT,
             specifications_json TEXT,
-            categories_json TEXT,
+            categories_id INTEGER,          -- -> categories.id
             reviews_rating_count INTEGER,
             last_comment_date TEXT,
             days_since_last_comment INTEGER,
-            ai_summary TEXT,
+            ai_summary_id INTEGER,          -- -> texts.id
             immediate_availability INTEGER,         
-            description TEXT,              
+            description_id INTEGER,         -- -> texts.id
             comments_total_available INTEGER,
             comments_fetched_count INTEGER,
             comments_last_90d INTEGER,
             
+            -- Controle do Agendador
+            price_at_enrichment REAL,
+            sales_at_enrichment INTEGER,    -- sales_qty_search no enriquecimento (velocidade de vendas)
+            last_enrich_seconds REAL,
+            enriched_at DATETIME,
+            
             seller_name TEXT,
             status TEXT DEFAULT 'DISCOVERED',
-            last_updated DATETIME
+            last_updated DATETIME,
+            row_version INTEGER             -- versão da linha (exportação incremental), ver _setup_row_versions
         );
         """
         
@@ -69,16 +139,324 @@ class DatabaseManager:
             is_official_store INTEGER,
             sales_level TEXT,
             total_sales_history INTEGER,
-            last_updated DATETIME
+            last_updated DATETIME,
+            row_version INTEGER
+        );
+        """
+
+        # Controle das exportações incrementais (ex: Parquet)
+        sql_export = """
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            export_name TEXT PRIMARY KEY,
+            watermark DATETIME,
+            exported_at DATETIME
+        );
+        """
+
+        # Textos longos (descrição, resumo IA) endereçados por conteúdo e comprimidos com zlib
+        sql_texts = """
+        CREATE TABLE IF NOT EXISTS texts (
+            id INTEGER PRIMARY KEY,
+            sha1 TEXT UNIQUE NOT NULL,
+            content BLOB
+        );
+        """
+
+        # Dimensão de caminhos de categoria (JSON da breadcrumb)
+        sql_categories = """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            sha1 TEXT UNIQUE NOT NULL,
+            categories_json TEXT
         );
         """
 
+        # Todos os termos (busca ou link) em que cada produto apareceu, com a melhor posição.
+        # products.search_term guarda só o termo da primeira aparição na execução.
+        sql_search_terms = """
+        CREATE TABLE IF NOT EXISTS product_search_terms (
+            ml_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            ranking_search INTEGER,
+            is_first_page INTEGER,
+            last_seen DATETIME,
+            PRIMARY KEY (ml_id, term)
+        ) WITHOUT ROWID;
+        """
+
+        # Leitura transparente: mesmas colunas de antes, textos já descomprimidos
+        sql_view = """
+        CREATE VIEW IF NOT EXISTS products_expanded AS
+        SELECT p.*,
+               c.categories_json AS categories_json,
+               ml_inflate(a.content) AS ai_summary,
+               ml_inflate(d.content) AS description
+        FROM products p
+        LEFT JOIN categories c ON c.id = p.categories_id
+        LEFT JOIN texts a ON a.id = p.ai_summary_id
+        LEFT JOIN texts d ON d.id = p.description_id;
+        """
+
         with self._get_connection() as conn:
             conn.execute(sql_products)
             conn.execute(sql_sellers)
+            conn.execute(sql_export)
+            conn.execute(sql_texts)
+            conn.execute(sql_categories)
+            conn.execute(sql_search_terms)
+            self._ensure_columns(conn, 'products', {
+                'price_at_enrichment': 'REAL',
+                'sales_at_enrichment': 'INTEGER',
+                'last_enrich_seconds': 'REAL',
+                'categories_id': 'INTEGER',
+                'ai_summary_id': 'INTEGER',
+                'description_id': 'INTEGER',
+                'catalog_id': 'TEXT',
+                'item_id': 'TEXT',
+                'enriched_at': 'DATETIME',
+                'row_version': 'INTEGER',
+            })
+            self._ensure_columns(conn, 'sellers', {'row_version': 'INTEGER'})
+            self._migrate_legacy_text_columns(conn)
+            conn.execute(sql_view)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_products_last_updated ON products(last_updated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sellers_last_updated ON sellers(last_updated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_product_search_terms_term ON product_search_terms(term)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_products_catalog ON products(catalog_id)")
+            self._setup_row_versions(conn)
+
+        self._setup_fulltext()
+        self._setup_change_log()
+
+    @staticmethod
+    def _ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+        """Adiciona colunas novas em bancos criados por versões anteriores."""
+        existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for col, tipo in columns.items():
+            if col not in existentes:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {tipo}")
+
+    # Tabelas versionadas -> chave primária
+    VERSIONED_TABLES = {'products': 'ml_id', 'sellers': 'seller_name'}
+
+    def _setup_row_versions(self, conn: sqlite3.Connection):
+        """
+        row_version: número crescente atribuído por trigger a cada inserção ou alteração da linha,
+        dentro da própria transação de escrita. Como o SQLite tem um único escritor por vez,
+        a ordem das versões é a ordem de commit: uma transação ainda aberta sempre recebe versão
+        maior que as já gravadas. last_updated não serve para isso (é calculado em Python antes
+        de esperar o lock, e pode ser mais antigo que o de linhas já gravadas).
+        Linhas de bancos antigos recebem versões na ordem de last_updated.
+        """
+        for table, chave in self.VERSIONED_TABLES.items():
+            pendentes = conn.execute(
+                f"SELECT {chave} FROM {table} WHERE row_version IS NULL ORDER BY COALESCE(last_updated, ''), {chave}"
+            ).fetchall()
+            if pendentes:
+                base = conn.execute(f"SELECT COALESCE(MAX(row_version), 0) FROM {table}").fetchone()[0]
+                conn.executemany(f"UPDATE {table} SET row_version = ? WHERE {chave} = ?",
+                                 ((base + i, k) for i, (k,) in enumerate(pendentes, start=1)))
+
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_row_version ON {table}(row_version)")
+            proxima = f"UPDATE {table} SET row_version = (SELECT COALESCE(MAX(row_version), 0) + 1 FROM {table}) WHERE rowid = NEW.rowid;"
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_ai AFTER INSERT ON {table} BEGIN
+                {proxima}
+            END;
+            """)
+            # O WHEN evita que a própria atualização da versão dispare o trigger de novo
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_au AFTER UPDATE ON {table}
+            WHEN NEW.row_version IS OLD.row_version BEGIN
+                {proxima}
+            END;
+            """)
+
+    def _store_text(self, conn: sqlite3.Connection, texto: Optional[str]) -> Optional[int]:
+        """Grava (se novo) o texto comprimido e retorna seu id. Textos iguais compartilham a mesma linha."""
+        if texto is None: return None
+        return self._store_dedup(conn, 'texts', 'content', texto, _comprimir_texto(texto))
+
+    def _store_categories(self, conn: sqlite3.Connection, categorias_json: Optional[str]) -> Optional[int]:
+        if categorias_json is None: return None
+        return self._store_dedup(conn, 'categories', 'categories_json', categorias_json, categorias_json)
+
+    def _store_dedup(self, conn: sqlite3.Connection, table: str, col: str, chave: str, valor: Any) -> int:
+        sha1 = _hash_texto(chave)
+        cache_key = (table, sha1)
+        text_id = self._text_ids.get(cache_key)
+        if text_id is None:
+            conn.execute(f"INSERT OR IGNORE INTO {table} (sha1, {col}) VALUES (?, ?)", (sha1, valor))
+            text_id = conn.execute(f"SELECT id FROM {table} WHERE sha1 = ?", (sha1,)).fetchone()[0]
+            if len(self._text_ids) >= 50000:
+                self._text_ids.clear()
+            self._text_ids[cache_key] = text_id
+        return text_id
+
+    def _migrate_legacy_text_columns(self, conn: sqlite3.Connection):
+        """
+        Bancos antigos guardavam description, ai_summary e categories_json direto em 'products'.
+        Move esses valores para as tabelas deduplicadas e remove as colunas.
+        """
+        colunas = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+        legado = [c for c in ('description', 'ai_summary', 'categories_json') if c in colunas]
+        if not legado:
+            return
+
+        print("[DB] Migrando textos para armazenamento deduplicado (execução única)...")
+        # Triggers/FTS antigos referenciam as colunas legadas e impedem o DROP COLUMN
+        for trigger in ('products_fts_ai', 'products_fts_ad', 'products_fts_au'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS products_fts")
 
-    def upsert_product_from_search(self, item: Dict[str, Any]):
-        # (Este método permanece INALTERADO, mantendo a lógica aprovada anteriormente)
+        sel = ", ".join(legado)
+        rows = conn.execute(f"SELECT ml_id, {sel} FROM products WHERE " + " OR ".join(f"{c} IS NOT NULL" for c in legado)).fetchall()
+        for row in rows:
+            valores = dict(zip(legado, row[1:]))
+            conn.execute(
+                "UPDATE products SET description_id = ?, ai_summary_id = ?, categories_id = ? WHERE ml_id = ?",
+                (
+                    self._store_text(conn, valores.get('description')),
+                    self._store_text(conn, valores.get('ai_summary')),
+                    self._store_categories(conn, valores.get('categories_json')),
+                    row[0],
+                )
+            )
+
+        for col in legado:
+            try:
+                conn.execute(f"ALTER TABLE products DROP COLUMN {col}")
+            except sqlite3.OperationalError:
+                # SQLite < 3.35 não tem DROP COLUMN: ao menos libera o espaço
+                conn.execute(f"UPDATE products SET {col} = NULL")
+        print(f"[DB] {len(rows)} produtos migrados.")
+
+    def _setup_fulltext(self):
+        """
+        Índice FTS5 (conteúdo externo) sobre título, descrição e resumo IA.
+        Mantido pelas escritas do DatabaseManager (_atualizar_fulltext), e não por triggers:
+        um trigger precisaria de ml_inflate, e qualquer conexão sem a função (sqlite3 puro,
+        ferramentas externas) falharia ao gravar em products.
+        Na primeira criação indexa as linhas já existentes.
+        """
+        # Os textos ficam comprimidos em 'texts': o índice lê o conteúdo por esta view
+        sql_source = """
+        CREATE VIEW IF NOT EXISTS products_fts_source AS
+        SELECT p.rowid AS product_rowid,
+               p.title AS title,
+               ml_inflate(d.content) AS description,
+               ml_inflate(a.content) AS ai_summary
+        FROM products p
+        LEFT JOIN texts d ON d.id = p.description_id
+        LEFT JOIN texts a ON a.id = p.ai_summary_id;
+        """
+
+        sql_fts = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            title, description, ai_summary,
+            content='products_fts_source', content_rowid='product_rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        """
+
+        with self._get_connection() as conn:
+            existia = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+            conn.execute(sql_source)
+            conn.execute(sql_fts)
+            # Versões anteriores mantinham o índice por triggers que chamavam ml_inflate
+            for trigger in ('products_fts_ai', 'products_fts_ad', 'products_fts_au'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+        if not existia:
+            self.rebuild_fulltext_index()
+
+    SQL_LINHA_FTS = "SELECT rowid, title, description_id, ai_summary_id FROM products WHERE ml_id = ?"
+
+    def _linha_fts(self, conn: sqlite3.Connection, ml_id: str) -> Optional[Tuple]:
+        """(rowid, title, description_id, ai_summary_id) do produto, ou None se não existe."""
+        return conn.execute(self.SQL_LINHA_FTS, (ml_id,)).fetchone()
+
+    def _atualizar_fulltext(self, conn: sqlite3.Connection, antes: Optional[Tuple], depois: Optional[Tuple]):
+        """Troca no índice FTS os textos de 'antes' pelos de 'depois' (linhas de _linha_fts)."""
+        if antes == depois:
+            return
+        if antes is not None:
+            conn.execute("INSERT INTO products_fts(products_fts, rowid, title, description, ai_summary) VALUES ('delete', ?, ?, ?, ?)",
+                         self._textos_fts(conn, antes))
+        if depois is not None:
+            conn.execute("INSERT INTO products_fts(rowid, title, description, ai_summary) VALUES (?, ?, ?, ?)",
+                         self._textos_fts(conn, depois))
+
+    @staticmethod
+    def _textos_fts(conn: sqlite3.Connection, linha: Tuple) -> Tuple:
+        rowid, titulo, descricao_id, resumo_id = linha
+        def ler(text_id):
+            if text_id is None: return None
+            row = conn.execute("SELECT content FROM texts WHERE id = ?", (text_id,)).fetchone()
+            return _descomprimir_texto(row[0]) if row else None
+        return (rowid, titulo, ler(descricao_id), ler(resumo_id))
+
+    # Campos de products cujas alterações vão para o feed de mudanças (product_changes)
+    TRACKED_FIELDS = ('price_current', 'price_original', 'sales_qty_search', 'ranking_search', 'status', 'seller_name')
+
+    def _setup_change_log(self):
+        """
+        Feed de mudanças (CDC): triggers gravam em product_changes cada campo rastreado
+        que de fato mudou, com seq crescente. Produto novo gera um registro de 'status' (NULL -> DISCOVERED).
+        """
+        sql_changes = """
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            ml_id TEXT NOT NULL,
+            field TEXT NOT NULL,
+            old_value,
+            new_value,
+            changed_at DATETIME
+        );
+        """
+        sql_triggers = [f"""
+            CREATE TRIGGER IF NOT EXISTS products_cdc_{campo} AFTER UPDATE OF {campo} ON products
+            WHEN OLD.{campo} IS NOT NEW.{campo} BEGIN
+              INSERT INTO product_changes (ml_id, field, old_value, new_value, changed_at)
+              VALUES (NEW.ml_id, '{campo}', OLD.{campo}, NEW.{campo}, NEW.last_updated);
+            END;
+            """ for campo in self.TRACKED_FIELDS]
+        sql_triggers.append("""
+            CREATE TRIGGER IF NOT EXISTS products_cdc_insert AFTER INSERT ON products BEGIN
+              INSERT INTO product_changes (ml_id, field, old_value, new_value, changed_at)
+              VALUES (NEW.ml_id, 'status', NULL, NEW.status, NEW.last_updated);
+            END;
+            """)
+
+        with self._get_connection() as conn:
+            conn.execute(sql_changes)
+            for sql in sql_triggers:
+                conn.execute(sql)
+
+    def get_changes(self, since: int = 0, limit: int = 1000, ml_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Registros de mudança com seq > since, em ordem. O maior seq devolvido é o 'since' da próxima leitura."""
+        query_parts = ["SELECT seq, ml_id, field, old_value, new_value, changed_at FROM product_changes WHERE seq > ?"]
+        params: List[Any] = [since]
+        if ml_id:
+            query_parts.append("AND ml_id = ?")
+            params.append(ml_id)
+        query_parts.append("ORDER BY seq LIMIT ?")
+        params.append(limit)
+        with self._get_connection() as conn:
+            return self._fetch_dicts(conn, "\n".join(query_parts), params)
+
+    def get_last_change_seq(self) -> int:
+        with self._get_connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM product_changes").fetchone()[0]
+
+    def upsert_product_from_search(self, item: Dict[str, Any]) -> bool:
+        """
+        Insere ou atualiza o produto com os dados do card.
+        Se nenhum valor mudou a linha não é reescrita (nem last_updated): em varreduras
+        recorrentes a maioria dos cards é igual e a regravação só gerava WAL e páginas sujas.
+        "Visto na busca" fica em product_search_terms.last_seen (record_search_hits).
+        Retorna True se a linha foi inserida ou alterada.
+        """
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         sql = """
         INSERT INTO products (
@@ -87,6 +465,7 @@ class DatabaseManager:
             is_best_seller, is_full, is_ad, 
             sales_qty_search, reviews_rating_average, is_international,
             ranking_search, is_first_page,
+            catalog_id, item_id,
             status, last_updated
         ) VALUES (
             :ml_id, :title, :permalink, :search_term, :link_term,
@@ -94,6 +473,7 @@ class DatabaseManager:
             :is_best_seller, :is_full, :is_ad, 
             :sales_qty_search, :reviews_rating_average, :is_international,
             :ranking_search, :is_first_page,
+            :catalog_id, :item_id,
             'DISCOVERED', :last_updated
         )
         ON CONFLICT(ml_id) DO UPDATE SET
@@ -105,17 +485,82 @@ class DatabaseManager:
             is_ad=excluded.is_ad,
             ranking_search=excluded.ranking_search,
             is_first_page=excluded.is_first_page,
-            last_updated=excluded.last_updated;
+            catalog_id=COALESCE(excluded.catalog_id, catalog_id),
+            item_id=COALESCE(excluded.item_id, item_id),
+            last_updated=excluded.last_updated
+        WHERE products.price_current IS NOT excluded.price_current
+           OR products.price_original IS NOT excluded.price_original
+           OR products.sales_qty_search IS NOT excluded.sales_qty_search
+           OR products.search_term IS NOT excluded.search_term
+           OR products.link_term IS NOT excluded.link_term
+           OR products.is_ad IS NOT excluded.is_ad
+           OR products.ranking_search IS NOT excluded.ranking_search
+           OR products.is_first_page IS NOT excluded.is_first_page
+           OR (excluded.catalog_id IS NOT NULL AND products.catalog_id IS NOT excluded.catalog_id)
+           OR (excluded.item_id IS NOT NULL AND products.item_id IS NOT excluded.item_id);
         """
         item['last_updated'] = now
+        item.setdefault('catalog_id', None)
+        item.setdefault('item_id', None)
         for f in ['is_best_seller', 'is_full', 'is_ad', 'is_first_page', 'is_international', 'immediate_availability']:
             item[f] = 1 if item.get(f) else 0
         with self._get_connection() as conn:
-            conn.execute(sql, item)
+            antes = self._linha_fts(conn, item['ml_id'])
+            alterou = conn.execute(sql, item).rowcount > 0
+            if alterou:
+                self._atualizar_fulltext(conn, antes, self._linha_fts(conn, item['ml_id']))
+            return alterou
+
+    # last_seen só é regravado, sem outra mudança no par, depois deste intervalo
+    LAST_SEEN_RESOLUTION = timedelta(days=1)
+
+    def record_search_hits(self, hits: List[Dict[str, Any]]) -> int:
+        """
+        Registra em lote os pares (produto, termo) vistos numa página de busca.
+        Guarda a posição da execução mais recente (a busca envia só a primeira aparição de cada par).
+        Par com a mesma posição não é regravado só para renovar last_seen, a não ser que ele
+        tenha mais de LAST_SEEN_RESOLUTION: numa varredura recorrente quase todos os pares são iguais.
+        Retorna o número de linhas inseridas ou alteradas.
+        """
+        if not hits:
+            return 0
+        now = datetime.now()
+        renovar_antes_de = (now - self.LAST_SEEN_RESOLUTION).strftime("%Y-%m-%d %H:%M:%S")
+        now = now.strftime("%Y-%m-%d %H:%M:%S")
+        sql = """
+        INSERT INTO product_search_terms (ml_id, term, ranking_search, is_first_page, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(ml_id, term) DO UPDATE SET
+            ranking_search=excluded.ranking_search,
+            is_first_page=excluded.is_first_page,
+            last_seen=excluded.last_seen
+        WHERE product_search_terms.ranking_search IS NOT excluded.ranking_search
+           OR product_search_terms.is_first_page IS NOT excluded.is_first_page
+           OR COALESCE(product_search_terms.last_seen, '') < ?;
+        """
+        linhas = [(h['ml_id'], h['term'], h.get('ranking_search'), 1 if h.get('is_first_page') else 0, now, renovar_antes_de)
+                  for h in hits]
+        with self._get_connection() as conn:
+            return conn.executemany(sql, linhas).rowcount
 
-    def upsert_product_details(self, ml_id: str, details: Dict[str, Any], seller_data: Dict[str, Any]):
+    def get_last_seen(self, ml_id: str) -> Optional[str]:
+        """
+        Última vez que o produto apareceu numa busca (mesmo sem mudar nada em products),
+        com resolução de LAST_SEEN_RESOLUTION.
+        """
+        with self._get_connection() as conn:
+            return conn.execute("SELECT MAX(last_seen) FROM product_search_terms WHERE ml_id = ?", (ml_id,)).fetchone()[0]
+
+    def get_search_terms(self, ml_id: str) -> List[Dict[str, Any]]:
+        """Termos em que o produto apareceu, do melhor para o pior posicionamento."""
+        sql = "SELECT term, ranking_search, is_first_page, last_seen FROM product_search_terms WHERE ml_id = ? ORDER BY ranking_search"
+        with self._get_connection() as conn:
+            return self._fetch_dicts(conn, sql, (ml_id,))
+
+    def upsert_product_details(self, ml_id: str, details: Dict[str, Any], seller_data: Dict[str, Any], duration_s: Optional[float] = None):
         """
         Atualiza o produto com os dados ricos, incluindo as 5 novas variáveis.
+        duration_s: tempo gasto no enriquecimento (alimenta a estimativa do agendador).
         """
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -137,14 +582,14 @@ class DatabaseManager:
             brand = ?,
             model = ?,
             specifications_json = ?,
-            categories_json = ?,
+            categories_id = ?,
             
             reviews_rating_count = ?,   
             last_comment_date = ?,       
             days_since_last_comment = ?,
             is_best_seller = ?, 
-            ai_summary = ?,             
-            description = ?,
+            ai_summary_id = ?,             
+            description_id = ?,
             is_international=?,
             immediate_availability=?, 
             
@@ -152,38 +597,53 @@ class DatabaseManager:
             comments_fetched_count = ?,
             comments_last_90d = ?,
             seller_name = ?,
+            catalog_id = COALESCE(?, catalog_id),
+            price_at_enrichment = price_current,
+            sales_at_enrichment = sales_qty_search,
+            last_enrich_seconds = COALESCE(?, last_enrich_seconds),
             status = 'ENRICHED',
+            enriched_at = ?,
             last_updated = ?
         WHERE ml_id = ?
         """
         
-        params = (
-            details.get('marca'),
-            details.get('modelo'),
-            json.dumps(details.get('caracteristicas_completas', {})),
-            json.dumps(details.get('categorias', {})),
+        with self._get_connection() as conn:
+            categorias_id = self._store_categories(conn, json.dumps(details.get('categorias', {})))
+            resumo_id = self._store_text(conn, details.get('resumo_ia'))
+            descricao_id = self._store_text(conn, details.get('descricao'))
+
+            params = (
+                details.get('marca'),
+                details.get('modelo'),
+                json.dumps(details.get('caracteristicas_completas', {})),
+                categorias_id,
             
-            details.get('num_avaliacoes', 0),       
-            details.get('data_ultimo_review'),       
-            details.get('dias_desde_ultimo_review'),
-            details.get('mais_vendido'),
-            details.get('resumo_ia'),               
-            details.get('descricao'),
-            details.get('compra_internacional'),
-            details.get('tempo_disponibilidade'),
+                details.get('num_avaliacoes', 0),       
+                details.get('data_ultimo_review'),       
+                details.get('dias_desde_ultimo_review'),
+                details.get('mais_vendido'),
+                resumo_id,               
+                descricao_id,
+                details.get('compra_internacional'),
+                details.get('tempo_disponibilidade'),
             
-            details.get('total_disponivel', 0),
-            details.get('total_baixado', 0),
-            details.get('ultimos_90d', 0),
-            seller_data.get('nome') if seller_data else None,
-            now,
-            ml_id
-        )
+                details.get('total_disponivel', 0),
+                details.get('total_baixado', 0),
+                details.get('ultimos_90d', 0),
+                seller_data.get('nome') if seller_data else None,
+                details.get('catalog_id'),
+                duration_s,
+                now,
+                now,
+                ml_id
+            )
 
-        with self._get_connection() as conn:
+            antes = self._linha_fts(conn, ml_id)
             conn.execute(sql_product, params)
+            self._atualizar_fulltext(conn, antes, self._linha_fts(conn, ml_id))
 
-    def get_candidates_for_enrichment(self, min_price=0, min_rating=0, min_sales=0,  days_since_update=0, search_term=None, only_new=False, limit=50):
+    def _candidate_filters(self, min_price=0, min_rating=0, min_sales=0, days_since_update=0, search_term=None, only_new=False) -> Tuple[List[str], List[Any]]:
+        """Monta as cláusulas WHERE comuns à seleção de candidatos para enriquecimento."""
 
         cutoff_str = (datetime.now() - timedelta(days=days_since_update)).strftime("%Y-%m-%d %H:%M:%S")
 
@@ -192,12 +652,13 @@ class DatabaseManager:
         else:
             base_query = "WHERE (status = 'DISCOVERED' OR status = 'ENRICHED')"
 
-        query_parts = ["SELECT ml_id, permalink, title, last_updated", "FROM products", base_query]
+        query_parts = [base_query]
 
         params = []
         if search_term:
-            query_parts.append("AND search_term = ?")
-            params.append(search_term)
+            # Também casa produtos que apareceram no termo mas foram gravados com outro
+            query_parts.append("AND (search_term = ? OR ml_id IN (SELECT ml_id FROM product_search_terms WHERE term = ?))")
+            params.extend([search_term, search_term])
 
         query_parts.append("AND price_current >= ?")
         params.append(min_price)
@@ -211,6 +672,18 @@ class DatabaseManager:
         query_parts.append("AND last_updated <= ?")
         params.append(cutoff_str)
 
+        return query_parts, params
+
+    def get_candidates_for_enrichment(self, min_price=0, min_rating=0, min_sales=0,  days_since_update=0, search_term=None, only_new=False, limit=50, ml_ids=None):
+
+        filtros, params = self._candidate_filters(min_price, min_rating, min_sales, days_since_update, search_term, only_new)
+        query_parts = ["SELECT ml_id, permalink, title, last_updated, catalog_id", "FROM products"] + filtros
+
+        # Restringe a ids específicos (ex: itens recém-descobertos pelo pipeline)
+        if ml_ids:
+            query_parts.append(f"AND ml_id IN ({', '.join('?' for _ in ml_ids)})")
+            params.extend(ml_ids)
+
         # query_parts.append("ORDER BY last_updated DESC LIMIT ?")
         query_parts.append("ORDER BY RANDOM() LIMIT ?")
         params.append(limit)
@@ -218,10 +691,257 @@ class DatabaseManager:
         sql = "\n".join(query_parts)
 
         with self._get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(sql, params)
-            return [dict(row) for row in cursor.fetchall()]
-        
+            return self._fetch_dicts(conn, sql, params)
+
+    def get_enrichment_pool(self, min_price=0, min_rating=0, min_sales=0, days_since_update=0, search_term=None, only_new=False) -> List[Dict[str, Any]]:
+        """
+        Mesmos filtros de get_candidates_for_enrichment, sem limite nem sorteio,
+        trazendo as colunas usadas pelo agendador para pontuar cada candidato.
+        """
+        filtros, params = self._candidate_filters(min_price, min_rating, min_sales, days_since_update, search_term, only_new)
+        query_parts = [
+            "SELECT ml_id, permalink, title, last_updated, status,",
+            "       price_current, price_at_enrichment, sales_qty_search, sales_at_enrichment, enriched_at,",
+            "       is_first_page, last_enrich_seconds",
+            "FROM products",
+        ] + filtros
+
+        with self._get_connection() as conn:
+            return self._fetch_dicts(conn, "\n".join(query_parts), params)
+
+    def get_avg_enrichment_seconds(self, sample: int = 200) -> Optional[float]:
+        """Média de segundos por produto nos últimos enriquecimentos medidos."""
+        sql = """
+        SELECT AVG(last_enrich_seconds) FROM (
+            SELECT last_enrich_seconds FROM products
+            WHERE last_enrich_seconds IS NOT NULL
+            ORDER BY last_updated DESC LIMIT ?
+        )
+        """
+        with self._get_connection() as conn:
+            return conn.execute(sql, (sample,)).fetchone()[0]
+
+    def get_catalog_shared_details(self, catalog_id: str, max_age_days: float = 7) -> Optional[Dict[str, Any]]:
+        """
+        Dados comuns a todos os anúncios de um produto de catálogo (ficha, categorias,
+        avaliações/reviews e resumo IA), tirados do anúncio enriquecido mais recentemente.
+        Chaves no formato de upsert_product_details. None se nenhum foi enriquecido há menos de max_age_days.
+        Anúncio cujos reviews anunciados não foram lidos (coleta falhou) não serve de fonte.
+        """
+        desde = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+        sql = """
+        SELECT brand, model, specifications_json, categories_json, reviews_rating_count,
+               last_comment_date, ai_summary, comments_total_available, comments_fetched_count, comments_last_90d
+        FROM products_expanded
+        WHERE catalog_id = ? AND status = 'ENRICHED' AND enriched_at >= ?
+          AND (comments_fetched_count > 0 OR COALESCE(comments_total_available, 0) = 0)
+        ORDER BY enriched_at DESC LIMIT 1
+        """
+        with self._get_connection() as conn:
+            rows = self._fetch_dicts(conn, sql, (catalog_id, desde))
+        if not rows:
+            return None
+        r = rows[0]
+        ultimo = r['last_comment_date']
+        return {
+            'marca': r['brand'],
+            'modelo': r['model'],
+            'caracteristicas_completas': json.loads(r['specifications_json'] or '{}'),
+            'categorias': json.loads(r['categories_json'] or '{}'),
+            'num_avaliacoes': r['reviews_rating_count'],
+            'data_ultimo_review': ultimo,
+            'dias_desde_ultimo_review': (datetime.now() - datetime.strptime(ultimo, '%Y-%m-%d')).days if ultimo else None,
+            'resumo_ia': r['ai_summary'],
+            'total_disponivel': r['comments_total_available'],
+            'total_baixado': r['comments_fetched_count'],
+            'ultimos_90d': r['comments_last_90d'],
+        }
+
+    def get_product(self, ml_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o produto com descrição, resumo IA e categorias já expandidos."""
+        with self._get_connection() as conn:
+            rows = self._fetch_dicts(conn, "SELECT * FROM products_expanded WHERE ml_id = ?", (ml_id,))
+            return rows[0] if rows else None
+
+    # --- Consultas analíticas (leves, usadas pelos modos stats/top) ---
+
+    # critério do modo top -> expressão de ordenação
+    TOP_CRITERIA = {
+        'sales': "sales_qty_search DESC",
+        'rating': "reviews_rating_average DESC, reviews_rating_count DESC",
+        'discount': "(price_original - price_current) / NULLIF(price_original, 0) DESC",
+        'price': "price_current DESC",
+        'recent-reviews': "comments_last_90d DESC",
+    }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Resumo do banco: produtos por status e por termo, vendedores e última atualização."""
+        desde_24h = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            total, ultima, recentes = conn.execute(
+                "SELECT COUNT(*), MAX(last_updated), SUM(last_updated >= ?) FROM products", (desde_24h,)
+            ).fetchone()
+            por_status = dict(conn.execute(
+                "SELECT COALESCE(status, '?'), COUNT(*) FROM products GROUP BY 1 ORDER BY 2 DESC"
+            ).fetchall())
+            por_termo = dict(conn.execute(
+                "SELECT COALESCE(search_term, link_term, '?'), COUNT(*) FROM products GROUP BY 1 ORDER BY 2 DESC LIMIT 10"
+            ).fetchall())
+            vendedores = conn.execute("SELECT COUNT(*) FROM sellers").fetchone()[0]
+
+        return {
+            'products': total,
+            'by_status': por_status,
+            'top_terms': por_termo,
+            'sellers': vendedores,
+            'updated_last_24h': recentes or 0,
+            'last_updated': ultima,
+            'db_size_mb': round(os.path.getsize(self.db_path) / (1024 * 1024), 2),
+        }
+
+    def get_top_products(self, by: str = 'sales', limit: int = 20, search_term: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Ranking de produtos pelo critério de TOP_CRITERIA."""
+        if by not in self.TOP_CRITERIA:
+            raise ValueError(f"Critério inválido: {by}. Use um de {list(self.TOP_CRITERIA)}.")
+
+        query_parts = [
+            "SELECT ml_id, title, price_current, price_original, sales_qty_search,",
+            "       reviews_rating_average, comments_last_90d, seller_name, status",
+            "FROM products WHERE 1=1",
+        ]
+        params: List[Any] = []
+        if search_term:
+            query_parts.append("AND (search_term = ? OR ml_id IN (SELECT ml_id FROM product_search_terms WHERE term = ?))")
+            params.extend([search_term, search_term])
+        query_parts.append(f"ORDER BY {self.TOP_CRITERIA[by]}, ml_id LIMIT ?")
+        params.append(limit)
+
+        with self._get_connection() as conn:
+            return self._fetch_dicts(conn, "\n".join(query_parts), params)
+
+    # --- Busca textual (FTS5) ---
+
+    def rebuild_fulltext_index(self) -> int:
+        """Reconstrói o índice FTS5 a partir das linhas atuais de 'products'."""
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+            return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    @staticmethod
+    def _fts_query(texto: str) -> str:
+        """Converte texto livre em consulta FTS5 segura (AND entre termos, prefixo no último)."""
+        tokens = re.findall(r'\w+', texto or '')
+        if not tokens:
+            return ''
+        partes = [f'"{t}"' for t in tokens]
+        partes[-1] += '*'
+        return ' '.join(partes)
+
+    def search_text(self, query: str, limit: int = 20, search_term: Optional[str] = None, raw: bool = False) -> List[Dict[str, Any]]:
+        """
+        Busca por palavras-chave em título, descrição e resumo IA.
+        Retorna os produtos ordenados por relevância (bm25, título com maior peso) com um trecho destacado.
+        Com raw=True a consulta é repassada como sintaxe FTS5 (ex: 'lustre NOT pendente').
+        """
+        match = query if raw else self._fts_query(query)
+        if not match:
+            return []
+
+        query_parts = [
+            "SELECT p.ml_id, p.title, p.permalink, p.price_current, p.search_term, p.status,",
+            "       bm25(products_fts, 10.0, 1.0, 3.0) AS rank,",
+            "       snippet(products_fts, -1, '[', ']', '…', 12) AS snippet",
+            "FROM products_fts",
+            "JOIN products p ON p.rowid = products_fts.rowid",
+            "WHERE products_fts MATCH ?",
+        ]
+        params = [match]
+        if search_term:
+            query_parts.append("AND (p.search_term = ? OR p.ml_id IN (SELECT ml_id FROM product_search_terms WHERE term = ?))")
+            params.extend([search_term, search_term])
+        query_parts.append("ORDER BY rank LIMIT ?")
+        params.append(limit)
+
+        with self._get_connection() as conn:
+            return self._fetch_dicts(conn, "\n".join(query_parts), params)
+
+    # --- Exportação incremental ---
+
+    # tabela -> origem da leitura
+    EXPORTABLE_TABLES = {
+        'products': 'products_expanded',
+        'sellers': 'sellers',
+    }
+
+    def get_table_schema(self, table: str) -> List[Tuple[str, str]]:
+        """Retorna [(coluna, tipo declarado)] de uma tabela exportável (textos já expandidos)."""
+        if table not in self.EXPORTABLE_TABLES:
+            raise ValueError(f"Tabela não exportável: {table}")
+        origem = self.EXPORTABLE_TABLES[table]
+        with self._get_connection() as conn:
+            return [(row[1], (row[2] or '').upper()) for row in conn.execute(f"PRAGMA table_info({origem})")]
+
+    def get_export_watermark(self, export_name: str) -> Optional[str]:
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT watermark FROM export_watermarks WHERE export_name = ?", (export_name,)).fetchone()
+        return row[0] if row else None
+
+    def set_export_watermark(self, export_name: str, watermark: str):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sql = """
+        INSERT INTO export_watermarks (export_name, watermark, exported_at) VALUES (?, ?, ?)
+        ON CONFLICT(export_name) DO UPDATE SET watermark=excluded.watermark, exported_at=excluded.exported_at;
+        """
+        with self._get_connection() as conn:
+            conn.execute(sql, (export_name, watermark, now))
+
+    def get_max_row_version(self, table: str) -> int:
+        if table not in self.EXPORTABLE_TABLES:
+            raise ValueError(f"Tabela não exportável: {table}")
+        with self._get_connection() as conn:
+            return conn.execute(f"SELECT COALESCE(MAX(row_version), 0) FROM {table}").fetchone()[0]
+
+    def get_row_version_at(self, table: str, last_updated: str) -> int:
+        """
+        Maior versão entre as linhas com last_updated <= last_updated.
+        Converte marcas d'água antigas (por data) em versão.
+        """
+        if table not in self.EXPORTABLE_TABLES:
+            raise ValueError(f"Tabela não exportável: {table}")
+        with self._get_connection() as conn:
+            return conn.execute(
+                f"SELECT COALESCE(MAX(row_version), 0) FROM {table} WHERE COALESCE(last_updated, '') <= ?", (last_updated,)
+            ).fetchone()[0]
+
+    def iter_rows_changed(self, table: str, since: int, until: int, batch_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Percorre as linhas com since < row_version <= until em lotes.
+        Usa paginação por chave (row_version): cada lote é uma consulta curta,
+        sem manter uma transação de leitura aberta que bloqueie o crawler.
+        Linha alterada durante a leitura ganha versão > until e sai na próxima exportação.
+        """
+        if table not in self.EXPORTABLE_TABLES:
+            raise ValueError(f"Tabela não exportável: {table}")
+        origem = self.EXPORTABLE_TABLES[table]
+
+        sql = f"""
+        SELECT * FROM {origem}
+        WHERE row_version > ? AND row_version <= ?
+        ORDER BY row_version
+        LIMIT ?
+        """
+        cursor = since
+        while True:
+            with self._get_connection() as conn:
+                rows = self._fetch_dicts(conn, sql, (cursor, until, batch_size))
+            if not rows:
+                break
+            cursor = rows[-1]['row_version']
+            yield rows
+            if len(rows) < batch_size:
+                break
+
 
 # Obtém dados do banco de dados
 
@@ -239,10 +959,11 @@ def carregar_dados_produtos(db_path="data/ml_intelligence.db"):
         print("Verifique se você está rodando o notebook na raiz do projeto.")
         return None
 
-    conn = sqlite3.connect(db_path)
+    conn = conectar(db_path)
     try:
-        # Lê a tabela inteira e converte para DataFrame
-        df = pd.read_sql_query("SELECT * FROM products", conn)
+        # Lê a tabela inteira (via view que expande os textos deduplicados) e converte para DataFrame
+        tem_view = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_expanded'").fetchone()
+        df = pd.read_sql_query("SELECT * FROM products_expanded" if tem_view else "SELECT * FROM products", conn)
         
         # Opcional: Converter colunas de data que vêm como string
         if 'last_updated' in df.columns:
@@ -269,7 +990,7 @@ def carregar_dados_vendedor(db_path="data/ml_intelligence.db"):
         print("Verifique se você está rodando o notebook na raiz do projeto.")
         return None
 
-    conn = sqlite3.connect(db_path)
+    conn = conectar(db_path)
     try:
         # Lê a tabela inteira e converte para DataFrame
         df = pd.read_sql_query("SELECT * FROM sellers", conn)
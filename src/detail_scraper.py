@@ -1,10 +1,16 @@
 import re
 import time
 import random
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Any, Tuple
-from playwright.sync_api import sync_playwright, BrowserContext, Page
+from typing import Callable, Dict, Any, Iterable, Optional, Tuple
+from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page
 from src.database import DatabaseManager
+from src.metrics import METRICS, STAGE_SECONDS, PRODUCTS_TOTAL, CATALOG_REUSE_TOTAL, PAGE_SOURCE_TOTAL, etapa, registrar_erro, contar_bytes
+from src.watchdog import MemoryWatchdog, drivers_playwright, pid_driver
+from src.proxy_pool import ProxyPool, parece_bloqueio
+from src.profiling import iniciar_trace, parar_trace
+from src.page_state import ler_estado, produto_do_estado
 
 # --- CONFIGURAÇÕES GERAIS (Mantidas do seu script) ---
 USER_AGENTS = [
@@ -49,77 +55,362 @@ class MercadoLivreDetail:
     Lógica portada estritamente do script 'main.py' fornecido pelo usuário.
     """
 
-    def __init__(self, db: DatabaseManager):
+    # Flags Anti-Detecção
+    BROWSER_ARGS = [
+        "--disable-blink-features=AutomationControlled",
+        "--no-sandbox",
+        "--disable-infobars"
+    ]
+
+    # Campos comuns a todos os anúncios de um produto de catálogo (o resto é do anúncio/vendedor)
+    CAMPOS_CATALOGO = (
+        'marca', 'modelo', 'caracteristicas_completas', 'categorias', 'num_avaliacoes',
+        'data_ultimo_review', 'dias_desde_ultimo_review', 'resumo_ia',
+        'total_disponivel', 'total_baixado', 'ultimos_90d',
+    )
+    # Os mesmos campos no formato de 'dados' da página: não são lidos no DOM quando o catálogo é reaproveitado
+    CAMPOS_CATALOGO_PAGINA = ('categorias', 'caracteristicas_completas', 'marca', 'modelo', 'num_avaliacoes', 'num_comentarios', 'resumo_ia')
+    # Com todos estes vindos do estado JSON da página, o bloco do vendedor não é lido no DOM
+    CAMPOS_VENDEDOR = ('nome', 'classificacao', 'vendas_total')
+
+    def __init__(self, db: DatabaseManager, headless: bool = False, browser: Optional[Browser] = None,
+                 watchdog: Optional[MemoryWatchdog] = None):
         self.db = db
-
-    def run(self, candidates: list):
+        self.headless = headless
+        self.playwright = None
+        # Navegador compartilhado (ex: modo daemon). Se None, cada run() abre e fecha o seu.
+        self.browser = browser
+        self._owns_browser = False
+        # Sinal de parada (ex: SIGTERM no daemon): termina o produto atual e sai do loop
+        self.stop_event: Optional[threading.Event] = None
+        # Escala das esperas anti-bloqueio (0 = sem espera, ex: benchmark local)
+        self.delay_scale = 1.0
+        # Memória do navegador: reinicia após o limite de RSS ou N páginas (sempre coleta o pico)
+        self.watchdog = watchdog or MemoryWatchdog()
+        # Com navegador compartilhado, quem é dono dele fornece o reinício (fecha e devolve um novo)
+        self.on_browser_recycle: Optional[Callable[[], Browser]] = None
+        # Pool de proxies (opcional): um proxy por produto, escolhido pelo desempenho recente
+        self.proxy_pool: Optional[ProxyPool] = None
+        # Resultado da última navegação de produto (status HTTP, url final, segundos)
+        self._ultima_navegacao: Optional[Tuple[Optional[int], str, float]] = None
+        # Parte compartilhada por catálogo (None = ainda sem dados recentes), reaproveitada entre anúncios
+        self._catalogos: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.catalog_max_age_days = 7
+
+    def __enter__(self):
+        if self.browser is None:
+            print("🚀 Iniciando Motor do Navegador...")
+            drivers_antes = drivers_playwright()
+            self.playwright = sync_playwright().start()
+            # Mede só o navegador deste driver (no modo full a busca tem o seu)
+            self.watchdog.vigiar(pid_driver(drivers_antes, self.playwright))
+            # Launch persistente
+            self.browser = self._lancar_navegador()
+            self._owns_browser = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._owns_browser:
+            if self.browser: self.browser.close()
+            if self.playwright: self.playwright.stop()
+            self.browser = None
+            self.playwright = None
+            self._owns_browser = False
+            self.watchdog.vigiar(None)
+
+    def run(self, candidates: Iterable[Dict[str, Any]], deadline: Optional[float] = None):
         """
         Executa o loop de processamento para a lista de candidatos.
+        Aceita também um iterável sem tamanho conhecido (ex: fila do pipeline do modo full).
+        deadline: instante (time.monotonic) a partir do qual nenhum produto novo é iniciado.
         """
-        with sync_playwright() as p:
-            print("🚀 Iniciando Motor do Navegador...")
+        with self:
+            self._processar_candidatos(candidates, deadline)
+        print("\n✅ Processo de Detalhamento Finalizado!")
+        self.watchdog.imprimir_resumo()
+
+    def _pausa(self, minimo: float, maximo: Optional[float] = None):
+        if self.delay_scale > 0:
+            time.sleep((random.uniform(minimo, maximo) if maximo is not None else minimo) * self.delay_scale)
+
+    def _processar_candidatos(self, candidates: Iterable[Dict[str, Any]], deadline: Optional[float]):
+        """Loop de produtos sobre o navegador já aberto (próprio ou compartilhado)."""
+        total = len(candidates) if hasattr(candidates, '__len__') else '?'
+        for i, item in enumerate(candidates):
+            if deadline is not None and time.monotonic() >= deadline:
+                restantes = f"{total - i} produtos ficaram" if total != '?' else "Demais produtos ficam"
+                print(f"\n⏱️ Orçamento de tempo esgotado. {restantes} para a próxima execução.")
+                break
+
+            if self.stop_event is not None and self.stop_event.is_set():
+                print("\n🛑 Parada solicitada. Encerrando após o produto atual.")
+                break
+
+            url = item['permalink']
+            ml_id = item['ml_id']
+            catalog_id = item.get('catalog_id')
             
-            # Flags Anti-Detecção
-            args = [
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-infobars"
-            ]
+            print(f"\n--- Processando {i+1}/{total}: {ml_id} ---")
+
+            # Navegador grande demais (ou velho demais): reinicia antes de abrir o próximo produto
+            motivo = self.watchdog.motivo_reciclagem()
+            if motivo:
+                self._reciclar_navegador(motivo)
+
+            # Se o navegador cair no meio do produto, reinicia e retoma o mesmo item (uma vez)
+            if not self._processar_item(ml_id, url, catalog_id) and self._reciclar_navegador('crash'):
+                print(f"   -> Retomando {ml_id} no navegador novo...")
+                self._processar_item(ml_id, url, catalog_id)
+            self.watchdog.registrar_pagina()
+
+            # Delay entre PRODUTOS
+            tempo_espera = random.uniform(3, 7) * self.delay_scale
+            print(f"💤 Aguardando {tempo_espera:.1f}s para o próximo...")
+            with etapa('detail.sleep'):
+                time.sleep(tempo_espera)
+
+    def _processar_item(self, ml_id: str, url: str, catalog_id: Optional[str] = None) -> bool:
+        """
+        Processa um produto em um contexto novo.
+        Retorna False só quando o navegador caiu (o item pode ser refeito após o reinício).
+        """
+        context = None
+        proxy = self.proxy_pool.escolher() if self.proxy_pool else None
+        self._ultima_navegacao = None
+        try:
+            # --- CRIAÇÃO DE CONTEXTO (A cada produto) ---
+            ua_atual = random.choice(USER_AGENTS)
+            extras = {'proxy': proxy.playwright} if proxy else {}
             
-            # Launch persistente
-            browser = p.chromium.launch(headless=False, args=args)
+            context = self.browser.new_context(
+                user_agent=ua_atual,
+                viewport={'width': 1366, 'height': 768},
+                locale='pt-BR',
+                **extras
+            )
             
-            total = len(candidates)
-            for i, item in enumerate(candidates):
-                url = item['permalink']
-                ml_id = item['ml_id']
-                
-                print(f"\n--- Processando {i+1}/{total}: {ml_id} ---")
-                
-                # --- CRIAÇÃO DE CONTEXTO (A cada produto) ---
-                ua_atual = random.choice(USER_AGENTS)
-                
-                context = browser.new_context(
-                    user_agent=ua_atual,
-                    viewport={'width': 1366, 'height': 768},
-                    locale='pt-BR'
-                )
+            # Trace do Playwright nos primeiros produtos com --profile-trace-pages
+            iniciar_trace(context, f"detail_{ml_id}")
+
+            # Injeta script para esconder webdriver
+            context.add_init_script("""
+                Object.defineProperty(navigator, 'webdriver', {
+                    get: () => undefined
+                });
+            """)
+
+            # Chama a função de extração
+            inicio = time.monotonic()
+            product_payload, seller_payload = self._process_product(context, url, catalog_id)
+            
+            # Página de bloqueio/captcha: não grava dados vazios por cima dos bons
+            if self._ultima_navegacao and parece_bloqueio(self._ultima_navegacao[0], self._ultima_navegacao[1]):
+                print(f"   [BLOQUEIO] Página de verificação recebida (status {self._ultima_navegacao[0]}).")
+                if product_payload:
+                    # Nem serve de fonte para os outros anúncios do catálogo (o próximo relê do banco)
+                    self._catalogos.pop(product_payload.get('catalog_id'), None)
+                product_payload = None
+            if proxy:
+                self._registrar_proxy(proxy, product_payload is not None)
+
+            if product_payload:
+                # Salva no Banco de Dados
+                with etapa('detail.upsert'):
+                    self.db.upsert_product_details(ml_id, product_payload, seller_payload, duration_s=time.monotonic() - inicio)
+                METRICS.inc(PRODUCTS_TOTAL, result='ok')
+                print(f"   -> Sucesso! Baixados {product_payload['total_baixado']} comentários.")
+                return True
+
+            METRICS.inc(PRODUCTS_TOTAL, result='fail')
+        except Exception as e:
+            registrar_erro('detail.loop', e)
+            print(f"Erro genérico no loop: {e}")
+        finally:
+            if context is not None:
+                try:
+                    parar_trace(context)
+                    context.close()
+                except Exception:
+                    pass
+        return self.browser is not None and self.browser.is_connected()
+
+    def _registrar_proxy(self, proxy, extraiu: bool):
+        """Informa ao pool o resultado do produto: latência do goto, status e sinais de bloqueio."""
+        if self._ultima_navegacao is None:
+            self.proxy_pool.registrar(proxy, ok=False)
+            return
+        status, url_final, segundos = self._ultima_navegacao
+        bloqueado = parece_bloqueio(status, url_final)
+        ok = extraiu and status is not None and status < 400
+        self.proxy_pool.registrar(proxy, ok=ok, latencia_s=segundos, bloqueado=bloqueado)
+
+    def _lancar_navegador(self) -> Browser:
+        if self.proxy_pool:
+            return self.playwright.chromium.launch(headless=self.headless, args=self.BROWSER_ARGS + self.proxy_pool.launch_args,
+                                                   proxy=ProxyPool.LAUNCH_PROXY)
+        return self.playwright.chromium.launch(headless=self.headless, args=self.BROWSER_ARGS)
+
+    def _reciclar_navegador(self, motivo: str) -> bool:
+        """Fecha e relança o navegador. Retorna False se não há como relançar (navegador de terceiros)."""
+        if self._owns_browser:
+            print(f"♻️ Reiniciando navegador (motivo: {motivo})...")
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = self._lancar_navegador()
+        elif self.on_browser_recycle is not None:
+            print(f"♻️ Reiniciando navegador compartilhado (motivo: {motivo})...")
+            self.browser = self.on_browser_recycle()
+        else:
+            return False
+        self.watchdog.registrar_reinicio(motivo)
+        return True
+
+    @staticmethod
+    def _catalogo_da_pagina(page: Page) -> Optional[str]:
+        """Produto de catálogo do anúncio: URL final (/p/MLB…) ou link canônico."""
+        match = re.search(r'/p/(MLB\d+)', page.url or '')
+        if not match:
+            try:
+                canonico = page.query_selector('link[rel="canonical"]')
+                match = re.search(r'/p/(MLB\d+)', canonico.get_attribute('href') or '') if canonico else None
+            except Exception:
+                match = None
+        return match.group(1) if match else None
+
+    def _dados_catalogo(self, catalog_id: str) -> Optional[Dict[str, Any]]:
+        """Parte compartilhada do catálogo: desta execução ou de um anúncio irmão enriquecido recentemente."""
+        if catalog_id not in self._catalogos:
+            self._catalogos[catalog_id] = self.db.get_catalog_shared_details(catalog_id, self.catalog_max_age_days)
+        return self._catalogos[catalog_id]
+
+    def _coletar_reviews(self, page: Page, dados: Dict[str, Any]) -> bool:
+        """
+        Abre o iframe de reviews (ou lê direto da página) e preenche as contagens e datas em dados.
+        Retorna True se os reviews foram lidos, ou se a página não anuncia nenhum.
+        """
+        t_reviews = time.perf_counter()
+        falhou = False
+        print("      Buscando reviews...")
+        page.evaluate("window.scrollBy(0, 500)")
+        
+        btn_comentarios = page.query_selector('button[data-testid="see-more"]')
+        if not btn_comentarios: btn_comentarios = page.query_selector('button.show-more-click')
+        if not btn_comentarios: btn_comentarios = page.query_selector('a.ui-pdp-reviews__see-more')
+
+        if btn_comentarios:
+            try:
+                self._pausa(1, 2)
+                btn_comentarios.scroll_into_view_if_needed()
+                btn_comentarios.click()
                 
-                # Injeta script para esconder webdriver
-                context.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {
-                        get: () => undefined
-                    });
-                """)
+                elemento_iframe = page.wait_for_selector('iframe#ui-pdp-iframe-reviews', state="attached", timeout=15000)
+                frame_reviews = elemento_iframe.content_frame()
                 
-                try:
-                    # Chama a função de extração
-                    product_payload, seller_payload = self._process_product(context, url)
+                if frame_reviews:
+                    frame_reviews.wait_for_load_state("domcontentloaded")
+                    self._pausa(2)
                     
-                    if product_payload:
-                        # Salva no Banco de Dados
-                        self.db.upsert_product_details(ml_id, product_payload, seller_payload)
-                        print(f"   -> Sucesso! Baixados {product_payload['total_baixado']} comentários.")
+                    scrolls = 0
+                    max_scrolls = 150
                     
-                    # Delay entre PRODUTOS
-                    tempo_espera = random.uniform(3, 7)
-                    print(f"💤 Aguardando {tempo_espera:.1f}s para o próximo...")
-                    time.sleep(tempo_espera)
+                    while scrolls < max_scrolls:
+                        frame_reviews.evaluate("window.scrollBy(0, 1000)")
+                        self._pausa(0.5, 0.9)
+                        
+                        current_scroll = frame_reviews.evaluate("window.scrollY + window.innerHeight")
+                        new_height = frame_reviews.evaluate("document.body.scrollHeight")
+                        
+                        if current_scroll >= new_height:
+                            self._pausa(1.5)
+                            new_height = frame_reviews.evaluate("document.body.scrollHeight")
+                            if frame_reviews.evaluate("window.scrollY + window.innerHeight") >= new_height:
+                                break
+                        scrolls += 1
+
+                    selectors_data = [
+                        'span.ui-review-capability-comments__comment__date',
+                        'p.ui-review-capability-comments__comment__date',
+                        'span.ui-review-card__metadata__date', 'time'
+                    ]
                     
-                except Exception as e:
-                    print(f"Erro genérico no loop: {e}")
-                finally:
-                    context.close()
+                    datas_encontradas = []
+                    for sel in selectors_data:
+                        els = frame_reviews.query_selector_all(sel)
+                        if els:
+                            for el in els:
+                                txt = el.inner_text()
+                                dt = parse_data_ptbr(txt)
+                                if dt: datas_encontradas.append(dt)
+                            if datas_encontradas: break
+                    
+                    if datas_encontradas:
+                        dados['num_comentarios_coletados'] = len(datas_encontradas)
+                        ultima_data = max(datas_encontradas)
+                        dados['data_ultimo_review'] = ultima_data.strftime('%Y-%m-%d') # Ajustado para salvar no DB (ISO 8601)
+                        dados['dias_desde_ultimo_review'] = (datetime.now() - ultima_data).days
+                        
+                        limite = datetime.now() - timedelta(days=90)
+                        recentes = [d for d in datas_encontradas if d >= limite]
+                        dados['n_comentarios_ult_90_dias'] = len(recentes)
+                        
+                        print(f"      [OK] {len(datas_encontradas)} reviews coletados ({len(recentes)} recentes).")
+                    else:
+                        print("      [AVISO] Iframe aberto mas sem datas detectadas.")
+            except Exception as e:
+                registrar_erro('detail.reviews', e)
+                print(f"      [ERRO] Falha ao processar reviews: {e}")
+                falhou = True
+
+        if not btn_comentarios:
+            print("      [INFO] Botão de reviews não encontrado. Coletando direto da página!")
+
+            seletores_inline = [
+                'article.ui-review-capability-comments__comment span.ui-review-capability-comments__comment__date',
+                'span.ui-review-capability-comments__comment__date',
+                'p.ui-review-capability-comments__comment__date',
+                'time'
+            ]
             
-            browser.close()
-            print("\n✅ Processo de Detalhamento Finalizado!")
+            datas_inline = []
+
+            for sel in seletores_inline:
+                els = page.query_selector_all(sel)
+                if els:
+                    for el in els:
+                        txt = el.inner_text()
+                        dt = parse_data_ptbr(txt)
+                        if dt:
+                            datas_inline.append(dt)
+                    if datas_inline:
+                        break
+
+            if datas_inline:
+                dados['num_comentarios_coletados'] = len(datas_inline)
+                ultima_data = max(datas_inline)
+                dados['data_ultimo_review'] = ultima_data.strftime('%Y-%m-%d') # Ajustado para salvar no DB
+                dados['dias_desde_ultimo_review'] = (datetime.now() - ultima_data).days
+                
+                limite = datetime.now() - timedelta(days=90)
+                recentes = [d for d in datas_inline if d >= limite]
+                dados['n_comentarios_ult_90_dias'] = len(recentes)
 
-    def _process_product(self, context: BrowserContext, url_produto: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+                print(f"      [OK] {len(datas_inline)} reviews coletados direto da página ({len(recentes)} recentes).")
+            else:
+                print("      [AVISO] Nenhuma data encontrada no modo inline.")
+
+        METRICS.observe(STAGE_SECONDS, time.perf_counter() - t_reviews, stage='detail.reviews')
+        return not falhou and (bool(dados.get('num_comentarios_coletados')) or not dados.get('num_comentarios'))
+
+    def _process_product(self, context: BrowserContext, url_produto: str, catalog_id: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """
         Função isolada que recebe um CONTEXTO já aberto e processa UM produto.
+        catalog_id: catálogo já conhecido (da busca); se a parte comum dele já foi coletada, pula os reviews.
         """
         print(f"[*] Acessando: {url_produto}")
         page = context.new_page()
+        contar_bytes(page, 'detail')
         
         # Estrutura de dados
         dados = {
@@ -144,101 +435,136 @@ class MercadoLivreDetail:
 
         try:
             # Timeout maior para garantir carregamento
-            page.goto(url_produto, timeout=80000)
-            page.wait_for_load_state("domcontentloaded")
+            with etapa('detail.goto'):
+                inicio_goto = time.monotonic()
+                resposta = page.goto(url_produto, timeout=80000)
+                page.wait_for_load_state("domcontentloaded")
+                self._ultima_navegacao = (resposta.status if resposta else None, page.url, time.monotonic() - inicio_goto)
             
             # Delay aleatório inicial
-            time.sleep(random.uniform(2, 4))
+            with etapa('detail.sleep'):
+                self._pausa(2, 4)
+
+            t_extracao = time.perf_counter()
+
+            # 0. Estado JSON embutido (__PRELOADED_STATE__): o que ele trouxer não é buscado no DOM
+            with etapa('detail.state'):
+                do_estado = produto_do_estado(ler_estado(page))
+            METRICS.inc(PAGE_SOURCE_TOTAL, scraper='detail', source='state' if do_estado else 'dom')
+            vendedor_estado = do_estado.pop('dados_vendedor', {})
+            dados.update(do_estado)
+
+            # Catálogo já enriquecido (nesta execução ou por um anúncio irmão recente): ficha, categorias,
+            # avaliações, reviews e resumo IA vêm dele; desta página só saem os dados do anúncio
+            catalogo = self._catalogo_da_pagina(page) or catalog_id
+            compartilhado = self._dados_catalogo(catalogo) if catalogo else None
+            if compartilhado:
+                print(f"      [CATÁLOGO] {catalogo} já enriquecido: reaproveitando ficha, reviews e resumo IA.")
+                METRICS.inc(CATALOG_REUSE_TOTAL)
+
+            # Campos que não são lidos no DOM: vieram do estado JSON ou do catálogo
+            prontos = set(do_estado) | (set(self.CAMPOS_CATALOGO_PAGINA) if compartilhado else set())
 
             # 1. Título
-            try:
-                h1 = page.query_selector('h1')
-                if h1: dados['titulo'] = h1.inner_text()
-            except: pass
+            if 'titulo' not in prontos:
+                try:
+                    h1 = page.query_selector('h1')
+                    if h1: dados['titulo'] = h1.inner_text()
+                except: pass
 
             # 2. Mais vendido
-            try:
-                el_flag = page.query_selector('a[href*="mais-vendidos"]')
-                dados['mais_vendido'] = 1 if el_flag else 0
-            except: pass
+            if 'mais_vendido' not in prontos:
+                try:
+                    el_flag = page.query_selector('a[href*="mais-vendidos"]')
+                    dados['mais_vendido'] = 1 if el_flag else 0
+                except: pass
 
             # 3. Categorias
-            try:
-                elementos_categoria = page.query_selector_all('ol.andes-breadcrumb li.andes-breadcrumb__item a')
-                if elementos_categoria:
-                    for i, el in enumerate(elementos_categoria, start=1):
-                        dados['categorias'][f"categoria_{i}"] = el.inner_text().strip()
-                else:
-                    container_bread = page.query_selector('ol.andes-breadcrumb')
-                    if container_bread:
-                        partes = container_bread.inner_text().split('\n')
-                        for i, parte in enumerate(partes, start=1):
-                            if parte.strip(): dados['categorias'][f"categoria_{i}"] = parte.strip()
-            except: pass
+            if 'categorias' not in prontos:
+                try:
+                    elementos_categoria = page.query_selector_all('ol.andes-breadcrumb li.andes-breadcrumb__item a')
+                    if elementos_categoria:
+                        for i, el in enumerate(elementos_categoria, start=1):
+                            dados['categorias'][f"categoria_{i}"] = el.inner_text().strip()
+                    else:
+                        container_bread = page.query_selector('ol.andes-breadcrumb')
+                        if container_bread:
+                            partes = container_bread.inner_text().split('\n')
+                            for i, parte in enumerate(partes, start=1):
+                                if parte.strip(): dados['categorias'][f"categoria_{i}"] = parte.strip()
+                except: pass
 
             # 4. Dados do Vendedor
-            try:
-                el_vendedor = page.query_selector('.ui-seller-data-header__title-container span')
-                if not el_vendedor: el_vendedor = page.query_selector('.ui-seller-data-header__title-container h3')
-                if el_vendedor: dados['dados_vendedor']['nome'] = el_vendedor.inner_text().strip()
-
-                el = page.query_selector('.ui-seller-data-status__title')
-                if el:
-                    dados['dados_vendedor']['classificacao'] = el.inner_text().strip()
-                else:
-                    termo = page.query_selector('ul.ui-seller-data-status__thermometer')
-                    v = termo.get_attribute('value') if termo else None
-                    if v and v.isdigit():
-                        dados['dados_vendedor']['classificacao'] = f"level {v}"
+            if not all(k in vendedor_estado for k in self.CAMPOS_VENDEDOR):
+                try:
+                    el_vendedor = page.query_selector('.ui-seller-data-header__title-container span')
+                    if not el_vendedor: el_vendedor = page.query_selector('.ui-seller-data-header__title-container h3')
+                    if el_vendedor: dados['dados_vendedor']['nome'] = el_vendedor.inner_text().strip()
+
+                    el = page.query_selector('.ui-seller-data-status__title')
+                    if el:
+                        dados['dados_vendedor']['classificacao'] = el.inner_text().strip()
                     else:
-                        dados['dados_vendedor']['classificacao'] = "Not Found"
+                        termo = page.query_selector('ul.ui-seller-data-status__thermometer')
+                        v = termo.get_attribute('value') if termo else None
+                        if v and v.isdigit():
+                            dados['dados_vendedor']['classificacao'] = f"level {v}"
+                        else:
+                            dados['dados_vendedor']['classificacao'] = "Not Found"
 
-                el_vendas = page.query_selector('.ui-seller-data-status__info-title')
-                if el_vendas: dados['dados_vendedor']['vendas_total'] = converter_vendas_ml(el_vendas.inner_text())
+                    el_vendas = page.query_selector('.ui-seller-data-status__info-title')
+                    if el_vendas: dados['dados_vendedor']['vendas_total'] = converter_vendas_ml(el_vendas.inner_text())
+                except: pass
 
-                el_loja = page.query_selector('.ui-seller-data-header__subtitle-container')
-                is_loja = False
-                if el_loja:
-                    if "loja oficial" in el_loja.inner_text().lower() or el_loja.query_selector('use[href="#verified_small"]'):
-                        is_loja = True
-                dados['dados_vendedor']['loja_oficial'] = is_loja
-            except: pass
+            # Loja oficial: o estado só confirma o selo; sem ele, vale o DOM (texto ou ícone verificado)
+            if 'loja_oficial' not in vendedor_estado:
+                try:
+                    el_loja = page.query_selector('.ui-seller-data-header__subtitle-container')
+                    is_loja = False
+                    if el_loja:
+                        if "loja oficial" in el_loja.inner_text().lower() or el_loja.query_selector('use[href="#verified_small"]'):
+                            is_loja = True
+                    dados['dados_vendedor']['loja_oficial'] = is_loja
+                except: pass
+            dados['dados_vendedor'].update(vendedor_estado)
 
             # 5. Características
-            try:
-                rows = page.query_selector_all('tr.andes-table__row')
-                for row in rows:
-                    th = row.query_selector('th')
-                    td = row.query_selector('td')
-                    if th and td:
-                        chave = th.inner_text().strip().replace(':', '')
-                        valor = td.inner_text().strip()
-                        dados['caracteristicas_completas'][chave] = valor
-                        if 'Marca' in chave: dados['marca'] = valor
-                        if 'Modelo' in chave: dados['modelo'] = valor
-            except: pass
+            if 'caracteristicas_completas' not in prontos:
+                try:
+                    rows = page.query_selector_all('tr.andes-table__row')
+                    for row in rows:
+                        th = row.query_selector('th')
+                        td = row.query_selector('td')
+                        if th and td:
+                            chave = th.inner_text().strip().replace(':', '')
+                            valor = td.inner_text().strip()
+                            dados['caracteristicas_completas'][chave] = valor
+                            if 'Marca' in chave: dados['marca'] = valor
+                            if 'Modelo' in chave: dados['modelo'] = valor
+                except: pass
 
             # 6. Descrição e IA
-            desc = page.query_selector('.ui-pdp-description__content')
+            desc = page.query_selector('.ui-pdp-description__content') if 'descricao' not in prontos else None
             if desc: dados['descricao'] = desc.inner_text()
-            ia_summary = page.query_selector('.ui-review-capability__summary__plain_text__summary_container')
+            ia_summary = page.query_selector('.ui-review-capability__summary__plain_text__summary_container') if 'resumo_ia' not in prontos else None
             if ia_summary: dados['resumo_ia'] = ia_summary.inner_text()
 
             # 7. Compra Internacional
-            try:
-                dados['compra_internacional'] = False
-                # Verifica se o container existe E se tem o texto "internacional" para evitar falsos positivos
-                container_inter = page.query_selector('#cbt_summary')
-                if container_inter:
-                    if "internacional" in container_inter.inner_text().lower():
-                        dados['compra_internacional'] = True
+            if 'compra_internacional' not in prontos:
+                try:
+                    dados['compra_internacional'] = False
+                    # Verifica se o container existe E se tem o texto "internacional" para evitar falsos positivos
+                    container_inter = page.query_selector('#cbt_summary')
+                    if container_inter:
+                        if "internacional" in container_inter.inner_text().lower():
+                            dados['compra_internacional'] = True
                 
-                # Fallback: Busca específica pelo ícone SVG da compra internacional
-                if not dados['compra_internacional']:
-                    if page.query_selector('.ui-pdp-icon--cbt-summary'):
-                         dados['compra_internacional'] = True
-            except:
-                dados['compra_internacional'] = False
+                    # Fallback: Busca específica pelo ícone SVG da compra internacional
+                    if not dados['compra_internacional']:
+                        if page.query_selector('.ui-pdp-icon--cbt-summary'):
+                             dados['compra_internacional'] = True
+                except:
+                    dados['compra_internacional'] = False
 
             # 8. Disponibilidade / Prazo de fabricação
             try:
@@ -259,123 +585,23 @@ class MercadoLivreDetail:
 
             # 9. Número de comentários e avaliações
             try:
-                lbl_avaliacoes = page.query_selector('p.ui-review-capability__rating__label')
+                lbl_avaliacoes = page.query_selector('p.ui-review-capability__rating__label') if 'num_avaliacoes' not in prontos else None
                 if lbl_avaliacoes:
                     nums = re.findall(r'\d+', lbl_avaliacoes.inner_text().replace('.', ''))
                     if nums: dados['num_avaliacoes'] = int(nums[0])
                 
-                span_op = page.query_selector('span.total-opinion')
+                span_op = page.query_selector('span.total-opinion') if 'num_comentarios' not in prontos else None
                 if span_op:
                     nums = re.findall(r'\d+', span_op.inner_text())
                     if nums: dados['num_comentarios'] = int(nums[0])
             except: pass
 
-            # 10. Reviews
-            print("      Buscando reviews...")
-            page.evaluate("window.scrollBy(0, 500)")
-            
-            btn_comentarios = page.query_selector('button[data-testid="see-more"]')
-            if not btn_comentarios: btn_comentarios = page.query_selector('button.show-more-click')
-            if not btn_comentarios: btn_comentarios = page.query_selector('a.ui-pdp-reviews__see-more')
+            METRICS.observe(STAGE_SECONDS, time.perf_counter() - t_extracao, stage='detail.extract')
 
-            if btn_comentarios:
-                try:
-                    time.sleep(random.uniform(1, 2))
-                    btn_comentarios.scroll_into_view_if_needed()
-                    btn_comentarios.click()
-                    
-                    elemento_iframe = page.wait_for_selector('iframe#ui-pdp-iframe-reviews', state="attached", timeout=15000)
-                    frame_reviews = elemento_iframe.content_frame()
-                    
-                    if frame_reviews:
-                        frame_reviews.wait_for_load_state("domcontentloaded")
-                        time.sleep(2)
-                        
-                        scrolls = 0
-                        max_scrolls = 150
-                        
-                        while scrolls < max_scrolls:
-                            frame_reviews.evaluate("window.scrollBy(0, 1000)")
-                            time.sleep(random.uniform(0.5, 0.9))
-                            
-                            current_scroll = frame_reviews.evaluate("window.scrollY + window.innerHeight")
-                            new_height = frame_reviews.evaluate("document.body.scrollHeight")
-                            
-                            if current_scroll >= new_height:
-                                time.sleep(1.5)
-                                new_height = frame_reviews.evaluate("document.body.scrollHeight")
-                                if frame_reviews.evaluate("window.scrollY + window.innerHeight") >= new_height:
-                                    break
-                            scrolls += 1
-
-                        selectors_data = [
-                            'span.ui-review-capability-comments__comment__date',
-                            'p.ui-review-capability-comments__comment__date',
-                            'span.ui-review-card__metadata__date', 'time'
-                        ]
-                        
-                        datas_encontradas = []
-                        for sel in selectors_data:
-                            els = frame_reviews.query_selector_all(sel)
-                            if els:
-                                for el in els:
-                                    txt = el.inner_text()
-                                    dt = parse_data_ptbr(txt)
-                                    if dt: datas_encontradas.append(dt)
-                                if datas_encontradas: break
-                        
-                        if datas_encontradas:
-                            dados['num_comentarios_coletados'] = len(datas_encontradas)
-                            ultima_data = max(datas_encontradas)
-                            dados['data_ultimo_review'] = ultima_data.strftime('%Y-%m-%d') # Ajustado para salvar no DB (ISO 8601)
-                            dados['dias_desde_ultimo_review'] = (datetime.now() - ultima_data).days
-                            
-                            limite = datetime.now() - timedelta(days=90)
-                            recentes = [d for d in datas_encontradas if d >= limite]
-                            dados['n_comentarios_ult_90_dias'] = len(recentes)
-                            
-                            print(f"      [OK] {len(datas_encontradas)} reviews coletados ({len(recentes)} recentes).")
-                        else:
-                            print("      [AVISO] Iframe aberto mas sem datas detectadas.")
-                except Exception as e:
-                    print(f"      [ERRO] Falha ao processar reviews: {e}")
-
-            if not btn_comentarios:
-                print("      [INFO] Botão de reviews não encontrado. Coletando direto da página!")
-
-                seletores_inline = [
-                    'article.ui-review-capability-comments__comment span.ui-review-capability-comments__comment__date',
-                    'span.ui-review-capability-comments__comment__date',
-                    'p.ui-review-capability-comments__comment__date',
-                    'time'
-                ]
-                
-                datas_inline = []
-
-                for sel in seletores_inline:
-                    els = page.query_selector_all(sel)
-                    if els:
-                        for el in els:
-                            txt = el.inner_text()
-                            dt = parse_data_ptbr(txt)
-                            if dt:
-                                datas_inline.append(dt)
-                        if datas_inline:
-                            break
-
-                if datas_inline:
-                    dados['num_comentarios_coletados'] = len(datas_inline)
-                    ultima_data = max(datas_inline)
-                    dados['data_ultimo_review'] = ultima_data.strftime('%Y-%m-%d') # Ajustado para salvar no DB
-                    dados['dias_desde_ultimo_review'] = (datetime.now() - ultima_data).days
-                    
-                    limite = datetime.now() - timedelta(days=90)
-                    recentes = [d for d in datas_inline if d >= limite]
-                    dados['n_comentarios_ult_90_dias'] = len(recentes)
-
-                    print(f"      [OK] {len(datas_inline)} reviews coletados direto da página ({len(recentes)} recentes).")
-                else:
-                    print("      [AVISO] Nenhuma data encontrada no modo inline.")
+            # 10. Reviews (iguais em todos os anúncios do mesmo catálogo: coletadas uma vez)
+            reviews_ok = True
+            if not compartilhado:
+                reviews_ok = self._coletar_reviews(page, dados)
 
             # Corrigi número de comentários quando comentários coletados é mais que o total disponível
             if  dados.get('num_comentarios', False) and dados.get('num_comentarios_coletados', False):
@@ -406,9 +632,21 @@ class MercadoLivreDetail:
                 'ultimos_90d': dados.get('n_comentarios_ult_90_dias') 
             }
 
+            # Ficha, categorias e reviews vêm do catálogo; vendedor e oferta são deste anúncio
+            if compartilhado:
+                product_payload.update(compartilhado)
+            elif catalogo and reviews_ok:
+                self._catalogos[catalogo] = {k: product_payload[k] for k in self.CAMPOS_CATALOGO}
+            elif catalogo:
+                # Reviews falharam: não serve de fonte; o próximo anúncio do catálogo coleta tudo
+                print(f"      [CATÁLOGO] {catalogo}: reviews incompletos, não reaproveitados pelos outros anúncios.")
+                self._catalogos[catalogo] = None
+            product_payload['catalog_id'] = catalogo
+
             return product_payload, seller_payload
 
         except Exception as e:
+            registrar_erro('detail.page', e)
             print(f"   [CRÍTICO] Erro na página: {e}")
             return None, None
         
@@ -0,0 +1,451 @@
+import json
+import time
+import uuid
+import socket
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+from src.database import DatabaseManager
+from src.watchdog import MemoryWatchdog
+from src.proxy_pool import ProxyPool
+
+# Protocolo (HTTP/JSON, sempre POST exceto /status):
+#   /lease      {worker}                          -> {unit: {...} | null, done: bool, lease_seconds}
+#   /heartbeat  {worker, unit_id}                 -> 200 {ok} | 409 (lease perdido)
+#   /results    {worker, unit_id, search_items, search_hits, details}  -> {ok, applied}
+#   /complete   {worker, unit_id}                 -> {ok}
+#   /status     GET                               -> contadores do coordenador
+# Unidades de trabalho:
+#   {"id": "s-1", "type": "search", "terms": ["lustre"], "pages": 3}
+#   {"id": "d-4", "type": "detail", "candidates": [{ml_id, permalink, ...}, ...]}
+
+class Coordinator:
+    """
+    Dono do banco: distribui unidades de busca (um termo cada) e de detalhe
+    (lotes de candidatos) para workers remotos e grava os resultados que eles enviam.
+    - Cada unidade entregue tem um lease; o worker renova com heartbeats.
+    - Lease vencido (worker morreu ou travou) devolve a unidade à fila, até max_attempts.
+    - As unidades de detalhe são geradas sob demanda depois que as buscas foram entregues,
+      então produtos descobertos pelos workers de busca entram no enriquecimento da mesma execução.
+    """
+
+    def __init__(self, db: DatabaseManager, termos: List[str], paginas: int, filtros: Dict[str, Any], limit: int,
+                 lease_seconds: float = 120.0, detail_batch: int = 5, max_attempts: int = 3, token: Optional[str] = None):
+        self.db = db
+        self.filtros = filtros
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self.detail_batch = detail_batch
+        self.max_attempts = max_attempts
+        self.token = token
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.pendentes = deque(self._nova_unidade('search', terms=[t], pages=paginas) for t in (termos or []))
+        self.em_andamento: Dict[str, Dict[str, Any]] = {}
+        # ml_ids já entregues para detalhe nesta execução (não reenvia o mesmo produto)
+        self.detalhes_entregues = set()
+        # ml_ids já gravados pela busca nesta execução (termos diferentes caem em workers diferentes)
+        self.itens_gravados = set()
+        self.stats = {'completed': 0, 'expired': 0, 'failed': 0, 'search_items': 0, 'search_unchanged': 0, 'details': 0}
+        self.terminado = threading.Event()
+
+    def _nova_unidade(self, tipo: str, **payload) -> Dict[str, Any]:
+        self._seq += 1
+        return {'id': f"{tipo[0]}-{self._seq}", 'type': tipo, 'attempts': 0, **payload}
+
+    # --- Leases ---
+
+    def _recolher_vencidos(self):
+        """Devolve à fila as unidades cujo lease venceu (chamado com o lock)."""
+        agora = time.monotonic()
+        for unit_id, unidade in list(self.em_andamento.items()):
+            if unidade['lease_expires'] > agora:
+                continue
+            del self.em_andamento[unit_id]
+            self.stats['expired'] += 1
+            if unidade['attempts'] >= self.max_attempts:
+                self.stats['failed'] += 1
+                print(f"[COORD] Unidade {unit_id} descartada após {unidade['attempts']} tentativas.")
+            else:
+                print(f"[COORD] Lease de {unit_id} venceu (worker {unidade['worker']}). Reatribuindo.")
+                self.pendentes.appendleft(unidade)
+
+    def _proxima_unidade_detalhe(self) -> Optional[Dict[str, Any]]:
+        restantes = self.limit - len(self.detalhes_entregues)
+        if restantes <= 0:
+            return None
+        tamanho = min(self.detail_batch, restantes)
+        candidatos = self.db.get_candidates_for_enrichment(**self.filtros, limit=tamanho + len(self.detalhes_entregues))
+        lote = [c for c in candidatos if c['ml_id'] not in self.detalhes_entregues][:tamanho]
+        if not lote:
+            return None
+        self.detalhes_entregues.update(c['ml_id'] for c in lote)
+        return self._nova_unidade('detail', candidates=lote)
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        with self._lock:
+            self._recolher_vencidos()
+            unidade = self.pendentes.popleft() if self.pendentes else None
+            if unidade is None and not any(u['type'] == 'search' for u in self.em_andamento.values()):
+                # Detalhe só depois das buscas: os candidatos incluem o que elas acabaram de descobrir
+                unidade = self._proxima_unidade_detalhe()
+
+            if unidade is None:
+                done = not self.em_andamento
+                if done:
+                    self.terminado.set()
+                return {'unit': None, 'done': done, 'lease_seconds': self.lease_seconds}
+
+            unidade['attempts'] += 1
+            unidade['worker'] = worker
+            unidade['lease_expires'] = time.monotonic() + self.lease_seconds
+            self.em_andamento[unidade['id']] = unidade
+            print(f"[COORD] {unidade['id']} ({unidade['type']}) -> {worker}")
+            publico = {k: v for k, v in unidade.items() if k not in ('lease_expires', 'worker')}
+            return {'unit': publico, 'done': False, 'lease_seconds': self.lease_seconds}
+
+    def heartbeat(self, worker: str, unit_id: str) -> bool:
+        with self._lock:
+            unidade = self.em_andamento.get(unit_id)
+            if unidade is None or unidade['worker'] != worker:
+                return False
+            unidade['lease_expires'] = time.monotonic() + self.lease_seconds
+            return True
+
+    def complete(self, worker: str, unit_id: str) -> bool:
+        with self._lock:
+            unidade = self.em_andamento.get(unit_id)
+            if unidade is None or unidade['worker'] != worker:
+                return False
+            del self.em_andamento[unit_id]
+            self.stats['completed'] += 1
+            return True
+
+    def results(self, payload: Dict[str, Any]) -> int:
+        """
+        Grava um lote de resultados. Aceito mesmo de um lease vencido:
+        os upserts são idempotentes e o dado coletado continua válido.
+        """
+        itens = payload.get('search_items') or []
+        detalhes = payload.get('details') or []
+        inalterados = 0
+        for item in itens:
+            with self._lock:
+                if item['ml_id'] in self.itens_gravados:
+                    continue
+                self.itens_gravados.add(item['ml_id'])
+            if not self.db.upsert_product_from_search(item):
+                inalterados += 1
+        self.db.record_search_hits(payload.get('search_hits') or [])
+        for d in detalhes:
+            self.db.upsert_product_details(d['ml_id'], d['details'], d.get('seller') or {}, duration_s=d.get('duration_s'))
+        with self._lock:
+            self.stats['search_items'] += len(itens)
+            self.stats['search_unchanged'] += inalterados
+            self.stats['details'] += len(detalhes)
+            # Entregar resultados também prova que o worker está vivo
+            unidade = self.em_andamento.get(payload.get('unit_id'))
+            if unidade is not None and unidade['worker'] == payload.get('worker'):
+                unidade['lease_expires'] = time.monotonic() + self.lease_seconds
+        return len(itens) + len(detalhes)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'pending': len(self.pendentes),
+                'in_progress': {u['id']: u['worker'] for u in self.em_andamento.values()},
+                'details_assigned': len(self.detalhes_entregues),
+                'done': self.terminado.is_set(),
+            }
+
+    # --- Servidor HTTP ---
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8765, grace_seconds: float = 10.0):
+        """Atende os workers até o trabalho acabar (ou Ctrl+C). Bloqueia."""
+        server = self.start(host, port)
+        try:
+            while not self.terminado.wait(1):
+                pass
+            # Dá tempo dos workers ociosos receberem done=True antes de sair
+            time.sleep(grace_seconds)
+        except KeyboardInterrupt:
+            print("\n[COORD] Interrompido.")
+        finally:
+            server.shutdown()
+            server.server_close()
+        print(f"[COORD] Encerrado: {self.status()}")
+
+    def start(self, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+        coord = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self, status: int, corpo: Dict[str, Any]):
+                dados = json.dumps(corpo, ensure_ascii=False, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _autorizado(self) -> bool:
+                if coord.token and self.headers.get('X-Token') != coord.token:
+                    self._responder(401, {'error': 'token inválido'})
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._autorizado():
+                    return
+                if self.path.startswith('/status'):
+                    self._responder(200, coord.status())
+                else:
+                    self._responder(404, {'error': 'rota desconhecida'})
+
+            def do_POST(self):
+                if not self._autorizado():
+                    return
+                try:
+                    tamanho = int(self.headers.get('Content-Length') or 0)
+                    corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+                    worker = corpo.get('worker', '?')
+                    if self.path == '/lease':
+                        self._responder(200, coord.lease(worker))
+                    elif self.path == '/heartbeat':
+                        ok = coord.heartbeat(worker, corpo.get('unit_id'))
+                        self._responder(200 if ok else 409, {'ok': ok})
+                    elif self.path == '/results':
+                        self._responder(200, {'ok': True, 'applied': coord.results(corpo)})
+                    elif self.path == '/complete':
+                        self._responder(200, {'ok': coord.complete(worker, corpo.get('unit_id'))})
+                    else:
+                        self._responder(404, {'error': 'rota desconhecida'})
+                except Exception as e:
+                    print(f"[COORD] Erro em {self.path}: {e}")
+                    self._responder(500, {'error': str(e)})
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="coordinator-http", daemon=True).start()
+        print(f"[COORD] Aguardando workers em http://{host}:{server.server_address[1]}")
+        return server
+
+
+class CoordinatorClient:
+    """Cliente HTTP/JSON do coordenador, com novas tentativas em falhas de rede."""
+
+    def __init__(self, url: str, worker_id: str, token: Optional[str] = None, retries: int = 5):
+        self.url = url.rstrip('/')
+        self.worker_id = worker_id
+        self.token = token
+        self.retries = retries
+
+    def post(self, rota: str, corpo: Dict[str, Any]) -> Dict[str, Any]:
+        dados = json.dumps({'worker': self.worker_id, **corpo}, ensure_ascii=False, default=str).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-Token'] = self.token
+
+        for tentativa in range(self.retries):
+            req = urllib.request.Request(self.url + rota, data=dados, headers=headers, method='POST')
+            try:
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    return json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                if e.code == 409:
+                    return {'ok': False, 'lease_lost': True}
+                if e.code < 500 or tentativa == self.retries - 1:
+                    raise
+            except (urllib.error.URLError, socket.timeout, ConnectionError):
+                if tentativa == self.retries - 1:
+                    raise
+            time.sleep(min(2 ** tentativa, 30))
+        return {}
+
+
+class RemoteSink:
+    """
+    Substitui o DatabaseManager dentro dos scrapers do worker: acumula os resultados
+    e envia ao coordenador em lotes (a cada batch_size itens e no fim da unidade).
+    """
+
+    def __init__(self, client: CoordinatorClient, unit_id: str, batch_size: int = 20):
+        self.client = client
+        self.unit_id = unit_id
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.search_items: List[Dict[str, Any]] = []
+        self.search_hits: List[Dict[str, Any]] = []
+        self.details: List[Dict[str, Any]] = []
+
+    def record_search_hits(self, hits: List[Dict[str, Any]]):
+        with self._lock:
+            self.search_hits.extend(hits)
+
+    def upsert_product_from_search(self, item: Dict[str, Any]) -> bool:
+        # Se mudou algo só o coordenador sabe (ao aplicar no banco)
+        with self._lock:
+            self.search_items.append(item)
+        self._talvez_enviar()
+        return True
+
+    def upsert_product_details(self, ml_id: str, details: Dict[str, Any], seller_data: Dict[str, Any], duration_s: Optional[float] = None):
+        with self._lock:
+            self.details.append({'ml_id': ml_id, 'details': details, 'seller': seller_data, 'duration_s': duration_s})
+        self._talvez_enviar()
+
+    def get_catalog_shared_details(self, catalog_id: str, max_age_days: float = 7) -> Optional[Dict[str, Any]]:
+        # Worker não lê o banco: só reaproveita catálogos coletados na própria unidade
+        return None
+
+    def _talvez_enviar(self):
+        if len(self.search_items) + len(self.details) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            itens, hits, detalhes = self.search_items, self.search_hits, self.details
+            self.search_items, self.search_hits, self.details = [], [], []
+        if itens or hits or detalhes:
+            self.client.post('/results', {'unit_id': self.unit_id, 'search_items': itens, 'search_hits': hits, 'details': detalhes})
+
+
+class Worker:
+    """
+    Processo remoto: pede unidades ao coordenador e as executa com um navegador
+    mantido aberto entre unidades. Um heartbeat em thread própria renova o lease;
+    se o coordenador avisar que o lease foi perdido, a unidade atual é interrompida.
+    """
+
+    def __init__(self, coordinator_url: str, headless: bool = True, worker_id: Optional[str] = None,
+                 token: Optional[str] = None, batch_size: int = 20, idle_wait: float = 5.0,
+                 watchdog: Optional[MemoryWatchdog] = None, proxy_pool: Optional[ProxyPool] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.client = CoordinatorClient(coordinator_url, self.worker_id, token=token)
+        self.headless = headless
+        self.batch_size = batch_size
+        self.idle_wait = idle_wait
+        self.stop_event = threading.Event()
+        # Memória do navegador mantido entre unidades (limites de RSS/páginas)
+        self.watchdog = watchdog or MemoryWatchdog()
+        self.proxy_pool = proxy_pool
+        self.playwright = None
+        self.browser = None
+
+    def run(self):
+        print(f"[WORKER {self.worker_id}] Conectando a {self.client.url}")
+        try:
+            while not self.stop_event.is_set():
+                resposta = self.client.post('/lease', {})
+                unidade = resposta.get('unit')
+                if unidade is None:
+                    if resposta.get('done'):
+                        print(f"[WORKER {self.worker_id}] Sem trabalho restante. Encerrando.")
+                        break
+                    self.stop_event.wait(self.idle_wait)
+                    continue
+                self._executar(unidade, float(resposta.get('lease_seconds', 120)))
+        except KeyboardInterrupt:
+            print(f"\n[WORKER {self.worker_id}] Interrompido.")
+        finally:
+            self._fechar_navegador()
+            if self.proxy_pool:
+                self.proxy_pool.salvar_estado()
+
+    def _garantir_navegador(self):
+        if self.browser is not None and self.browser.is_connected():
+            return
+        from playwright.sync_api import sync_playwright
+        from src.detail_scraper import MercadoLivreDetail
+
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        if self.proxy_pool:
+            self.browser = self.playwright.chromium.launch(headless=self.headless, proxy=ProxyPool.LAUNCH_PROXY,
+                                                           args=MercadoLivreDetail.BROWSER_ARGS + self.proxy_pool.launch_args)
+        else:
+            self.browser = self.playwright.chromium.launch(headless=self.headless, args=MercadoLivreDetail.BROWSER_ARGS)
+
+    def _reiniciar_navegador(self):
+        try:
+            if self.browser: self.browser.close()
+        except Exception:
+            pass
+        self.browser = None
+        self._garantir_navegador()
+        return self.browser
+
+    def _fechar_navegador(self):
+        try:
+            if self.browser: self.browser.close()
+        except Exception:
+            pass
+        if self.playwright: self.playwright.stop()
+        self.browser = None
+        self.playwright = None
+
+    def _executar(self, unidade: Dict[str, Any], lease_seconds: float):
+        print(f"\n[WORKER {self.worker_id}] >>> {unidade['id']} ({unidade['type']})")
+        sink = RemoteSink(self.client, unidade['id'], batch_size=self.batch_size)
+        # Parada desta unidade: lease perdido ou parada do worker
+        parar_unidade = threading.Event()
+        fim_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not fim_heartbeat.wait(max(lease_seconds / 3, 1)):
+                try:
+                    if self.client.post('/heartbeat', {'unit_id': unidade['id']}).get('lease_lost'):
+                        print(f"[WORKER {self.worker_id}] Lease de {unidade['id']} perdido. Abandonando a unidade.")
+                        parar_unidade.set()
+                        return
+                except Exception as e:
+                    print(f"[WORKER {self.worker_id}] Falha no heartbeat: {e}")
+                if self.stop_event.is_set():
+                    parar_unidade.set()
+
+        batimento = threading.Thread(target=heartbeat, name="worker-heartbeat", daemon=True)
+        batimento.start()
+        try:
+            self._rodar_unidade(unidade, sink, parar_unidade)
+            sink.flush()
+            if not parar_unidade.is_set():
+                self.client.post('/complete', {'unit_id': unidade['id']})
+        except Exception as e:
+            # Sem /complete: o lease vence e o coordenador reatribui a unidade.
+            # O que já foi coletado ainda é enviado (os upserts são idempotentes).
+            print(f"[WORKER {self.worker_id}] Unidade {unidade['id']} falhou: {e}")
+            try:
+                sink.flush()
+            except Exception:
+                pass
+            if self.browser is not None and not self.browser.is_connected():
+                self.browser = None
+        finally:
+            fim_heartbeat.set()
+            batimento.join()
+
+    def _rodar_unidade(self, unidade: Dict[str, Any], sink: RemoteSink, parar_unidade: threading.Event):
+        """Executa a unidade com os scrapers sobre o navegador mantido pelo worker (substituível em testes)."""
+        self._garantir_navegador()
+        if unidade['type'] == 'search':
+            from src.search_scraper import MercadoLivreSearch
+            bot = MercadoLivreSearch(sink, headless=self.headless, browser=self.browser)
+            bot.proxy_pool = self.proxy_pool
+            bot.stop_event = parar_unidade
+            bot.run(unidade['terms'], pages_per_term=int(unidade.get('pages', 3)))
+        else:
+            from src.detail_scraper import MercadoLivreDetail
+            bot = MercadoLivreDetail(sink, headless=self.headless, browser=self.browser, watchdog=self.watchdog)
+            bot.stop_event = parar_unidade
+            bot.on_browser_recycle = self._reiniciar_navegador
+            bot.proxy_pool = self.proxy_pool
+            bot.run(unidade['candidates'])
+            # O bot pode ter reiniciado o navegador compartilhado
+            self.browser = bot.browser
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+# Limites (segundos) dos histogramas de latência
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, float('inf'))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(kwargs: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(labels) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    esc = lambda v: v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in pares) + '}'
+
+def _fmt_le(limite: float) -> str:
+    return '+Inf' if limite == float('inf') else repr(limite)
+
+class MetricsRegistry:
+    """
+    Registro de métricas em memória (contadores, gauges e histogramas com labels).
+    Thread-safe: busca e detalhe gravam ao mesmo tempo no modo full em pipeline.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_PADRAO):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, Dict[str, Any]]] = {}
+        self.inicio = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        chave = _labels(labels)
+        with self._lock:
+            serie = self._counters.setdefault(name, {})
+            serie[chave] = serie.get(chave, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def max_gauge(self, name: str, value: float, **labels):
+        """Mantém o maior valor observado (ex: pico de memória)."""
+        chave = _labels(labels)
+        with self._lock:
+            serie = self._gauges.setdefault(name, {})
+            serie[chave] = max(serie.get(chave, value), value)
+
+    def observe(self, name: str, value: float, **labels):
+        chave = _labels(labels)
+        with self._lock:
+            serie = self._hists.setdefault(name, {})
+            h = serie.get(chave)
+            if h is None:
+                h = serie[chave] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, limite in enumerate(self.buckets):
+                if value <= limite:
+                    h['counts'][i] += 1
+                    break
+            h['sum'] += value
+            h['count'] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - inicio, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._hists.clear()
+            self.inicio = time.time()
+
+    # --- Exposição ---
+
+    def to_prometheus(self) -> str:
+        linhas = []
+        with self._lock:
+            for name, serie in sorted(self._counters.items()):
+                linhas.append(f"# TYPE {name} counter")
+                linhas += [f"{name}{_fmt_labels(l)} {v}" for l, v in sorted(serie.items())]
+            for name, serie in sorted(self._gauges.items()):
+                linhas.append(f"# TYPE {name} gauge")
+                linhas += [f"{name}{_fmt_labels(l)} {v}" for l, v in sorted(serie.items())]
+            for name, serie in sorted(self._hists.items()):
+                linhas.append(f"# TYPE {name} histogram")
+                for l, h in sorted(serie.items()):
+                    acumulado = 0
+                    for limite, n in zip(self.buckets, h['counts']):
+                        acumulado += n
+                        linhas.append(f"{name}_bucket{_fmt_labels(l, ('le', _fmt_le(limite)))} {acumulado}")
+                    linhas.append(f"{name}_sum{_fmt_labels(l)} {h['sum']}")
+                    linhas.append(f"{name}_count{_fmt_labels(l)} {h['count']}")
+        return "\n".join(linhas) + "\n"
+
+    def _quantil(self, h: Dict[str, Any], q: float) -> Optional[float]:
+        """Quantil aproximado pelo limite superior do bucket."""
+        if not h['count']:
+            return None
+        alvo = q * h['count']
+        acumulado = 0
+        for limite, n in zip(self.buckets, h['counts']):
+            acumulado += n
+            if acumulado >= alvo:
+                return None if limite == float('inf') else limite
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        rotulo = lambda l: ','.join(f"{k}={v}" for k, v in l) or '_'
+        with self._lock:
+            resumo = {
+                'started_at': datetime.fromtimestamp(self.inicio).strftime("%Y-%m-%d %H:%M:%S"),
+                'elapsed_s': round(time.time() - self.inicio, 1),
+                'counters': {n: {rotulo(l): v for l, v in s.items()} for n, s in self._counters.items()},
+                'gauges': {n: {rotulo(l): v for l, v in s.items()} for n, s in self._gauges.items()},
+                'histograms': {},
+            }
+            for n, serie in self._hists.items():
+                resumo['histograms'][n] = {
+                    rotulo(l): {
+                        'count': h['count'],
+                        'sum_s': round(h['sum'], 3),
+                        'avg_s': round(h['sum'] / h['count'], 4) if h['count'] else None,
+                        'p50_s': self._quantil(h, 0.5),
+                        'p95_s': self._quantil(h, 0.95),
+                    } for l, h in serie.items()
+                }
+        return resumo
+
+# Registro global usado pelos scrapers
+METRICS = MetricsRegistry()
+
+# Nomes das métricas dos scrapers
+STAGE_SECONDS = "ml_scraper_stage_seconds"      # histograma por etapa (label stage)
+ITEMS_TOTAL = "ml_scraper_items_total"          # itens gravados por termo de busca
+PRODUCTS_TOTAL = "ml_scraper_products_total"    # produtos detalhados por resultado
+ERRORS_TOTAL = "ml_scraper_errors_total"        # erros por etapa e tipo de exceção
+BYTES_TOTAL = "ml_scraper_bytes_total"          # bytes recebidos (Content-Length) por scraper
+SEARCH_WRITES_TOTAL = "ml_scraper_search_writes_total"  # upserts da busca por resultado (changed/unchanged)
+CATALOG_REUSE_TOTAL = "ml_scraper_catalog_reuse_total"  # produtos com ficha/reviews reaproveitados do catálogo
+PAGE_SOURCE_TOTAL = "ml_scraper_page_source_total"      # páginas extraídas por origem (state, state+dom, dom)
+
+
+# Perfilador opcional da execução (src/profiling.py); None = etapa só mede o tempo
+_perfilador = None
+
+def instalar_perfilador(perfilador):
+    global _perfilador
+    _perfilador = perfilador
+
+@contextmanager
+def _etapa_perfilada(stage: str, perfilador):
+    with METRICS.timer(STAGE_SECONDS, stage=stage), perfilador.etapa(stage):
+        yield
+
+def etapa(stage: str):
+    """Atalho: with etapa('detail.goto'): ..."""
+    perfilador = _perfilador
+    if perfilador is None:
+        return METRICS.timer(STAGE_SECONDS, stage=stage)
+    return _etapa_perfilada(stage, perfilador)
+
+def registrar_erro(stage: str, exc: BaseException):
+    METRICS.inc(ERRORS_TOTAL, stage=stage, type=type(exc).__name__)
+
+def contar_bytes(page, scraper: str):
+    """Soma o Content-Length de todas as respostas recebidas pela página."""
+    def ao_responder(response):
+        try:
+            tamanho = response.headers.get('content-length')
+            if tamanho and tamanho.isdigit():
+                METRICS.inc(BYTES_TOTAL, int(tamanho), scraper=scraper)
+        except Exception:
+            pass
+    page.on("response", ao_responder)
+
+
+def iniciar_servidor(port: int, registry: MetricsRegistry = METRICS, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Sobe o endpoint local em uma thread daemon:
+    /metrics (texto Prometheus) e /metrics.json (resumo JSON).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics.json'):
+                corpo = json.dumps(registry.summary(), ensure_ascii=False).encode('utf-8')
+                tipo = 'application/json'
+            elif self.path.startswith('/metrics'):
+                corpo = registry.to_prometheus().encode('utf-8')
+                tipo = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, format, *args):
+            pass  # não polui a saída do scraper
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[MÉTRICAS] Endpoint em http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def salvar_resumo(path: Optional[str] = None, registry: MetricsRegistry = METRICS) -> str:
+    """Grava o resumo JSON da execução (padrão: data/metrics/run_<timestamp>.json)."""
+    if path is None:
+        path = os.path.join("data", "metrics", f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(registry.summary(), f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,235 @@
+import re
+import json
+from typing import Dict, Any, Iterator, List, Optional
+
+# Lê o estado embutido em uma única chamada ao navegador:
+# <script id="__PRELOADED_STATE__" type="application/json"> (páginas novas) ou window.__PRELOADED_STATE__
+JS_LER_ESTADO = """
+() => {
+    const el = document.getElementById('__PRELOADED_STATE__');
+    if (el && el.textContent) return el.textContent;
+    if (window.__PRELOADED_STATE__) {
+        try { return JSON.stringify(window.__PRELOADED_STATE__); } catch (e) {}
+    }
+    return null;
+}
+"""
+
+RE_VENDAS = re.compile(r'\+?\s*(\d+(?:[.,]\d+)?)\s*(mil)?\s*vend(?:as|ido|ida)', re.IGNORECASE)
+
+# Campos do card (busca) lidos do estado; os de CAMPOS_CARD_DOM podem vir None e ser completados pelo DOM
+CAMPOS_CARD = ('link', 'title', 'price_current', 'price_original', 'reviews_rating_average', 'sales_qty_search',
+               'is_ad', 'is_full', 'is_best_seller', 'is_international')
+CAMPOS_CARD_DOM = ('title', 'price_current', 'price_original', 'reviews_rating_average', 'sales_qty_search',
+                   'is_ad', 'is_full', 'is_best_seller', 'is_international')
+
+# Componentes do card que informam cada flag. Sem o sinal, a flag só é False se um deles estiver
+# presente; sem nenhum (componente omitido ou esquema mudou) fica None e o DOM decide.
+COMPONENTES_FLAG = {
+    'is_ad': ('ad_label',),
+    'is_full': ('shipped_from', 'shipping'),
+    'is_best_seller': ('highlight',),
+    'is_international': ('shipping', 'shipped_from'),
+}
+
+
+def ler_estado(page) -> Optional[Dict[str, Any]]:
+    """Estado JSON embutido na página, ou None se não houver (ou não for JSON válido)."""
+    try:
+        texto = page.evaluate(JS_LER_ESTADO)
+        return json.loads(texto) if texto else None
+    except Exception:
+        return None
+
+
+def quantidade_vendas(texto: Optional[str]) -> Optional[int]:
+    """'+5mil vendidos' -> 5000, '+500 vendas' -> 500. None se o texto não fala de vendas."""
+    if not texto:
+        return None
+    m = RE_VENDAS.search(texto)
+    if not m:
+        return None
+    numero = m.group(1)
+    # '1.500' é milhar; '1,5' (com 'mil') é decimal
+    numero = numero.replace(',', '.') if m.group(2) else numero.replace('.', '').replace(',', '')
+    try:
+        return int(float(numero) * (1000 if m.group(2) else 1))
+    except ValueError:
+        return None
+
+
+# --- Navegação tolerante no JSON ---
+
+def _caminho(obj: Any, *chaves) -> Any:
+    """obj[c1][c2]... devolvendo None no primeiro nível ausente (aceita índices de lista)."""
+    for chave in chaves:
+        if isinstance(obj, dict):
+            obj = obj.get(chave)
+        elif isinstance(obj, list) and isinstance(chave, int) and -len(obj) <= chave < len(obj):
+            obj = obj[chave]
+        else:
+            return None
+    return obj
+
+def _texto(valor: Any) -> Optional[str]:
+    """Texto de um nó que pode ser string ou {'text': ...}."""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, dict) and isinstance(valor.get('text'), str):
+        return valor['text']
+    return None
+
+def _textos(obj: Any) -> Iterator[str]:
+    """Todas as strings dentro de obj (usado para sinais em texto: 'Mais vendido', 'Patrocinado'...)."""
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            yield from _textos(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _textos(v)
+
+def _contem(obj: Any, *trechos: str) -> bool:
+    return any(t in s.lower() for s in _textos(obj) for t in trechos)
+
+def _flag(sinal: bool, informado: bool) -> Optional[bool]:
+    """True com o sinal; sem ele, False só se o card trouxe onde o sinal estaria (senão None)."""
+    if sinal:
+        return True
+    return False if informado else None
+
+def _informa(componentes: Dict[str, Any], campo: str) -> bool:
+    return any(c in componentes for c in COMPONENTES_FLAG[campo])
+
+def _numero(valor: Any) -> Optional[float]:
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    return None
+
+
+# --- Busca ---
+
+def _resultados(estado: Dict[str, Any]) -> List[Dict[str, Any]]:
+    for caminho in (('pageState', 'initialState', 'results'), ('initialState', 'results'), ('results',)):
+        resultados = _caminho(estado, *caminho)
+        if isinstance(resultados, list):
+            return [r for r in resultados if isinstance(r, dict)]
+    return []
+
+def cards_do_estado(estado: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Cards da listagem na ordem da página, com as chaves de CAMPOS_CARD.
+    Campo que não aparece no JSON fica None (quem chama decide se completa pelo DOM);
+    as flags são lidas do texto dos componentes, como o DOM faz com o texto do card,
+    e ficam None quando o card não traz nenhum componente que as informe.
+    """
+    if not estado:
+        return []
+    cards = []
+    for resultado in _resultados(estado):
+        polycard = resultado.get('polycard') or resultado
+        metadata = polycard.get('metadata') or {}
+        componentes = {c.get('type'): c.get(c.get('type')) for c in polycard.get('components') or [] if isinstance(c, dict)}
+
+        url = metadata.get('url') or resultado.get('permalink')
+        link = None
+        if url:
+            link = url if url.startswith('http') else f"https://{url.lstrip('/')}"
+            link += (metadata.get('url_params') or '') + (metadata.get('url_fragments') or '')
+
+        preco = componentes.get('price') or {}
+        reviews = componentes.get('reviews')
+        vendas = None
+        for texto in _textos(componentes):
+            vendas = quantidade_vendas(texto)
+            if vendas is not None:
+                break
+
+        cards.append({
+            'link': link,
+            'title': _texto(_caminho(componentes, 'title')) or resultado.get('title'),
+            'price_current': _numero(_caminho(preco, 'current_price', 'value')),
+            'price_original': _numero(_caminho(preco, 'previous_price', 'value')) or _numero(_caminho(preco, 'current_price', 'value')),
+            'reviews_rating_average': _numero(_caminho(reviews, 'rating_average')),
+            'sales_qty_search': vendas,
+            'is_ad': _flag(bool(metadata.get('is_ad')) or _contem(componentes, 'patrocinado'),
+                           'is_ad' in metadata or _informa(componentes, 'is_ad')),
+            'is_full': _flag(_contem(componentes, 'poly_full', 'full_icon'), _informa(componentes, 'is_full')),
+            'is_best_seller': _flag(_contem(componentes, 'mais vendido'), _informa(componentes, 'is_best_seller')),
+            'is_international': _flag(_contem(componentes, 'compra internacional'), _informa(componentes, 'is_international')),
+        })
+    return cards
+
+
+# --- Página de produto ---
+
+def produto_do_estado(estado: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Campos da página de produto no formato de 'dados' do MercadoLivreDetail.
+    Só traz as chaves encontradas no JSON: o detalhe busca no DOM apenas o que faltar.
+    """
+    componentes = _caminho(estado, 'initialState', 'components') or _caminho(estado, 'components')
+    if not isinstance(componentes, dict):
+        return {}
+    dados: Dict[str, Any] = {}
+
+    header = componentes.get('header') or {}
+    titulo = _texto(header.get('title'))
+    if titulo:
+        dados['titulo'] = titulo
+    avaliacoes = _caminho(header, 'reviews', 'amount')
+    if isinstance(avaliacoes, int):
+        dados['num_avaliacoes'] = avaliacoes
+    # Flags só quando o sinal aparece: a ausência pode ser mudança de esquema, e o DOM confirma
+    if _contem(header, 'mais vendido') or _contem(componentes.get('highlights'), 'mais vendido'):
+        dados['mais_vendido'] = 1
+
+    categorias = _caminho(componentes, 'breadcrumb', 'categories')
+    if isinstance(categorias, list) and categorias:
+        nomes = [n.strip() for n in (_texto(c.get('label')) or _texto(c) for c in categorias if isinstance(c, dict)) if n and n.strip()]
+        if nomes:
+            dados['categorias'] = {f"categoria_{i}": n for i, n in enumerate(nomes, start=1)}
+
+    grupos = _caminho(componentes, 'technical_specifications', 'specs')
+    if isinstance(grupos, list):
+        caracteristicas = {}
+        for grupo in grupos:
+            for attr in (grupo.get('attributes') or []) if isinstance(grupo, dict) else []:
+                # Rótulo legível (como o th da tabela no DOM); 'id' é o código interno (ex: BRAND)
+                chave = _texto(attr.get('name')) or _texto(attr.get('title')) or attr.get('id')
+                valor = _texto(attr.get('text')) or _texto(attr.get('value')) or attr.get('value_name')
+                if not (chave and valor):
+                    continue
+                chave, valor = str(chave).replace(':', '').strip(), str(valor).strip()
+                caracteristicas[chave] = valor
+                if 'Marca' in chave or attr.get('id') == 'BRAND': dados['marca'] = valor
+                if 'Modelo' in chave or attr.get('id') == 'MODEL': dados['modelo'] = valor
+        if caracteristicas:
+            dados['caracteristicas_completas'] = caracteristicas
+
+    descricao = _texto(_caminho(componentes, 'description', 'content'))
+    if descricao:
+        dados['descricao'] = descricao
+
+    vendedor = componentes.get('seller_data') or componentes.get('seller')
+    if isinstance(vendedor, dict):
+        dados_vendedor: Dict[str, Any] = {}
+        nome = _texto(vendedor.get('title')) or vendedor.get('seller_name')
+        if nome:
+            dados_vendedor['nome'] = nome.strip()
+        if _contem(vendedor, 'loja oficial'):
+            dados_vendedor['loja_oficial'] = True
+        classificacao = _texto(_caminho(vendedor, 'seller_status_info', 'title'))
+        if classificacao:
+            dados_vendedor['classificacao'] = classificacao
+        for texto in _textos(vendedor):
+            vendas = quantidade_vendas(texto)
+            if vendas is not None:
+                dados_vendedor['vendas_total'] = vendas
+                break
+        dados['dados_vendedor'] = dados_vendedor
+
+    if _contem(componentes.get('cbt_summary'), 'internacional') or _contem(header, 'compra internacional'):
+        dados['compra_internacional'] = True
+    return dados
@@ -0,0 +1,106 @@
+import queue
+import threading
+from typing import Dict, Any, Iterator, List, Optional
+from src.database import DatabaseManager
+from src.search_scraper import MercadoLivreSearch
+from src.detail_scraper import MercadoLivreDetail
+from src.watchdog import MemoryWatchdog
+from src.proxy_pool import ProxyPool
+
+# Marca de fim da fila (busca terminou e não há mais itens)
+_FIM = object()
+
+class FullPipeline:
+    """
+    Modo full em pipeline produtor/consumidor.
+    A busca (thread principal) enfileira os itens que passam pelos mesmos filtros
+    de get_candidates_for_enrichment; o detalhe (thread própria, com seu próprio
+    navegador) consome a fila enquanto a busca ainda está rodando.
+    A fila é limitada: se o detalhe ficar para trás, a busca espera (backpressure).
+    """
+
+    def __init__(self, db: DatabaseManager, filtros: Dict[str, Any], limit: int,
+                 queue_size: int = 20, deadline: Optional[float] = None, watchdog: Optional[MemoryWatchdog] = None,
+                 proxy_pool: Optional[ProxyPool] = None):
+        self.db = db
+        self.watchdog = watchdog
+        # Compartilhado pelos dois navegadores (o pool é thread-safe)
+        self.proxy_pool = proxy_pool
+        self.filtros = filtros
+        self.limit = limit
+        self.deadline = deadline
+        self.fila: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.vistos = set()
+        self.enfileirados = 0
+        self._consumidor: Optional[threading.Thread] = None
+
+    def run(self, termos: List[str], paginas: int):
+        self._consumidor = threading.Thread(target=self._consumir, name="detail-consumer", daemon=True)
+        self._consumidor.start()
+
+        try:
+            search_bot = MercadoLivreSearch(self.db, on_item=self._ao_descobrir)
+            search_bot.proxy_pool = self.proxy_pool
+            search_bot.run(termos, pages_per_term=paginas)
+
+            # Busca concluída: completa o limite com candidatos que já estavam no banco
+            self._completar_com_banco()
+        finally:
+            # Drena: o consumidor processa o que restou na fila e encerra
+            self._enfileirar(_FIM)
+            self._consumidor.join()
+
+        print(f"-> Pipeline: {self.enfileirados} produtos enviados ao enriquecimento.")
+
+    def _ao_descobrir(self, item: Dict[str, Any]):
+        """Callback da busca: enfileira o item se ele passar pelos filtros de enriquecimento."""
+        ml_id = item.get('ml_id')
+        if not ml_id or ml_id in self.vistos or self.enfileirados >= self.limit:
+            return
+        self.vistos.add(ml_id)
+
+        candidatos = self.db.get_candidates_for_enrichment(**self.filtros, limit=1, ml_ids=[ml_id])
+        if candidatos:
+            self._enfileirar(candidatos[0])
+
+    def _completar_com_banco(self):
+        faltam = self.limit - self.enfileirados
+        if faltam <= 0 or not self._consumidor_ativo():
+            return
+        candidatos = self.db.get_candidates_for_enrichment(**self.filtros, limit=faltam + len(self.vistos))
+        for c in candidatos:
+            if self.enfileirados >= self.limit or not self._consumidor_ativo():
+                break
+            if c['ml_id'] in self.vistos:
+                continue
+            self.vistos.add(c['ml_id'])
+            self._enfileirar(c)
+
+    def _enfileirar(self, item):
+        # put com timeout para não travar a busca se o consumidor morrer (ou esgotar o orçamento)
+        while self._consumidor_ativo():
+            try:
+                self.fila.put(item, timeout=1)
+                if item is not _FIM:
+                    self.enfileirados += 1
+                return
+            except queue.Full:
+                continue
+
+    def _consumidor_ativo(self) -> bool:
+        return self._consumidor is not None and self._consumidor.is_alive()
+
+    def _iterar_fila(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            item = self.fila.get()
+            if item is _FIM:
+                return
+            yield item
+
+    def _consumir(self):
+        try:
+            bot = MercadoLivreDetail(self.db, watchdog=self.watchdog)
+            bot.proxy_pool = self.proxy_pool
+            bot.run(self._iterar_fila(), deadline=self.deadline)
+        except Exception as e:
+            print(f"[ERRO] Consumidor de detalhes encerrado: {e}")
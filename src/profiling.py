@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from src import metrics
+
+# Perfilador da execução atual (None = desligado; os ganchos abaixo viram no-op)
+_ATIVO: Optional['RunProfiler'] = None
+
+
+class RunProfiler:
+    """
+    Perfilamento opcional de uma execução, tudo gravado em data/profiles/run_<timestamp>/:
+    - mode='cprofile': cProfile ligado dentro das etapas (with etapa(...)) selecionadas,
+      um perfil por thread, mesclados em cprofile.prof (snakeviz, gprof2dot) e cprofile_top.txt;
+    - mode='sample': uma thread lê as pilhas de todas as threads sample_rate vezes por segundo
+      e grava samples.folded (flamegraph.pl, speedscope), com a etapa atual como raiz da pilha.
+      Custo proporcional à taxa: 10-20 Hz dá para deixar ligado em produção;
+    - trace_pages=N: trace do Playwright (screenshots + DOM) dos N primeiros contextos
+      (um produto no detalhe, um termo na busca) em traces/*.zip (npx playwright show-trace).
+    stages: prefixos de etapa a perfilar (ex: ['detail.reviews', 'search']); None = todas.
+    """
+
+    def __init__(self, mode: Optional[str] = None, sample_rate: float = 50.0, trace_pages: int = 0,
+                 stages: Optional[List[str]] = None, output_dir: Optional[str] = None):
+        if mode not in (None, 'cprofile', 'sample'):
+            raise ValueError(f"Modo de perfil inválido: {mode}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.stages = stages
+        self.run_dir = output_dir or os.path.join("data", "profiles", datetime.now().strftime("run_%Y%m%d_%H%M%S"))
+        self._lock = threading.Lock()
+        # Etapas abertas por thread (a amostragem lê de outra thread)
+        self._etapas: Dict[int, List[str]] = {}
+        # cProfile: um perfil e a profundidade de etapas perfiladas por thread
+        self._perfis: Dict[int, cProfile.Profile] = {}
+        self._profundidade: Dict[int, int] = {}
+        self._perfis_ignorados = 0
+        # Amostragem: (thread, etapa, pilha) -> amostras
+        self._amostras: Counter = Counter()
+        self._n_amostras = 0
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Traces do Playwright
+        self._traces_restantes = trace_pages
+        self._tracing: Dict[int, str] = {}
+        self.traces: List[str] = []
+        self._inicio = None
+        self._ativo = False
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> 'RunProfiler':
+        global _ATIVO
+        os.makedirs(self.run_dir, exist_ok=True)
+        self._inicio = time.monotonic()
+        self._ativo = True
+        _ATIVO = self
+        metrics.instalar_perfilador(self)
+        if self.mode == 'sample':
+            self._thread = threading.Thread(target=self._amostrar, name="profiler-sampler", daemon=True)
+            self._thread.start()
+        print(f"[PERFIL] Modo {self.mode or 'só traces'} | saída em {self.run_dir}")
+        return self
+
+    def stop(self) -> Optional[str]:
+        """Para a coleta e grava os arquivos. Pode ser chamado mais de uma vez (ex: atexit)."""
+        global _ATIVO
+        if not self._ativo:
+            return None
+        self._ativo = False
+        metrics.instalar_perfilador(None)
+        _ATIVO = None
+        if self._thread is not None:
+            self._parar.set()
+            self._thread.join(timeout=5)
+
+        resumo: Dict[str, Any] = {
+            'mode': self.mode,
+            'stages': self.stages,
+            'duration_s': round(time.monotonic() - self._inicio, 1),
+            'traces': self.traces,
+        }
+        if self.mode == 'cprofile':
+            resumo.update(self._gravar_cprofile())
+        elif self.mode == 'sample':
+            resumo.update(self._gravar_amostras())
+
+        with open(os.path.join(self.run_dir, "profile.json"), "w", encoding="utf-8") as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+        print(f"[PERFIL] Arquivos gravados em {self.run_dir}")
+        return self.run_dir
+
+    # --- Etapas (chamado por metrics.etapa) ---
+
+    def _selecionada(self, stage: str) -> bool:
+        return self.stages is None or any(stage.startswith(p) for p in self.stages)
+
+    @contextmanager
+    def etapa(self, stage: str):
+        tid = threading.get_ident()
+        pilha = self._etapas.setdefault(tid, [])
+        pilha.append(stage)
+        perfil = None
+        if self.mode == 'cprofile' and self._selecionada(stage):
+            perfil = self._ligar_perfil(tid)
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                self._desligar_perfil(tid, perfil)
+            pilha.pop()
+
+    def _ligar_perfil(self, tid: int) -> Optional[cProfile.Profile]:
+        profundidade = self._profundidade.get(tid, 0)
+        perfil = self._perfis.get(tid)
+        if perfil is None:
+            perfil = self._perfis[tid] = cProfile.Profile()
+        if profundidade == 0:
+            try:
+                perfil.enable()
+            except ValueError:
+                # Python 3.12+: o cProfile é global ao interpretador; outra thread já está perfilando
+                self._perfis_ignorados += 1
+                return None
+        self._profundidade[tid] = profundidade + 1
+        return perfil
+
+    def _desligar_perfil(self, tid: int, perfil: cProfile.Profile):
+        self._profundidade[tid] -= 1
+        if self._profundidade[tid] == 0:
+            perfil.disable()
+
+    def _gravar_cprofile(self) -> Dict[str, Any]:
+        perfis = [p for p in self._perfis.values()]
+        if not perfis:
+            return {'profiled_threads': 0}
+        for p in perfis:
+            p.disable()
+        stats = pstats.Stats(perfis[0])
+        for p in perfis[1:]:
+            stats.add(p)
+        caminho = os.path.join(self.run_dir, "cprofile.prof")
+        stats.dump_stats(caminho)
+        with open(os.path.join(self.run_dir, "cprofile_top.txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(caminho, stream=f).sort_stats('cumulative').print_stats(60)
+        return {'profiled_threads': len(perfis), 'skipped_blocks': self._perfis_ignorados}
+
+    # --- Amostragem ---
+
+    @staticmethod
+    def _rotulo(frame) -> str:
+        codigo = frame.f_code
+        nome = getattr(codigo, 'co_qualname', codigo.co_name)
+        return f"{os.path.basename(codigo.co_filename)}:{nome}"
+
+    def _amostrar(self):
+        intervalo = 1.0 / max(self.sample_rate, 0.1)
+        proprio = threading.get_ident()
+        while not self._parar.wait(intervalo):
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == proprio:
+                    continue
+                etapas = self._etapas.get(tid)
+                etapa_atual = etapas[-1] if etapas else None
+                if self.stages is not None and (etapa_atual is None or not self._selecionada(etapa_atual)):
+                    continue
+                pilha: List[str] = []
+                while frame is not None:
+                    pilha.append(self._rotulo(frame))
+                    frame = frame.f_back
+                pilha.reverse()
+                self._amostras[(nomes.get(tid, str(tid)), etapa_atual or '-', tuple(pilha))] += 1
+                self._n_amostras += 1
+
+    def _gravar_amostras(self) -> Dict[str, Any]:
+        por_etapa: Counter = Counter()
+        # Formato "folded": raiz;...;folha contagem (flamegraph.pl / speedscope / inferno)
+        with open(os.path.join(self.run_dir, "samples.folded"), "w", encoding="utf-8") as f:
+            for (thread, etapa_atual, pilha), n in self._amostras.most_common():
+                quadros = [thread, f"[{etapa_atual}]"] + [q.replace(';', ',') for q in pilha]
+                f.write(";".join(quadros) + f" {n}\n")
+                por_etapa[etapa_atual] += n
+        return {'sample_rate': self.sample_rate, 'samples': self._n_amostras, 'samples_by_stage': dict(por_etapa.most_common())}
+
+    # --- Traces do Playwright ---
+
+    def iniciar_trace(self, context, nome: str) -> bool:
+        with self._lock:
+            if self._traces_restantes <= 0:
+                return False
+            self._traces_restantes -= 1
+        try:
+            context.tracing.start(screenshots=True, snapshots=True)
+        except Exception as e:
+            print(f"[PERFIL] Não foi possível iniciar o trace {nome}: {e}")
+            return False
+        self._tracing[id(context)] = re.sub(r'[^\w.-]+', '_', nome)[:80]
+        return True
+
+    def parar_trace(self, context):
+        nome = self._tracing.pop(id(context), None)
+        if nome is None:
+            return
+        caminho = os.path.join(self.run_dir, "traces", f"{len(self.traces) + 1:03d}_{nome}.zip")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        try:
+            context.tracing.stop(path=caminho)
+            self.traces.append(caminho)
+        except Exception as e:
+            print(f"[PERFIL] Trace {nome} perdido: {e}")
+
+
+# --- Ganchos usados pelos scrapers (no-op sem perfilador ativo) ---
+
+def iniciar_trace(context, nome: str) -> bool:
+    return _ATIVO.iniciar_trace(context, nome) if _ATIVO is not None else False
+
+def parar_trace(context):
+    if _ATIVO is not None:
+        _ATIVO.parar_trace(context)
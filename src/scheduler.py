@@ -0,0 +1,115 @@
+import math
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from src.database import DatabaseManager
+
+class EnrichmentScheduler:
+    """
+    Agendador de enriquecimento por valor esperado.
+    Pontua cada candidato (variação de preço, velocidade de vendas desde o último
+    enriquecimento, presença na primeira página e tempo desde a última atualização) e escolhe o melhor
+    conjunto que cabe no orçamento de tempo, usando o tempo médio medido por produto.
+    """
+
+    PESOS_PADRAO = {
+        'variacao_preco': 0.35,
+        'velocidade_vendas': 0.30,
+        'primeira_pagina': 0.15,
+        'defasagem': 0.20,
+    }
+
+    def __init__(self, db: DatabaseManager, pesos: Optional[Dict[str, float]] = None,
+                 segundos_padrao: float = 45.0, atraso_entre_produtos: float = 5.0):
+        self.db = db
+        self.pesos = {**self.PESOS_PADRAO, **(pesos or {})}
+        # Usado enquanto ainda não há medições no banco
+        self.segundos_padrao = segundos_padrao
+        # Média do sleep aleatório entre produtos em MercadoLivreDetail.run (3 a 7s)
+        self.atraso_entre_produtos = atraso_entre_produtos
+
+    @staticmethod
+    def _dias_desde(data_str: Optional[str]) -> Optional[float]:
+        if not data_str: return None
+        try:
+            dt = datetime.strptime(data_str[:19], "%Y-%m-%d %H:%M:%S")
+            return max((datetime.now() - dt).total_seconds() / 86400, 0.0)
+        except ValueError: return None
+
+    def _vendas_por_dia(self, c: Dict[str, Any]) -> Optional[float]:
+        """Vendas por dia desde o último enriquecimento, ou None sem a foto das vendas."""
+        antes = c.get('sales_at_enrichment')
+        dias = self._dias_desde(c.get('enriched_at'))
+        if antes is None or dias is None:
+            return None
+        # O contador do card é arredondado ('+500 vendidos'): pode até recuar, e em poucas horas
+        # um degrau viraria uma velocidade enorme. Mínimo de 1 dia.
+        return max((c.get('sales_qty_search') or 0) - antes, 0) / max(dias, 1.0)
+
+    def pontuar(self, candidatos: List[Dict[str, Any]]) -> List[Tuple[float, Dict[str, Any]]]:
+        """Retorna [(score, candidato)], com score entre 0 e 1."""
+        max_vendas = max((c.get('sales_qty_search') or 0 for c in candidatos), default=0)
+        log_max = math.log1p(max_vendas) or 1.0
+        velocidades = {id(c): self._vendas_por_dia(c) for c in candidatos}
+        log_max_velocidade = math.log1p(max((v for v in velocidades.values() if v is not None), default=0)) or 1.0
+
+        pontuados = []
+        for c in candidatos:
+            nunca_enriquecido = c.get('status') != 'ENRICHED' or c.get('price_at_enrichment') is None
+
+            # 1. Variação de preço desde o último enriquecimento (20% satura)
+            if nunca_enriquecido:
+                variacao = 1.0
+            else:
+                ref = c['price_at_enrichment'] or 0
+                atual = c.get('price_current') or 0
+                variacao = min(abs(atual - ref) / ref / 0.2, 1.0) if ref > 0 else 0.0
+
+            # 2. Velocidade de vendas: vendas/dia desde o enriquecimento (escala log relativa ao maior
+            # do conjunto). Sem a foto das vendas, o total acumulado do card é o que há.
+            por_dia = velocidades[id(c)]
+            if por_dia is not None:
+                velocidade = math.log1p(por_dia) / log_max_velocidade
+            else:
+                velocidade = math.log1p(c.get('sales_qty_search') or 0) / log_max
+
+            # 3. Presença na primeira página
+            primeira = 1.0 if c.get('is_first_page') else 0.0
+
+            # 4. Defasagem: cresce com os dias sem atualização (7 dias = 0.5)
+            if nunca_enriquecido:
+                defasagem = 1.0
+            else:
+                dias = self._dias_desde(c.get('last_updated')) or 0.0
+                defasagem = dias / (dias + 7.0)
+
+            score = (self.pesos['variacao_preco'] * variacao
+                     + self.pesos['velocidade_vendas'] * velocidade
+                     + self.pesos['primeira_pagina'] * primeira
+                     + self.pesos['defasagem'] * defasagem)
+            pontuados.append((score, c))
+
+        return pontuados
+
+    def selecionar(self, candidatos: List[Dict[str, Any]], orcamento_s: float) -> List[Dict[str, Any]]:
+        """
+        Escolha gulosa por valor/custo (mochila fracionária aproximada).
+        Retorna os candidatos escolhidos em ordem decrescente de score.
+        """
+        media = self.db.get_avg_enrichment_seconds() or self.segundos_padrao
+
+        itens = []
+        for score, c in self.pontuar(candidatos):
+            custo = (c.get('last_enrich_seconds') or media) + self.atraso_entre_produtos
+            itens.append((score / custo, score, custo, c))
+        itens.sort(key=lambda x: x[0], reverse=True)
+
+        escolhidos = []
+        restante = orcamento_s
+        for _, score, custo, c in itens:
+            if custo <= restante:
+                escolhidos.append((score, c))
+                restante -= custo
+
+        escolhidos.sort(key=lambda x: x[0], reverse=True)
+        print(f"-> Agendador: {len(escolhidos)}/{len(candidatos)} candidatos cabem em {orcamento_s/60:.0f} min (média {media:.1f}s/produto).")
+        return [c for _, c in escolhidos]
@@ -1,10 +1,27 @@
 import time
 import random
 import re
+import threading
 import validators
-from typing import List, Optional, Dict, Any
-from playwright.sync_api import sync_playwright, Page, BrowserContext
+from typing import Callable, List, Optional, Dict, Any, Set, Tuple
+from playwright.sync_api import sync_playwright, Browser, Page, BrowserContext
 from src.database import DatabaseManager
+from src.metrics import METRICS, ITEMS_TOTAL, SEARCH_WRITES_TOTAL, PAGE_SOURCE_TOTAL, etapa, registrar_erro, contar_bytes
+from src.proxy_pool import ProxyPool, parece_bloqueio
+from src.profiling import iniciar_trace, parar_trace
+from src.page_state import ler_estado, cards_do_estado, CAMPOS_CARD_DOM
+
+# href do título de cada card, na ordem da página (mesmos seletores de _extrair_dados_card)
+JS_LINKS_CARDS = """
+() => {
+    let cards = document.querySelectorAll('.poly-card');
+    if (!cards.length) cards = document.querySelectorAll('.ui-search-layout__item');
+    return Array.from(cards, c => {
+        const a = c.querySelector('.poly-component__title a, .ui-search-item__title') || c.querySelector('a.poly-component__title');
+        return a ? a.getAttribute('href') : null;
+    });
+}
+"""
 
 class MercadoLivreSearch:
     """
@@ -12,11 +29,27 @@ class MercadoLivreSearch:
     Utiliza a lógica original validada com seletores .poly-card e Regex específicos.
     """
 
-    def __init__(self, db: DatabaseManager, headless: bool = False):
+    def __init__(self, db: DatabaseManager, headless: bool = False, on_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 browser: Optional[Browser] = None):
         self.db = db
         self.headless = headless
+        # Chamado após gravar cada item (ex: pipeline que alimenta o enriquecimento)
+        self.on_item = on_item
         self.playwright = None
-        self.browser = None
+        # Navegador compartilhado (ex: modo daemon). Se None, run() abre e fecha o seu.
+        self.browser = browser
+        self._owns_browser = False
+        # Sinal de parada (ex: SIGTERM no daemon): termina a página atual e sai
+        self.stop_event: Optional[threading.Event] = None
+        # Dedup da execução: cada produto é gravado uma vez; os demais (termo, posição) vão para product_search_terms
+        self.vistos: Set[str] = set()
+        self.pares_vistos: Set[Tuple[str, str]] = set()
+        # Pool de proxies (opcional): um proxy por contexto, trocado quando a página é bloqueada
+        self.proxy_pool: Optional[ProxyPool] = None
+        # Ajustes para o benchmark offline (servidor local de fixtures)
+        self.base_url = "https://lista.mercadolivre.com.br"
+        self.delay_scale = 1.0
+        self.slow_mo = 200
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
@@ -26,23 +59,36 @@ class MercadoLivreSearch:
         ]
 
     def __enter__(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(
-            headless=self.headless, 
-            slow_mo=200,
-            args=["--disable-blink-features=AutomationControlled"]
-        )
+        if self.browser is None:
+            self.playwright = sync_playwright().start()
+            extras = {'proxy': ProxyPool.LAUNCH_PROXY} if self.proxy_pool else {}
+            self.browser = self.playwright.chromium.launch(
+                headless=self.headless, 
+                slow_mo=self.slow_mo,
+                args=["--disable-blink-features=AutomationControlled"] + (self.proxy_pool.launch_args if self.proxy_pool else []),
+                **extras
+            )
+            self._owns_browser = True
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.browser: self.browser.close()
-        if self.playwright: self.playwright.stop()
+        if self._owns_browser:
+            if self.browser: self.browser.close()
+            if self.playwright: self.playwright.stop()
+            self.browser = None
+            self.playwright = None
+            self._owns_browser = False
 
     def run(self, terms: List[str], pages_per_term: int = 3):
         """Método de entrada compatível com a chamada do main.py"""
         with self:
             self.processar_busca(terms, pages_per_term)
 
+    def _pausa(self, minimo: float, maximo: float):
+        """Espera aleatória anti-bloqueio (delay_scale=0 desliga, ex: benchmark local)."""
+        if self.delay_scale > 0:
+            time.sleep(random.uniform(minimo, maximo) * self.delay_scale)
+
     @staticmethod
     def _extrair_id(link: str) -> Optional[str]:
         if not link: return None
@@ -52,6 +98,20 @@ class MercadoLivreSearch:
         if match: return match.group(1).replace('-', '')
         return None
 
+    @staticmethod
+    def _extrair_catalogo(link: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (catalog_id, item_id) do link do card. Cards de catálogo apontam para /p/MLB…
+        e trazem o anúncio exibido em wid= ou pdp_filters=item_id:; anúncio avulso não tem catálogo.
+        """
+        if not link: return None, None
+        catalogo = re.search(r'/p/(MLB\d+)', link)
+        if catalogo:
+            anuncio = re.search(r'(?:wid=|item_id(?::|%3A))(MLB\d+)', link)
+            return catalogo.group(1), anuncio.group(1) if anuncio else None
+        anuncio = re.search(r'(MLB-?\d+)', link)
+        return None, anuncio.group(1).replace('-', '') if anuncio else None
+
     @staticmethod
     def _limpar_preco(texto: str) -> Optional[float]:
         if not texto: return None
@@ -84,8 +144,17 @@ class MercadoLivreSearch:
         """
         Executa a busca iterando por termos e páginas.
         Salva os resultados diretamente no banco de dados.
+        Um produto que reaparece (outro termo ou outra página) não é regravado:
+        só o par (termo, posição) é registrado.
         """
+        self.vistos.clear()
+        self.pares_vistos.clear()
+
         for termo_original in termos:
+            if self.stop_event is not None and self.stop_event.is_set():
+                print("\n🛑 Parada solicitada. Encerrando busca.")
+                break
+
             termo = termo_original.strip()
             print(f"\n>>> Processando: '{termo}'")
 
@@ -112,20 +181,22 @@ class MercadoLivreSearch:
             else:
                 limite_paginas = paginas_por_termo
              
-            # Cria contexto novo para cada termo (rotação de UA)
-            context = self.browser.new_context(user_agent=random.choice(self.user_agents))
-            page = context.new_page()
+            # Cria contexto novo para cada termo (rotação de UA e de proxy)
+            context, page, proxy = self._novo_contexto(f"search_{termo}")
             
             termo_slug = termo.replace(" ", "-") if not e_link else "link-direto"
             ranking_global = 1
 
             for i in range(limite_paginas):
+                if self.stop_event is not None and self.stop_event.is_set():
+                    break
+
                 offset = 1 + (i * 48)
 
                 # --- CONSTRUÇÃO DA URL ---
                 if i == 0:
                     # Página 1: Se for link, usa o link processado.
-                    url = termo if e_link else f"https://lista.mercadolivre.com.br/{termo_slug}_NoIndex_True"
+                    url = termo if e_link else f"{self.base_url}/{termo_slug}_NoIndex_True"
                 else:
                     # Páginas seguintes (2, 3...)
                     if e_link:
@@ -141,42 +212,189 @@ class MercadoLivreSearch:
 
                     # Lógica para termos
                     else:
-                        url = f"https://lista.mercadolivre.com.br/{termo_slug}_Desde_{offset}_NoIndex_True"
+                        url = f"{self.base_url}/{termo_slug}_Desde_{offset}_NoIndex_True"
                 
                 print(f"   -> Acessando página {i+1} (Offset {offset})...")
                 try:
-                    page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                    time.sleep(random.uniform(2.0, 4.0))
+                    with etapa('search.goto'):
+                        bloqueado = self._navegar(page, proxy, url)
+                    if bloqueado and self.proxy_pool:
+                        # Página bloqueada: troca de proxy (contexto novo) e tenta a mesma página uma vez
+                        print("      Página bloqueada. Trocando de proxy...")
+                        self._fechar_contexto(context)
+                        context, page, proxy = self._novo_contexto(f"search_{termo}_retry")
+                        with etapa('search.goto'):
+                            self._navegar(page, proxy, url)
+                    with etapa('search.sleep'):
+                        self._pausa(2.0, 4.0)
                     
                     try: # Fecha cookies
                         page.click('button[data-testid="action:understood-button"]', timeout=1000)
                     except: pass
 
-                    cards = page.query_selector_all('.poly-card') or page.query_selector_all('.ui-search-layout__item')
+                    itens = self._itens_da_pagina(page, ranking_global, i == 0, termo if not e_link else None, termo if e_link else None)
                     
-                    if not cards: 
+                    if not itens: 
                         print("      Nenhum card encontrado. Parando paginação.")
                         break
 
-                    print(f"      Encontrados {len(cards)} itens.")
+                    print(f"      Encontrados {len(itens)} itens.")
                     
                     itens_salvos = 0
-                    for card in cards:
-                        item = self._extrair_dados_card(card, ranking_global, i==0, termo if not e_link else None, termo if e_link  else None)
-                        if item:
-                            self.db.upsert_product_from_search(item)
-                            ranking_global += 1
-                            itens_salvos += 1
+                    repetidos = 0
+                    inalterados = 0
+                    hits = []
+                    for item in itens:
+                        par = (item['ml_id'], termo)
+                        if par not in self.pares_vistos:
+                            self.pares_vistos.add(par)
+                            hits.append({'ml_id': item['ml_id'], 'term': termo, 'ranking_search': ranking_global, 'is_first_page': i == 0})
+
+                        if item['ml_id'] in self.vistos:
+                            repetidos += 1
+                        else:
+                            self.vistos.add(item['ml_id'])
+                            with etapa('search.upsert'):
+                                alterado = self.db.upsert_product_from_search(item)
+                            if not alterado:
+                                inalterados += 1
+                            METRICS.inc(SEARCH_WRITES_TOTAL, result='changed' if alterado else 'unchanged')
+                            if self.on_item: self.on_item(item)
+                        ranking_global += 1
+                        itens_salvos += 1
+
+                    with etapa('search.upsert'):
+                        self.db.record_search_hits(hits)
                     
-                    print(f"      -> {itens_salvos} itens válidos processados.")
+                    METRICS.inc(ITEMS_TOTAL, itens_salvos, term=termo)
+                    print(f"      -> {itens_salvos} itens válidos processados ({repetidos} já vistos nesta execução, {inalterados} sem alteração).")
 
                 except Exception as e:
+                    registrar_erro('search.page', e)
                     print(f"      [Erro na página] {e}")
                     break
             
-            context.close()
-            time.sleep(random.uniform(3.0, 5.0))
+            self._fechar_contexto(context)
+            with etapa('search.sleep'):
+                self._pausa(3.0, 5.0)
             
+    def _novo_contexto(self, nome: str):
+        """Contexto com UA aleatório e, se houver pool, o proxy escolhido por desempenho."""
+        proxy = self.proxy_pool.escolher() if self.proxy_pool else None
+        extras = {'proxy': proxy.playwright} if proxy else {}
+        context = self.browser.new_context(user_agent=random.choice(self.user_agents), **extras)
+        # Trace do Playwright nos primeiros contextos com --profile-trace-pages
+        iniciar_trace(context, nome)
+        page = context.new_page()
+        contar_bytes(page, 'search')
+        return context, page, proxy
+
+    @staticmethod
+    def _fechar_contexto(context: BrowserContext):
+        parar_trace(context)
+        context.close()
+
+    def _navegar(self, page: Page, proxy, url: str) -> bool:
+        """page.goto registrando o resultado no pool de proxies. Retorna True se a página parece bloqueada."""
+        inicio = time.monotonic()
+        try:
+            resposta = page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        except Exception:
+            if proxy: self.proxy_pool.registrar(proxy, ok=False)
+            raise
+        status = resposta.status if resposta else None
+        bloqueado = parece_bloqueio(status, page.url)
+        if proxy:
+            ok = status is not None and status < 400
+            self.proxy_pool.registrar(proxy, ok=ok, latencia_s=time.monotonic() - inicio, bloqueado=bloqueado)
+        return bloqueado
+
+    def _itens_da_pagina(self, page: Page, ranking: int, is_first_page: bool, termo_busca: str, termo_link: str) -> List[Dict[str, Any]]:
+        """
+        Itens válidos da página, na ordem da listagem.
+        Lê primeiro o estado JSON embutido (__PRELOADED_STATE__): uma chamada ao navegador por página
+        em vez de ~10 por card. Card com algum campo ausente do JSON é relido pelos seletores
+        (só esse card); sem estado utilizável, a página inteira vai pelos seletores.
+        """
+        with etapa('search.state'):
+            itens = []
+            for card in cards_do_estado(ler_estado(page)):
+                link = card['link']
+                id_mlb = self._extrair_id(link) if link and 'click1' not in link else None
+                if not id_mlb:
+                    continue
+                catalog_id, item_id = self._extrair_catalogo(link)
+                itens.append({
+                    "ml_id": id_mlb,
+                    "title": card['title'],
+                    "permalink": link.split('#')[0].split('?')[0],
+                    "search_term": termo_busca,
+                    "link_term": termo_link,
+                    "price_current": card['price_current'],
+                    "price_original": card['price_original'],
+                    "is_ad": card['is_ad'],
+                    "is_full": card['is_full'],
+                    "is_best_seller": card['is_best_seller'],
+                    "sales_qty_search": card['sales_qty_search'],
+                    "reviews_rating_average": card['reviews_rating_average'],
+                    "is_international": card['is_international'],
+                    "ranking_search": ranking + len(itens),
+                    "is_first_page": is_first_page,
+                    "catalog_id": catalog_id,
+                    "item_id": item_id
+                })
+
+        if not itens:
+            METRICS.inc(PAGE_SOURCE_TOTAL, scraper='search', source='dom')
+            return self._cards_dom(page, ranking, is_first_page, termo_busca, termo_link)
+
+        incompletos = [item for item in itens if any(item[c] is None for c in CAMPOS_CARD_DOM)]
+        if incompletos:
+            print(f"      {len(incompletos)} card(s) com campos ausentes no estado: completando pelos seletores.")
+            do_dom = self._cards_dom_por_id(page, {item['ml_id'] for item in incompletos}, is_first_page, termo_busca, termo_link)
+            for item in incompletos:
+                dom = do_dom.get(item['ml_id'], {})
+                for campo in CAMPOS_CARD_DOM:
+                    if item[campo] is None:
+                        item[campo] = dom.get(campo)
+            METRICS.inc(PAGE_SOURCE_TOTAL, scraper='search', source='state+dom')
+        else:
+            METRICS.inc(PAGE_SOURCE_TOTAL, scraper='search', source='state')
+
+        # Só o que nem o DOM trouxe recebe os padrões dos seletores (sem avaliação, sem vendas...)
+        itens = [item for item in itens if item['title']]
+        for item in itens:
+            if item['price_current'] is None: item['price_current'] = 0.0
+            if item['price_original'] is None: item['price_original'] = item['price_current']
+            if item['sales_qty_search'] is None: item['sales_qty_search'] = 0
+            if item['reviews_rating_average'] is None: item['reviews_rating_average'] = 0.0
+        return itens
+
+    def _cards_dom(self, page: Page, ranking: int, is_first_page: bool, termo_busca: str, termo_link: str) -> List[Dict[str, Any]]:
+        cards = page.query_selector_all('.poly-card') or page.query_selector_all('.ui-search-layout__item')
+        itens = []
+        for card in cards:
+            with etapa('search.extract_card'):
+                item = self._extrair_dados_card(card, ranking + len(itens), is_first_page, termo_busca, termo_link)
+            if item:
+                itens.append(item)
+        return itens
+
+    def _cards_dom_por_id(self, page: Page, ml_ids: Set[str], is_first_page: bool, termo_busca: str, termo_link: str) -> Dict[str, Dict[str, Any]]:
+        """Extrai pelos seletores só os cards dos ml_ids pedidos (localizados pelo link do título)."""
+        cards = page.query_selector_all('.poly-card') or page.query_selector_all('.ui-search-layout__item')
+        links = page.evaluate(JS_LINKS_CARDS)
+        itens: Dict[str, Dict[str, Any]] = {}
+        for card, link in zip(cards, links):
+            ml_id = self._extrair_id(link)
+            if ml_id not in ml_ids or ml_id in itens:
+                continue
+            with etapa('search.extract_card'):
+                item = self._extrair_dados_card(card, 0, is_first_page, termo_busca, termo_link)
+            if item:
+                itens[ml_id] = item
+        return itens
+
     def _extrair_dados_card(self, card, ranking: int, is_first_page: bool, termo_busca: str, termo_link: str) -> Optional[Dict[str, Any]]:
         """
         Extrai dados do card mantendo.
@@ -191,6 +409,7 @@ class MercadoLivreSearch:
             id_mlb = self._extrair_id(link)
             
             if not id_mlb: return None # Proteção extra
+            catalog_id, item_id = self._extrair_catalogo(link)
 
             titulo = title_el.inner_text().strip()
             
@@ -248,8 +467,11 @@ class MercadoLivreSearch:
                 "reviews_rating_average": avaliacao_nota,
                 "is_international": is_international,
                 "ranking_search": ranking,         
-                "is_first_page": is_first_page     
+                "is_first_page": is_first_page,
+                "catalog_id": catalog_id,
+                "item_id": item_id
             }
         except Exception as e:
+            registrar_erro('search.extract_card', e)
             print(f"Erro ao extrair card: {e}") # Debug opcional
             return None
\ No newline at end of file
@@ -0,0 +1,195 @@
+import os
+from typing import Dict, Any, List, Optional, Set, Tuple
+from src.metrics import METRICS
+
+# psutil é opcional: sem ele a memória é lida de /proc (Linux)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RSS_BYTES = "ml_scraper_rss_bytes"                  # RSS atual por processo (python / browser)
+PEAK_RSS_BYTES = "ml_scraper_peak_rss_bytes"        # pico de RSS na execução
+RECYCLES_TOTAL = "ml_scraper_browser_recycles_total"  # reinícios do navegador por motivo
+
+MB = 1024 * 1024
+
+
+def _rss_proc(pid: int) -> int:
+    """RSS em bytes lido de /proc/<pid>/statm (0 se o processo sumiu)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _descendentes_proc(pid: int) -> List[int]:
+    """Processos descendentes de pid (driver do Playwright e processos do Chromium)."""
+    filhos: Dict[int, List[int]] = {}
+    for nome in os.listdir("/proc"):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nome}/stat") as f:
+                # o nome do executável (campo 2) pode ter espaços: o ppid vem depois do ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        filhos.setdefault(ppid, []).append(int(nome))
+
+    resultado, pilha = [], [pid]
+    while pilha:
+        for filho in filhos.get(pilha.pop(), []):
+            resultado.append(filho)
+            pilha.append(filho)
+    return resultado
+
+
+def _cmdline_proc(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+    except OSError:
+        return ""
+
+def drivers_playwright() -> Set[int]:
+    """PIDs dos drivers do Playwright (node ... cli.js run-driver) lançados por este processo."""
+    if psutil is not None:
+        pids = set()
+        for filho in psutil.Process().children(recursive=True):
+            try:
+                if 'run-driver' in filho.cmdline():
+                    pids.add(filho.pid)
+            except psutil.Error:
+                pass
+        return pids
+    if os.path.isdir("/proc"):
+        return {pid for pid in _descendentes_proc(os.getpid()) if 'run-driver' in _cmdline_proc(pid).split()}
+    return set()
+
+def pid_driver(antes: Set[int], playwright=None) -> Optional[int]:
+    """
+    PID do driver do Playwright (pai dos processos do navegador que ele lança) iniciado depois de
+    'antes' (drivers_playwright() tirado antes de sync_playwright().start()).
+    Se outro driver subiu ao mesmo tempo (ex: a busca no modo full), desempata pelo PID guardado
+    no cliente, aceito só se for um dos novos. Sem resposta segura, avisa e retorna None
+    (a memória medida passa a ser a soma de todos os processos filhos).
+    """
+    novos = drivers_playwright() - antes
+    if len(novos) == 1:
+        return novos.pop()
+    if len(novos) > 1:
+        try:
+            # Atributo interno do cliente: só serve para desempatar, nunca é usado sem conferência
+            interno = playwright._impl_obj._connection._transport._proc.pid
+        except AttributeError:
+            interno = None
+        if interno in novos:
+            return interno
+    print(f"⚠️ [WATCHDOG] PID do driver do Playwright não identificado ({len(novos)} driver(s) novo(s)): "
+          f"a memória do navegador será a soma de todos os processos filhos, incluindo outros navegadores.")
+    return None
+
+
+class MemoryWatchdog:
+    """
+    Acompanha o RSS do Python e do navegador (soma dos processos filhos) e decide
+    quando reiniciar o navegador: acima de max_browser_rss_mb ou a cada recycle_every páginas.
+    Sem limites configurados só coleta as estatísticas da execução.
+    Com vigiar(pid) só conta a árvore desse processo (ex: o driver do Playwright do detalhe),
+    para que o navegador da busca, no modo full, não provoque reinícios do navegador do detalhe.
+    Obs: a soma de RSS conta duas vezes a memória compartilhada entre processos do Chromium,
+    então o valor é um teto (serve para dimensionar a máquina, não para contabilidade exata).
+    """
+
+    def __init__(self, max_browser_rss_mb: Optional[float] = None, recycle_every: Optional[int] = None):
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.recycle_every = recycle_every
+        self.paginas_desde_reinicio = 0
+        self.paginas = 0
+        self.reinicios: Dict[str, int] = {}
+        self.pico_python = 0
+        self.pico_browser = 0
+        self._soma_browser = 0
+        self._amostras = 0
+        # Raiz da árvore medida como navegador (None = todos os processos filhos)
+        self.raiz: Optional[int] = None
+        self.disponivel = psutil is not None or os.path.isdir("/proc")
+
+    def amostrar(self) -> Tuple[int, int]:
+        """Retorna (rss_python, rss_navegador) em bytes e atualiza picos e métricas."""
+        if not self.disponivel:
+            return 0, 0
+
+        if psutil is not None:
+            proprio = psutil.Process()
+            rss_python = proprio.memory_info().rss
+            rss_browser = 0
+            try:
+                raiz = psutil.Process(self.raiz) if self.raiz else proprio
+                processos = raiz.children(recursive=True) + ([raiz] if self.raiz else [])
+            except psutil.Error:
+                processos = []
+            for processo in processos:
+                try:
+                    rss_browser += processo.memory_info().rss
+                except psutil.Error:
+                    pass
+        else:
+            rss_python = _rss_proc(os.getpid())
+            if self.raiz:
+                rss_browser = _rss_proc(self.raiz) + sum(_rss_proc(pid) for pid in _descendentes_proc(self.raiz))
+            else:
+                rss_browser = sum(_rss_proc(pid) for pid in _descendentes_proc(os.getpid()))
+
+        self.pico_python = max(self.pico_python, rss_python)
+        self.pico_browser = max(self.pico_browser, rss_browser)
+        self._soma_browser += rss_browser
+        self._amostras += 1
+
+        METRICS.set_gauge(RSS_BYTES, rss_python, process='python')
+        METRICS.set_gauge(RSS_BYTES, rss_browser, process='browser')
+        METRICS.max_gauge(PEAK_RSS_BYTES, rss_python, process='python')
+        METRICS.max_gauge(PEAK_RSS_BYTES, rss_browser, process='browser')
+        return rss_python, rss_browser
+
+    def vigiar(self, pid: Optional[int]):
+        """Passa a medir só a árvore de processos de pid (None volta a somar todos os filhos)."""
+        self.raiz = pid
+
+    def registrar_pagina(self):
+        """Chamado após cada produto: conta a página e amostra a memória."""
+        self.paginas += 1
+        self.paginas_desde_reinicio += 1
+        self.amostrar()
+
+    def motivo_reciclagem(self) -> Optional[str]:
+        """'pages' ou 'memory' se o navegador deve ser reiniciado antes do próximo item."""
+        if self.recycle_every and self.paginas_desde_reinicio >= self.recycle_every:
+            return 'pages'
+        if self.max_browser_rss_mb:
+            _, rss_browser = self.amostrar()
+            if rss_browser > self.max_browser_rss_mb * MB:
+                return 'memory'
+        return None
+
+    def registrar_reinicio(self, motivo: str):
+        self.paginas_desde_reinicio = 0
+        self.reinicios[motivo] = self.reinicios.get(motivo, 0) + 1
+        METRICS.inc(RECYCLES_TOTAL, reason=motivo)
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            'pages': self.paginas,
+            'recycles': dict(self.reinicios),
+            'peak_python_mb': round(self.pico_python / MB, 1),
+            'peak_browser_mb': round(self.pico_browser / MB, 1),
+            'avg_browser_mb': round(self._soma_browser / self._amostras / MB, 1) if self._amostras else None,
+        }
+
+    def imprimir_resumo(self):
+        r = self.resumo()
+        if not self.disponivel:
+            return
+        print(f"🧠 Memória: pico Python {r['peak_python_mb']} MB | pico navegador {r['peak_browser_mb']} MB "
+              f"(média {r['avg_browser_mb']} MB) | {r['pages']} páginas | reinícios: {r['recycles'] or 0}")